@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: reading large, synthetic CODRA (.codra) files with read_codra.
+
+CODRA escapes the double quotes in its EDUs as \\\\\\". read_codra cleans up
+the EDUs while tokenizing the file (the 'codra' dialect of the .dis reader).
+This is compared to the two-stage path, which cleans up all leaves of the
+RST tree in an extra traversal after it was built.
+
+Usage: python benchmarks/bench_codra_reader.py [--edus 20000] [--repeat 3]
+"""
+
+import argparse
+
+from bench_dis_writer import make_balanced_tree, timeit
+from rstconverter.dis.codra import read_codra
+from rstconverter.dis.disfilewriter import DisFileWriter
+from rstconverter.tree import transform_leaves
+
+
+def make_codra(num_edus):
+    """Return the content of a .codra file with the given number of EDUs,
+    some of which contain escaped double quotes and brackets."""
+    tree = make_balanced_tree(1, num_edus)
+    transform_leaves(tree, lambda edu: edu + ' ( a \\\\\\"quote\\\\\\" )')
+    return DisFileWriter(tree).to_dis_format()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    codra_bytes = make_codra(args.edus).encode('utf-8')
+    megabytes = len(codra_bytes) / 1e6
+    _, direct_time = timeit(lambda: read_codra(codra_bytes), args.repeat)
+    _, two_stage_time = timeit(lambda: read_codra(codra_bytes, two_stage=True), args.repeat)
+
+    print("{0} EDUs ({1:.1f} MB)".format(args.edus, megabytes))
+    for name, read_time in (('tokenizer dialect', direct_time), ('two-stage', two_stage_time)):
+        print("read_codra ({0}): {1:.3f}s ({2:.0f} EDUs/s, {3:.1f} MB/s)".format(
+            name, read_time, args.edus / read_time, megabytes / read_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: reading all .dis files of a corpus with the layout of the RST-DT
+training set (RSTtrees-WSJ-main-1.0/TRAINING/wsj_*.out.dis, 347 documents).
+
+Usage: python benchmarks/bench_dis_reader.py [--corpus-dir DIR] [--repeat 3]
+
+Without --corpus-dir (e.g. the TRAINING directory of the RST-DT), a synthetic
+corpus with the same number of documents/EDUs is generated. The DisFile
+tokenizer is compared to the old approach of escaping the brackets in all
+EDUs, parsing the file with nltk and unescaping all leaves again. DisRSTTree
+is timed with the direct builder and with the two-stage path (DisFile tree
+first, then converted into the RST tree).
+"""
+
+import argparse
+import glob
+import os
+import re
+import tempfile
+
+from nltk.tree import ParentedTree
+
+from bench_dis_writer import make_balanced_tree, timeit
+from rstconverter.dis.common import (
+    DIS_ESCAPES, DisFile, convert_parens_in_rst_tree_str, fix_rst_treebank_tree_str)
+from rstconverter.dis.disfilewriter import DisFileWriter
+from rstconverter.dis.distree import DisRSTTree
+from rstconverter.tree import transform_leaves
+
+RSTDT_TRAINING_DOCS = 347
+
+
+def write_synthetic_corpus(corpus_dir, num_docs=RSTDT_TRAINING_DOCS):
+    """Write .dis files with 4-103 EDUs (54 on average, like the RST-DT) into
+    corpus_dir/RSTtrees-WSJ-main-1.0/TRAINING and return that directory."""
+    training_dir = os.path.join(corpus_dir, 'RSTtrees-WSJ-main-1.0', 'TRAINING')
+    os.makedirs(training_dir)
+    for doc_id in range(num_docs):
+        tree = make_balanced_tree(1, 4 + (doc_id * 37) % 100)
+        # EDUs of the RST-DT often contain brackets
+        transform_leaves(tree, lambda edu: edu + ' ( a -LRB- "quote" )')
+        dis_path = os.path.join(training_dir, 'wsj_{:04d}.out.dis'.format(600 + doc_id))
+        DisFileWriter(tree, output_filepath=dis_path)
+    return training_dir
+
+
+def read_disfile_nltk(dis_str):
+    """Read a .dis file with nltk (cf. DisFile before it had its own tokenizer)."""
+    dis_str = convert_parens_in_rst_tree_str(fix_rst_treebank_tree_str(dis_str.strip()))
+    tree = ParentedTree.fromstring(dis_str)
+    for leaf_pos in tree.treepositions('leaves'):
+        leaf = tree[leaf_pos]
+        for (bracket, bracket_replacement) in DIS_ESCAPES:
+            leaf = re.sub(bracket_replacement, bracket, leaf)
+        tree[leaf_pos] = leaf
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus-dir')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = args.corpus_dir or write_synthetic_corpus(tmp_dir)
+        dis_paths = sorted(glob.glob(os.path.join(corpus_dir, '**', '*.dis'), recursive=True))
+        dis_files = []
+        for dis_path in dis_paths:
+            with open(dis_path, 'rb') as dis_file:
+                dis_files.append(dis_file.read())
+
+    dis_strs = [dis_bytes.decode('utf-8') for dis_bytes in dis_files]
+    _, nltk_time = timeit(lambda: [read_disfile_nltk(s) for s in dis_strs], args.repeat)
+    _, tokenizer_time = timeit(lambda: [DisFile(b) for b in dis_files], args.repeat)
+    _, distree_time = timeit(lambda: [DisRSTTree(b) for b in dis_files], args.repeat)
+    _, two_stage_time = timeit(
+        lambda: [DisRSTTree(b, two_stage=True) for b in dis_files], args.repeat)
+
+    print("{} .dis files".format(len(dis_files)))
+    print("DisFile (escape + nltk + unescape): {0:.3f}s".format(nltk_time))
+    print("DisFile (tokenizer): {0:.3f}s".format(tokenizer_time))
+    print("DisRSTTree (direct): {0:.3f}s".format(distree_time))
+    print("DisRSTTree (two-stage): {0:.3f}s".format(two_stage_time))
+
+
+if __name__ == '__main__':
+    main()
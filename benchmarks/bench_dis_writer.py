@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: converting a balanced, binary RST tree into a .dis file.
+
+Usage: python benchmarks/bench_dis_writer.py [--edus 2000] [--repeat 3] [--compare]
+
+With --compare, the spans of all nodes are also calculated without the
+precomputed span table (i.e. for each node separately from the tree
+positions of its leaves, as the writer used to do, which takes quadratic
+time).
+"""
+
+import argparse
+import time
+
+from rstconverter.dis.disfilewriter import DisFileWriter
+from rstconverter.tree import DGParentedTree
+
+
+def make_balanced_tree(first_edu, last_edu):
+    """Return a balanced RST tree covering the given EDUs (N-S relations only)."""
+    if first_edu == last_edu:
+        return 'This is the text of EDU number {} .'.format(first_edu)
+    middle = (first_edu + last_edu) // 2
+    return DGParentedTree('elaboration', [
+        DGParentedTree('N', [make_balanced_tree(first_edu, middle)]),
+        DGParentedTree('S', [make_balanced_tree(middle + 1, last_edu)])])
+
+
+def get_span(subtree):
+    """Return the (first, last) EDU covered by the given subtree, by looking
+    up the positions of its leaves among all leaves of the tree."""
+    all_leaves = subtree.root().treepositions('leaves')
+    subtree_root_pos = subtree.treeposition()
+    subtree_leaves = [subtree_root_pos + leaf_pos
+                      for leaf_pos in subtree.treepositions('leaves')]
+    return (all_leaves.index(subtree_leaves[0]) + 1,
+            all_leaves.index(subtree_leaves[-1]) + 1)
+
+
+def timeit(function, repeat):
+    """Return the result and the best runtime (in seconds) of the given function."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', action='store_true',
+                        help="also time the conversion without the span table")
+    args = parser.parse_args()
+
+    tree = make_balanced_tree(1, args.edus)
+    dis_str, dis_time = timeit(lambda: DisFileWriter(tree).to_dis_format(), args.repeat)
+    print("DisFileWriter: {0:.3f}s for {1} EDUs ({2} bytes)".format(
+        dis_time, args.edus, len(dis_str)))
+
+    if args.compare:
+        _, quadratic_time = timeit(
+            lambda: [get_span(subtree) for subtree in tree.subtrees()], 1)
+        print("spans without span table: {0:.3f}s for {1} EDUs".format(
+            quadratic_time, args.edus))
+
+
+if __name__ == '__main__':
+    main()
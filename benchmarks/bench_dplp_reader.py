@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: reading large, synthetic DPLP output files (a .merge part with
+one token per line, followed by the parse tree).
+
+Reading the EDUs into a MergeTable (one list per column, EDU texts joined
+at once) is compared to the old approach of splitting the input at the
+parse tree and collecting the tokens of each EDU in a defaultdict(list).
+read_dplp also builds the RST tree while parsing the parse tree part.
+
+Usage: python benchmarks/bench_dplp_reader.py [--edus 20000] [--repeat 3]
+"""
+
+import argparse
+from collections import defaultdict
+
+from bench_dis_writer import timeit
+from rstconverter.dplp import DPLP_TREE_START, MergeTable, read_dplp
+
+TOKENS_PER_EDU = 10
+
+
+def make_merge_lines(num_edus):
+    """Return the lines of a .merge file with the given number of EDUs."""
+    lines = []
+    for edu_id in range(1, num_edus + 1):
+        for token_id in range(1, TOKENS_PER_EDU + 1):
+            token = 'token{}'.format(token_id)
+            lines.append('\t'.join([
+                str(edu_id // 3), str(token_id), token, token, 'NN', 'dep',
+                '0', 'O', ' (NN {})'.format(token), str(edu_id)]))
+    return lines
+
+
+def make_dplp_tree(first, last):
+    """Return the parse tree (a tree literal) covering the given EDUs."""
+    if first == last:
+        return "ParentedTree('EDU', ['{}'])".format(first)
+    middle = (first + last) // 2
+    return "ParentedTree('NS-elaboration', [{0}, {1}])".format(
+        make_dplp_tree(first, middle), make_dplp_tree(middle + 1, last))
+
+
+def make_dplp(num_edus):
+    """Return the content of a DPLP output file with the given number of EDUs."""
+    return '\r\n'.join(make_merge_lines(num_edus)) + '\r\n\n' + make_dplp_tree(1, num_edus)
+
+
+def extract_edus_split(input_str):
+    """Extract the EDUs by splitting the input and collecting the tokens of
+    each EDU (the old approach)."""
+    merge_file_str, _ = input_str.split(DPLP_TREE_START, 1)
+    edus = defaultdict(list)
+    for line in merge_file_str.splitlines():
+        if line.strip():
+            token = line.split('\t')[2]
+            edu_id = int(line.split('\t')[9])
+            edus[edu_id].append(token)
+    return {edu_id: ' '.join(tokens) for edu_id, tokens in edus.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dplp_str = make_dplp(args.edus)
+    dplp_bytes = dplp_str.encode('utf-8')
+    tree_start = dplp_str.find(DPLP_TREE_START)
+
+    _, split_time = timeit(lambda: extract_edus_split(dplp_str), args.repeat)
+    _, table_time = timeit(
+        lambda: MergeTable(dplp_str, end=tree_start).get_edu_texts(), args.repeat)
+    _, read_time = timeit(lambda: read_dplp(dplp_bytes), args.repeat)
+
+    print("{0} EDUs, {1} tokens ({2:.1f} MB)".format(
+        args.edus, args.edus * TOKENS_PER_EDU, len(dplp_bytes) / 1e6))
+    print("EDUs (split input, defaultdict): {0:.3f}s".format(split_time))
+    print("EDUs (MergeTable): {0:.3f}s".format(table_time))
+    print("read_dplp: {0:.3f}s".format(read_time))
+
+
+if __name__ == '__main__':
+    main()
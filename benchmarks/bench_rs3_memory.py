@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: peak memory (max. resident set size) used for reading a large
+.rs3 file with the streaming get_rs3_data() compared to parsing the whole
+file into an lxml DOM first.
+
+Each variant runs in a fresh Python process, so that the peak RSS of one
+doesn't hide the other. In addition, the memory used by the node records
+(RS3Node objects vs. the nested defaultdicts used before) is reported
+per 1000 EDUs.
+
+Usage: python benchmarks/bench_rs3_memory.py [--edus 200000]
+"""
+
+import argparse
+from collections import defaultdict
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from rstconverter.rs3.rs3tree import get_rs3_data
+
+
+VARIANTS = {
+    'baseline': "import rstconverter.rs3.rs3tree",
+    'dom': (
+        "from lxml import etree\n"
+        "import rstconverter.rs3.rs3tree\n"
+        "rs3_etree = etree.parse(sys.argv[1])\n"
+        "data = [(e.attrib.get('parent'), e.text) for e in rs3_etree.iter('segment', 'group')]"),
+    'iterparse': (
+        "from rstconverter.rs3.rs3tree import get_rs3_data\n"
+        "data = get_rs3_data(sys.argv[1])"),
+}
+
+MEASURE = (
+    "import resource, sys\n"
+    "{}\n"
+    "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+
+
+def write_rs3(path, num_edus, relname='elaboration'):
+    """Write an .rs3 file in which each EDU is a satellite of its predecessor."""
+    with open(path, 'w') as rs3_file:
+        rs3_file.write(
+            '<rst>\n<header>\n<relations>\n'
+            '<rel name="{}" type="rst"/>\n</relations>\n</header>\n<body>\n'.format(relname))
+        rs3_file.write('<segment id="1">This is the text of EDU number 1.</segment>\n')
+        for i in range(2, num_edus + 1):
+            rs3_file.write(
+                '<segment id="{0}" parent="{1}" relname="{2}">'
+                'This is the text of EDU number {0}.</segment>\n'.format(i, i - 1, relname))
+        rs3_file.write('</body>\n</rst>\n')
+
+
+def peak_rss(variant, rs3_path):
+    """Return the peak RSS (in KiB) of a Python process running the given variant."""
+    output = subprocess.check_output(
+        [sys.executable, '-c', MEASURE.format(VARIANTS[variant]), rs3_path])
+    return int(output)
+
+
+def as_defaultdicts(elements):
+    """Convert RS3Node records into the nested defaultdicts that
+    get_rs3_data() used to return."""
+    records = defaultdict(lambda: defaultdict(str))
+    for elem_id, node in elements.items():
+        for key, value in node.items():
+            if value != '':
+                records[elem_id][key] = value
+    return records
+
+
+def allocated_size(function):
+    """Return the result of the function and the size (in bytes) of the
+    memory it allocated that is still in use."""
+    tracemalloc.start()
+    result = function()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def record_sizes(rs3_path, num_edus):
+    """Print the size of the node records per 1000 EDUs."""
+    _, elements, _, _ = get_rs3_data(rs3_path)
+    # copy the records while tracing, so that only their size is measured
+    # (the EDU texts are shared by both variants and not counted)
+    _, node_size = allocated_size(lambda: {
+        elem_id: copy_node(node) for elem_id, node in elements.items()})
+    _, dict_size = allocated_size(lambda: as_defaultdicts(elements))
+    for name, size in (('defaultdict records', dict_size), ('RS3Node records', node_size)):
+        print("{0}: {1:.1f} KiB per 1000 EDUs".format(
+            name, size / 1024 / (num_edus / 1000)))
+
+
+def copy_node(node):
+    """Return a copy of the given RS3Node."""
+    node_copy = node.__class__(node.element_type)
+    for key, value in node.items():
+        node_copy[key] = value
+    return node_copy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rs3_path = os.path.join(tmpdir, 'large.rs3')
+        write_rs3(rs3_path, args.edus)
+        print("input file: {0} EDUs, {1:.1f} MiB".format(
+            args.edus, os.path.getsize(rs3_path) / 1024 ** 2))
+
+        baseline = peak_rss('baseline', rs3_path)
+        print("baseline (imports only): {0:.1f} MiB".format(baseline / 1024))
+        for variant in ('dom', 'iterparse'):
+            rss = peak_rss(variant, rs3_path)
+            print("{0}: {1:.1f} MiB peak RSS ({2:+.1f} MiB over baseline)".format(
+                variant, rss / 1024, (rss - baseline) / 1024))
+
+        record_sizes(rs3_path, args.edus)
+
+
+if __name__ == '__main__':
+    main()
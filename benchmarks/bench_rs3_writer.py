@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: converting a balanced, binary RST tree into an .rs3 file.
+
+With --baseline, the current RS3FileWriter is compared to the one of an
+older revision of this repository (e.g. a release tag or the last commit
+whose writer looked up nodes via their treepositions). The older writer is
+run in a subprocess on a copy of that revision's src/ directory (exported
+with 'git archive'), and both outputs are checked to be identical. The
+comparison is skipped if the revision can't be found.
+
+Usage: python benchmarks/bench_rs3_writer.py [--edus 5000] [--repeat 3] [--baseline REV]
+"""
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+from bench_dis_writer import make_balanced_tree, timeit
+from rstconverter.rs3 import RS3FileWriter
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+
+def write_rs3(tree):
+    """Return the .rs3 file (bytes) of the given tree."""
+    output = io.BytesIO()
+    RS3FileWriter(tree, debug=False, output_filepath=output)
+    return output.getvalue()
+
+
+def resolve_revision(revision):
+    """Return the commit hash of the given git revision or None, if it
+    can't be found (e.g. outside of a git checkout)."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--verify', '--quiet', revision + '^{commit}'],
+            cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            check=True, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_baseline(revision, num_edus, repeat):
+    """Run this benchmark with the package of the given git revision.
+    Returns its report (str) and the .rs3 file (bytes) it produced."""
+    archive = subprocess.run(
+        ['git', 'archive', revision, 'src'], cwd=REPO_DIR,
+        stdout=subprocess.PIPE, check=True).stdout
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as archive_file:
+            archive_file.extractall(tmp_dir)
+        output_path = os.path.join(tmp_dir, 'baseline.rs3')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [os.path.join(tmp_dir, 'src'), BENCHMARK_DIR]))
+        report = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--edus', str(num_edus),
+             '--repeat', str(repeat), '--output', output_path],
+            env=env, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        with open(output_path, 'rb') as rs3_file:
+            return report.strip(), rs3_file.read()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help="git revision to compare the writer to")
+    parser.add_argument('--output', help="write the generated .rs3 file to this path")
+    args = parser.parse_args()
+
+    tree = make_balanced_tree(1, args.edus)
+    rs3_bytes, rs3_time = timeit(lambda: write_rs3(tree), args.repeat)
+    if args.output:
+        with open(args.output, 'wb') as rs3_file:
+            rs3_file.write(rs3_bytes)
+    print("RS3FileWriter: {0:.3f}s for {1} EDUs ({2} bytes)".format(
+        rs3_time, args.edus, len(rs3_bytes)))
+
+    if args.baseline:
+        if resolve_revision(args.baseline) is None:
+            print("skipping comparison: unknown revision {!r}".format(args.baseline))
+            return
+        report, baseline_bytes = run_baseline(args.baseline, args.edus, args.repeat)
+        print("{0} ({1})".format(report, args.baseline))
+        print("identical output: {}".format(rs3_bytes == baseline_bytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: building an RSTTree from a synthetic, right-branching .rs3 file
+(a chain of EDUs, where each EDU is the satellite of its predecessor)
+with the recursive RSTTree.dt() and the non-recursive RSTTree.dt_iterative().
+
+Usage: python benchmarks/bench_rs3tree.py [--edus 10000] [--repeat 3]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from rstconverter.rs3 import RSTTree
+
+
+def make_chain_rs3(num_edus, relname='elaboration'):
+    """Return the content (bytes) of an .rs3 file with a chain of EDUs."""
+    segments = ['<segment id="1">EDU 1</segment>']
+    for i in range(2, num_edus + 1):
+        segments.append(
+            '<segment id="{0}" parent="{1}" relname="{2}">EDU {0}</segment>'.format(
+                i, i - 1, relname))
+    return (
+        '<rst><header><relations><rel name="{0}" type="rst"/></relations></header>'
+        '<body>{1}</body></rst>').format(relname, ''.join(segments)).encode('utf-8')
+
+
+def timeit(function, repeat):
+    """Return the result and the best runtime (in seconds) of the given function."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def run(num_edus, repeat):
+    rs3_bytes = make_chain_rs3(num_edus)
+
+    iterative, iterative_time = timeit(lambda: RSTTree(rs3_bytes), repeat)
+    print("iterative dt(): {0:.3f}s for {1} EDUs".format(iterative_time, num_edus))
+
+    try:
+        recursive, recursive_time = timeit(
+            lambda: RSTTree(rs3_bytes, recursive=True), repeat)
+    except RecursionError:
+        print("recursive dt(): RecursionError (recursion limit: {})".format(
+            sys.getrecursionlimit()))
+        return
+
+    print("recursive dt(): {0:.3f}s for {1} EDUs".format(recursive_time, num_edus))
+    # comparing deeply nested trees is recursive, too
+    print("identical trees:", iterative.tree == recursive.tree)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--recursion-limit', type=int, default=100000,
+        help="recursion limit used for the recursive builder")
+    args = parser.parse_args()
+
+    # the recursive builder needs a deep stack for long chains
+    sys.setrecursionlimit(args.recursion_limit)
+    threading.stack_size(512 * 1024 * 1024)
+    thread = threading.Thread(target=run, args=(args.edus, args.repeat))
+    thread.start()
+    thread.join()
+
+
+if __name__ == '__main__':
+    main()
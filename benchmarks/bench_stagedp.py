@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: reading large, synthetic StageDP (.stagedp) files.
+
+The generator produces balanced or right-branching (chain) trees, e.g. to
+write a fixture for other benchmarks:
+
+    python benchmarks/bench_stagedp.py --edus 20000 --shape chain --output big.stagedp
+
+Usage: python benchmarks/bench_stagedp.py [--edus 5000] [--shape balanced] [--repeat 3]
+"""
+
+import argparse
+
+from bench_dis_writer import timeit
+from rstconverter.stagedp import StageDPRSTTree
+
+
+def make_edu(edu_id):
+    """Return a StageDP-formatted EDU (with paragraph/sentence markers)."""
+    markers = '<P>_<S>_' if edu_id % 10 == 1 else '<S>_'
+    return '(EDU _!{0}This_is_EDU_number_{1}_._!)'.format(markers, edu_id)
+
+
+def make_balanced_stagedp(first, last, depth=0):
+    """Return a balanced .stagedp tree (str) with the EDUs first...last."""
+    indent = '  ' * depth
+    if first == last:
+        return indent + make_edu(first)
+    middle = (first + last) // 2
+    return '{0}(NS-Elaboration\n{1}\n{2})'.format(
+        indent, make_balanced_stagedp(first, middle, depth + 1),
+        make_balanced_stagedp(middle + 1, last, depth + 1))
+
+
+def make_stagedp(num_edus, shape='balanced'):
+    """Return the content of a .stagedp file with the given number of EDUs."""
+    if num_edus == 1 or shape == 'balanced':
+        return make_balanced_stagedp(1, num_edus) + '\n'
+
+    # a chain of EDUs, where each EDU is the satellite of its predecessor
+    relations = ['(NS-Elaboration ' + make_edu(edu_id) for edu_id in range(1, num_edus)]
+    return '{0} {1}{2}\n'.format(
+        ' '.join(relations), make_edu(num_edus), ')' * (num_edus - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=5000)
+    parser.add_argument('--shape', choices=('balanced', 'chain'), default='balanced')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="write the generated .stagedp file to this path")
+    args = parser.parse_args()
+
+    stagedp_str = make_stagedp(args.edus, args.shape)
+    if args.output:
+        with open(args.output, 'w') as stagedp_file:
+            stagedp_file.write(stagedp_str)
+
+    stagedp_bytes = stagedp_str.encode('utf-8')
+    try:
+        _, read_time = timeit(lambda: StageDPRSTTree(stagedp_bytes), args.repeat)
+    except ValueError as err:  # e.g. nltk's maximum nesting depth for chains
+        print("StageDPRSTTree: {0}".format(err))
+        return
+    print("StageDPRSTTree: {0:.3f}s for {1} EDUs ({2} tree)".format(
+        read_time, args.edus, args.shape))
+
+
+if __name__ == '__main__':
+    main()
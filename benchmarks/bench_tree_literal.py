@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: parsing HILDA/DPLP parser output (i.e. tree literals like
+ParseTree('Contrast[S][N]', ['foo', 'bar'])) with parse_tree_literal()
+compared to the eval() call that the readers used before.
+
+Usage: python benchmarks/bench_tree_literal.py [--edus 1000] [--docs 20]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from nltk.tree import Tree
+
+from rstconverter.tree import parse_tree_literal
+
+
+def make_hilda_str(num_edus, seed=0):
+    """Return a random binary HILDA tree with the given number of EDUs."""
+    rand = random.Random(seed)
+    # HILDA output is written with repr(), i.e. it contains both
+    # single and double quoted strings
+    subtrees = [repr("EDU number {} is n't as long as the others .".format(i)) if i % 3 == 0
+                else repr("This is the text of EDU number {} .".format(i))
+                for i in range(num_edus)]
+    while len(subtrees) > 1:
+        i = rand.randrange(len(subtrees) - 1)
+        subtrees[i:i+2] = ["ParseTree('Elaboration[N][S]', [{}, {}])".format(*subtrees[i:i+2])]
+    return subtrees[0]
+
+
+def eval_tree_literal(parse_tree_str):
+    """The old way of parsing HILDA output."""
+    return eval(re.sub('ParseTree', 'Tree', parse_tree_str))
+
+
+def timeit(function, docs):
+    """Return the number of documents parsed per second."""
+    start = time.perf_counter()
+    for doc in docs:
+        function(doc)
+    return len(docs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edus', type=int, default=1000)
+    parser.add_argument('--docs', type=int, default=20)
+    args = parser.parse_args()
+
+    docs = [make_hilda_str(args.edus, seed=i) for i in range(args.docs)]
+    assert all(parse_tree_literal(doc) == eval_tree_literal(doc) for doc in docs)
+
+    for name, function in (('eval()', eval_tree_literal),
+                           ('parse_tree_literal()', parse_tree_literal)):
+        print("{0}: {1:.1f} documents/s ({2} EDUs each)".format(
+            name, timeit(function, docs), args.edus))
+
+
+if __name__ == '__main__':
+    main()
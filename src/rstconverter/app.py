@@ -7,10 +7,17 @@ RST (Rhetorical Structure Theory) formats.
 """
 
 import base64
-import codecs
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import io
-import tempfile
+import json
+import os
+import posixpath
+import tarfile
 import traceback
+import uuid
+import zipfile
 from pathlib2 import Path
 
 from flask import jsonify, Flask, request, send_file
@@ -19,14 +26,38 @@ from nltk.treeprettyprinter import TreePrettyPrinter
 import werkzeug
 
 import rstconverter as rstc
+from rstconverter.cache import ConversionCache, make_cache_key
+from rstconverter.common import open_output, read_input, RSTBaseTree
+from rstconverter.pool import ConversionPool, ConversionTimeout
+from rstconverter.tree import copy_tree, dumps_tree, loads_tree
 
 app = Flask(__name__)  # create a Flask app
+# number of threads used to convert the documents of a batch in parallel
+app.config.setdefault('BATCH_WORKERS', os.cpu_count() or 1)
+# If set to a ConversionPool, conversions run in its worker processes
+# instead of the thread that handles the request (see init_conversion_pool()).
+app.config.setdefault('CONVERSION_POOL', None)
+# If set to a ConversionCache, conversion results are cached
+# (see init_conversion_cache()).
+app.config.setdefault('CONVERSION_CACHE', None)
+# If set to a ConversionCache, parsed input files are cached, so that
+# converting the same input into several output formats runs the reader
+# only once (see init_tree_cache()).
+app.config.setdefault('TREE_CACHE', None)
+# limits for the documents uploaded to /convert-batch (after unpacking archives)
+app.config.setdefault('BATCH_MAX_DOCUMENTS', 1000)
+app.config.setdefault('BATCH_MAX_DOCUMENT_SIZE', 50 * 1024 ** 2)
+app.config.setdefault('BATCH_MAX_TOTAL_SIZE', 200 * 1024 ** 2)
 api = Api(app)  # create a flask-restx API
 
+ARCHIVE_FORMATS = ('zip', 'tar', 'tar.gz')
+ENVELOPE_FORMATS = ('json', 'multipart')
+BATCH_ERRORS_FILENAME = 'errors.json'
+
 
 def write_prettyprinted_nltktree(rst_basetree, output_file):
     """write a plain text ASCII-style representation of an RST tree to a file."""
-    with codecs.open(output_file, 'w', 'utf-8') as outfile:
+    with open_output(output_file) as outfile:
         outfile.write(TreePrettyPrinter(rst_basetree.tree).text())
 
 def write_svgtree(rst_basetree, output_file):
@@ -38,7 +69,7 @@ def write_nltktree_svg_base64(rst_basetree, output_file):
     """write a base64 representation of a SVG image
     of the nltk.tree representation of an RST tree to a file.
     """
-    with open(output_file, 'wb') as outfile:
+    with open_output(output_file, binary=True) as outfile:
         wrapped_tree = rstc.tree.word_wrap_tree(rst_basetree.tree, width=20)
         svg_string = rstc.tree.write_svgtree(wrapped_tree)
         outfile.write(base64.b64encode(svg_string.encode()))
@@ -81,6 +112,18 @@ class OutputFormats(Resource):
         return sorted(WRITE_FUNCTIONS.keys())
 
 
+@api.route('/cache-stats')
+class CacheStats(Resource):
+    def get(self):
+        """Returns the hit/miss counters and sizes of the conversion cache
+        and of the cache of parsed input files (or null, if a cache is disabled)."""
+        stats = {}
+        for name, config_key in (('conversions', 'CONVERSION_CACHE'), ('trees', 'TREE_CACHE')):
+            cache = app.config[config_key]
+            stats[name] = cache.stats() if cache is not None else None
+        return stats
+
+
 @api.route('/convert/<string:input_format>/<string:output_format>')
 class FormatConverter(Resource):
     def post(self, input_format, output_format):
@@ -100,46 +143,436 @@ class FormatConverter(Resource):
 
         input_basename = Path(input_file.filename).stem
 
-        with tempfile.NamedTemporaryFile() as temp_inputfile:
-            input_file.save(temp_inputfile.name)
-
-            if input_format not in READ_FUNCTIONS:
-                res = jsonify(error="Unknown input format: {}".format(input_format))
-                return cors_response(res, 400)
-
-            read_function = READ_FUNCTIONS[input_format]
-
-            try:
-                tree = read_function(temp_inputfile.name)
-            except Exception as err:
-                error_msg = "{0} can't handle input file '{1}'. Got: {2}".format(
-                    read_function, input_file.filename, err)
-                res = jsonify(error=error_msg, traceback=traceback.format_exc())
-                return cors_response(res, 500)
-
-        with tempfile.NamedTemporaryFile() as temp_outputfile:
-            if output_format not in WRITE_FUNCTIONS:
-                res = jsonify(error="Unknown output format: {}".format(output_format))
-                return cors_response(res, 400)
-
-            write_function = WRITE_FUNCTIONS[output_format]
-
-            try:
-                write_function(tree, output_file=temp_outputfile.name)
-            except Exception as err:
-                error_msg = ("{writer} can't convert ParentedTree to {output_format}. "
-                            "Input file '{input_file}'. Got: {error}").format(
-                    writer=write_function, output_format=output_format,
-                    input_file=input_file.filename, error=err)
-                res = jsonify(error=error_msg, traceback=traceback.format_exc())
-                return cors_response(res, 500)
-
-            output_filename = "{0}.{1}".format(input_basename, output_format)
-            res = send_file(temp_outputfile.name, as_attachment=True,
-                            attachment_filename=output_filename)
+        if input_format not in READ_FUNCTIONS:
+            res = jsonify(error="Unknown input format: {}".format(input_format))
+            return cors_response(res, 400)
+
+        if output_format not in WRITE_FUNCTIONS:
+            res = jsonify(error="Unknown output format: {}".format(output_format))
+            return cors_response(res, 400)
+
+        # the conversion is done in memory, without any temporary files
+        input_bytes = read_input(input_file, binary=True)
+
+        # conversions are deterministic, so the client's copy of the
+        # result is still valid if it was converted from the same input
+        etag = make_cache_key(input_bytes, input_format, output_format)
+        if request.if_none_match.contains(etag):
+            res = app.response_class(status=304)
+            res.set_etag(etag)
+            return cors_response(res, 304)
+
+        try:
+            output_bytes = run_conversion(
+                input_bytes, input_format, output_format,
+                input_filename=input_file.filename, cache_key=etag)
+        except ConversionError as err:
+            res = jsonify(error=err.message, traceback=err.traceback)
+            return cors_response(res, 500)
+        except ConversionTimeout as err:
+            res = jsonify(error="Conversion of input file '{0}' timed out. {1}".format(
+                input_file.filename, err))
+            return cors_response(res, 504)
+
+        output_filename = "{0}.{1}".format(input_basename, output_format)
+        res = send_file(io.BytesIO(output_bytes), as_attachment=True,
+                        attachment_filename=output_filename, etag=False)
+        res.set_etag(etag)
         return cors_response(res)
 
 
+@api.route('/convert/<string:input_format>')
+class MultiFormatConverter(Resource):
+    def post(self, input_format):
+        """Convert an RST file into several output formats at once.
+
+        The output formats are given as a comma-separated list in the
+        'outputs' parameter. The input file is only parsed once. The result
+        is a JSON object that maps from each output format to its
+        'filename' and 'content' (or to its 'error' and 'traceback', if
+        the conversion failed). With 'envelope=multipart', the result is a
+        multipart/mixed response with one part per output file (and a
+        part named 'errors.json' listing the failed conversions).
+
+        Usage example:
+
+            curl -XPOST "http://localhost:5000/convert/rs3?outputs=dis,svgtree" -F input=@source.rs3
+        """
+        if input_format not in READ_FUNCTIONS:
+            res = jsonify(error="Unknown input format: {}".format(input_format))
+            return cors_response(res, 400)
+
+        output_formats = [output_format for output_format
+                          in request.args.get('outputs', '').split(',') if output_format]
+        if not output_formats:
+            res = jsonify(error=("Please give a comma-separated list of output formats "
+                                 "in the 'outputs' parameter."))
+            return cors_response(res, 400)
+
+        unknown_formats = [output_format for output_format in output_formats
+                           if output_format not in WRITE_FUNCTIONS]
+        if unknown_formats:
+            res = jsonify(error="Unknown output format(s): {}".format(', '.join(unknown_formats)))
+            return cors_response(res, 400)
+
+        envelope = request.args.get('envelope', 'json')
+        if envelope not in ENVELOPE_FORMATS:
+            res = jsonify(error="Unknown envelope format: {}".format(envelope))
+            return cors_response(res, 400)
+
+        input_file = get_input_file(request)
+        if input_file is None:
+            res = jsonify(
+                error=("Please upload a file using the key "
+                       "'input' or the form field 'input'. "
+                       "Used file keys: {}. Used form fields: {}").format(list(request.files.keys()), list(request.form.keys())))
+            return cors_response(res, 500)
+
+        input_basename = Path(input_file.filename).stem
+        input_bytes = read_input(input_file, binary=True)
+        results = run_conversions(input_bytes, input_format, output_formats,
+                                  input_filename=input_file.filename)
+
+        outputs = []
+        errors = {}
+        for output_format in output_formats:
+            output_bytes, error = results[output_format]
+            if error is not None:
+                errors[output_format] = {'error': error.message,
+                                         'traceback': error.traceback}
+            else:
+                output_filename = "{0}.{1}".format(input_basename, output_format)
+                outputs.append((output_format, output_filename, output_bytes))
+
+        status = 500 if not outputs else 200
+        if envelope == 'multipart':
+            files = [(output_filename, output_bytes)
+                     for _, output_filename, output_bytes in outputs]
+            if errors:
+                files.append((BATCH_ERRORS_FILENAME,
+                              json.dumps(errors, indent=2).encode('utf-8')))
+            return cors_response(multipart_response(files), status)
+
+        result = {output_format: {'filename': output_filename,
+                                  'content': output_bytes.decode('utf-8')}
+                  for output_format, output_filename, output_bytes in outputs}
+        result.update(errors)
+        return cors_response(jsonify(result), status)
+
+
+@api.route('/convert-batch/<string:input_format>/<string:output_format>')
+class BatchFormatConverter(Resource):
+    def post(self, input_format, output_format):
+        """Convert many documents from one RST format to another.
+
+        The documents can be uploaded as several files and/or as zip/tar
+        archives. The result is a zip archive (or a tar archive, if the
+        'archive' parameter is set to 'tar' or 'tar.gz') that contains one
+        output file per document. Documents that can't be converted don't
+        fail the whole batch, their errors are listed in the file
+        'errors.json' inside the archive.
+
+        Usage example:
+
+            curl -XPOST "http://localhost:5000/convert-batch/rs3/dis" -F input=@corpus.zip
+        """
+        if input_format not in READ_FUNCTIONS:
+            res = jsonify(error="Unknown input format: {}".format(input_format))
+            return cors_response(res, 400)
+
+        if output_format not in WRITE_FUNCTIONS:
+            res = jsonify(error="Unknown output format: {}".format(output_format))
+            return cors_response(res, 400)
+
+        archive_format = request.args.get('archive', 'zip')
+        if archive_format not in ARCHIVE_FORMATS:
+            res = jsonify(error="Unknown archive format: {}".format(archive_format))
+            return cors_response(res, 400)
+
+        try:
+            documents = get_batch_input_files(request)
+        except (tarfile.TarError, zipfile.BadZipFile) as err:
+            res = jsonify(error="Can't read input archive. Got: {}".format(err))
+            return cors_response(res, 400)
+        except BatchLimitError as err:
+            res = jsonify(error=str(err))
+            return cors_response(res, 413)
+
+        if not documents:
+            res = jsonify(
+                error=("Please upload one or more files (or zip/tar archives). "
+                       "Used file keys: {}").format(list(request.files.keys())))
+            return cors_response(res, 500)
+
+        results = convert_documents(documents, input_format, output_format)
+
+        outputs = []
+        errors = {}
+        output_filenames = set()
+        for (input_filename, _), (output_bytes, error) in zip(documents, results):
+            if error is not None:
+                errors[input_filename] = {'error': error.message,
+                                          'traceback': error.traceback}
+            else:
+                output_filename = get_output_filename(
+                    input_filename, output_format, output_filenames)
+                output_filenames.add(output_filename)
+                outputs.append((output_filename, output_bytes))
+
+        if errors:
+            outputs.append((BATCH_ERRORS_FILENAME,
+                            json.dumps(errors, indent=2).encode('utf-8')))
+
+        archive_filename = "converted.{}".format(archive_format)
+        res = send_file(write_archive(outputs, archive_format), as_attachment=True,
+                        attachment_filename=archive_filename)
+        res.headers.add('X-Converted-Documents', str(len(documents) - len(errors)))
+        res.headers.add('X-Failed-Documents', str(len(errors)))
+        return cors_response(res)
+
+
+class ConversionError(Exception):
+    """An input file can't be read or can't be converted into the output format."""
+    def __init__(self, message, traceback=None):
+        super(ConversionError, self).__init__(message, traceback)
+        self.message = message
+        self.traceback = traceback
+
+    def __str__(self):
+        return self.message
+
+
+def convert_document(input_bytes, input_format, output_format, input_filename='input'):
+    """Convert the content of an input file (bytes) from one RST format
+    into another and return the result (bytes).
+
+    Raises a ConversionError, if the input can't be read or converted.
+    """
+    tree = read_document(input_bytes, input_format, input_filename=input_filename)
+    return write_document(tree, output_format, input_filename=input_filename)
+
+
+def read_document(input_bytes, input_format, input_filename='input'):
+    """Parse the content of an input file (bytes) into an RST tree.
+
+    Raises a ConversionError, if the input can't be read.
+    """
+    read_function = READ_FUNCTIONS[input_format]
+    try:
+        return read_function(input_bytes)
+    except Exception as err:
+        error_msg = "{0} can't handle input file '{1}'. Got: {2}".format(
+            read_function, input_filename, err)
+        raise ConversionError(error_msg, traceback.format_exc())
+
+
+def write_document(tree, output_format, input_filename='input'):
+    """Convert an RST tree into the given output format and return the
+    result (bytes).
+
+    Raises a ConversionError, if the tree can't be converted.
+    """
+    write_function = WRITE_FUNCTIONS[output_format]
+    output_buffer = io.BytesIO()
+    try:
+        write_function(tree, output_file=output_buffer)
+    except Exception as err:
+        error_msg = ("{writer} can't convert ParentedTree to {output_format}. "
+                    "Input file '{input_file}'. Got: {error}").format(
+            writer=write_function, output_format=output_format,
+            input_file=input_filename, error=err)
+        raise ConversionError(error_msg, traceback.format_exc())
+
+    return output_buffer.getvalue()
+
+
+def parse_document(input_bytes, input_format, input_filename='input'):
+    """Parse the content of an input file (bytes) and return its
+    DGParentedTree in serialized form (cf. dumps_tree(), which also
+    handles very deep trees).
+
+    Raises a ConversionError, if the input can't be read or serialized.
+    """
+    tree = read_document(input_bytes, input_format, input_filename=input_filename)
+    try:
+        return dumps_tree(tree.tree)
+    except Exception as err:
+        error_msg = "Can't serialize the tree of input file '{0}'. Got: {1}".format(
+            input_filename, err)
+        raise ConversionError(error_msg, traceback.format_exc())
+
+
+def convert_parsed_document(tree_bytes, output_format, input_filename='input'):
+    """Convert a serialized DGParentedTree (cf. parse_document()) into the
+    given output format and return the result (bytes).
+
+    Raises a ConversionError, if the tree can't be converted.
+    """
+    # writers may change the tree (e.g. word wrapping), so every
+    # conversion gets its own copy of the cached tree
+    tree = RSTBaseTree()
+    try:
+        tree.tree = loads_tree(tree_bytes)
+    except Exception as err:
+        error_msg = "Can't deserialize the tree of input file '{0}'. Got: {1}".format(
+            input_filename, err)
+        raise ConversionError(error_msg, traceback.format_exc())
+    return write_document(tree, output_format, input_filename=input_filename)
+
+
+def run_conversion(input_bytes, input_format, output_format, input_filename='input',
+                   cache_key=None):
+    """Run convert_document() in the app's ConversionPool (if there is one)
+    or in the current thread. If the app has a ConversionCache, cached
+    results are returned without running the conversion again. If it has
+    a TREE_CACHE, the input file is only parsed, if it isn't cached yet.
+
+    Raises a ConversionError, if the input can't be converted and a
+    ConversionTimeout, if the conversion takes too long.
+    """
+    cache = app.config['CONVERSION_CACHE']
+    if cache is not None:
+        if cache_key is None:
+            cache_key = make_cache_key(input_bytes, input_format, output_format)
+        output_bytes = cache.get(cache_key)
+        if output_bytes is not None:
+            return output_bytes
+
+    if app.config['TREE_CACHE'] is None:
+        output_bytes = run_job(convert_document, input_bytes, input_format,
+                               output_format, input_filename=input_filename)
+    else:
+        tree_bytes = run_parser(input_bytes, input_format, input_filename=input_filename)
+        output_bytes = run_job(convert_parsed_document, tree_bytes, output_format,
+                               input_filename=input_filename)
+
+    if cache is not None:
+        cache.put(cache_key, output_bytes)
+    return output_bytes
+
+
+def run_parser(input_bytes, input_format, input_filename='input'):
+    """Run parse_document() in the app's ConversionPool (if there is one)
+    or in the current thread and return the serialized tree. If the app
+    has a TREE_CACHE, the input file is only parsed, if it isn't cached yet.
+    """
+    tree_cache = app.config['TREE_CACHE']
+    if tree_cache is not None:
+        tree_key = make_cache_key(input_bytes, input_format)
+        tree_bytes = tree_cache.get(tree_key)
+        if tree_bytes is not None:
+            return tree_bytes
+
+    tree_bytes = run_job(parse_document, input_bytes, input_format,
+                         input_filename=input_filename)
+    if tree_cache is not None:
+        tree_cache.put(tree_key, tree_bytes)
+    return tree_bytes
+
+
+def run_conversions(input_bytes, input_format, output_formats, input_filename='input'):
+    """Convert an input file into several output formats. The input file
+    is parsed (at most) once, the writers run in parallel.
+
+    Returns a dict from output formats to (output bytes, None) or
+    (None, ConversionError) tuples.
+    """
+    cache = app.config['CONVERSION_CACHE']
+    results = {}
+    cache_keys = {}
+    if cache is not None:
+        for output_format in output_formats:
+            cache_keys[output_format] = make_cache_key(input_bytes, input_format, output_format)
+            output_bytes = cache.get(cache_keys[output_format])
+            if output_bytes is not None:
+                results[output_format] = (output_bytes, None)
+
+    missing_formats = [output_format for output_format in output_formats
+                       if output_format not in results]
+    if not missing_formats:
+        return results
+
+    # without a pool (or tree cache), the writers run in this process,
+    # so the tree doesn't need to be serialized
+    in_process = app.config['CONVERSION_POOL'] is None and app.config['TREE_CACHE'] is None
+    try:
+        if in_process:
+            parsed_tree = read_document(input_bytes, input_format,
+                                        input_filename=input_filename).tree
+        else:
+            tree_bytes = run_parser(input_bytes, input_format, input_filename=input_filename)
+    except Exception as err:
+        error = as_conversion_error(err, input_filename)
+        results.update((output_format, (None, error)) for output_format in missing_formats)
+        return results
+
+    def convert(output_format):
+        try:
+            if in_process:
+                # writers may change the tree, so each one gets its own copy
+                tree = RSTBaseTree()
+                tree.tree = copy_tree(parsed_tree)
+                return write_document(tree, output_format, input_filename=input_filename), None
+            return run_job(convert_parsed_document, tree_bytes, output_format,
+                           input_filename=input_filename), None
+        except Exception as err:  # one failing output format doesn't fail the others
+            return None, as_conversion_error(err, input_filename)
+
+    workers = min(len(missing_formats), app.config['BATCH_WORKERS'])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for output_format, (output_bytes, error) in zip(
+                missing_formats, executor.map(convert, missing_formats)):
+            results[output_format] = (output_bytes, error)
+            if cache is not None and error is None:
+                cache.put(cache_keys[output_format], output_bytes)
+    return results
+
+
+def as_conversion_error(err, input_filename='input'):
+    """Returns the given ConversionError or ConversionTimeout (or any other
+    exception that is currently being handled) as a ConversionError."""
+    if isinstance(err, ConversionTimeout):
+        return ConversionError(
+            "Conversion of input file '{0}' timed out. {1}".format(input_filename, err))
+    if not isinstance(err, ConversionError):
+        return ConversionError(
+            "Can't convert input file '{0}'. Got: {1}".format(input_filename, err),
+            traceback.format_exc())
+    return err
+
+
+def run_job(function, *args, input_filename='input'):
+    """Run a conversion function in the app's ConversionPool (if there is
+    one) or in the current thread and return its result."""
+    pool = app.config['CONVERSION_POOL']
+    if pool is None:
+        return function(*args, input_filename=input_filename)
+    try:
+        return pool.run(function, *args, input_filename=input_filename)
+    except BrokenProcessPool as err:
+        raise ConversionError(
+            "Worker process died while converting input file '{0}'. Got: {1}".format(
+                input_filename, err))
+
+
+def convert_documents(documents, input_format, output_format):
+    """Convert a list of (filename, content) documents in parallel.
+
+    Returns a list of (output bytes, None) or (None, ConversionError) tuples
+    in the same order as the input documents.
+    """
+    def convert(document):
+        input_filename, input_bytes = document
+        try:
+            return run_conversion(input_bytes, input_format, output_format,
+                                  input_filename=input_filename), None
+        except (ConversionError, ConversionTimeout) as err:
+            return None, as_conversion_error(err, input_filename)
+
+    with ThreadPoolExecutor(max_workers=app.config['BATCH_WORKERS']) as executor:
+        return list(executor.map(convert, documents))
+
+
 def get_input_file(request):
     """Returns the input file from the POST request (no matter if it was sent as
     a file named 'input' or a form field named 'input').
@@ -153,6 +586,159 @@ def get_input_file(request):
         return werkzeug.FileStorage(stringio_file, 'input.ext')
 
 
+class BatchLimitError(ValueError):
+    """A /convert-batch upload contains too many or too large documents."""
+
+
+class BatchLimits(object):
+    """Keeps track of the documents unpacked from a /convert-batch upload and
+    raises a BatchLimitError as soon as one of the limits is exceeded.
+    A limit of None means 'unlimited'.
+    """
+    def __init__(self, max_documents=None, max_document_size=None, max_total_size=None):
+        self.max_documents = max_documents
+        self.max_document_size = max_document_size
+        self.max_total_size = max_total_size
+        self.documents = 0
+        self.total_size = 0
+
+    def add(self, filename, size):
+        """Account for a document of the given size (in bytes), before it is
+        read into memory."""
+        self.documents += 1
+        self.total_size += size
+        if self.max_documents is not None and self.documents > self.max_documents:
+            raise BatchLimitError(
+                "Too many documents (maximum: {})".format(self.max_documents))
+        if self.max_document_size is not None and size > self.max_document_size:
+            raise BatchLimitError(
+                "Document '{0}' is too large (maximum: {1} bytes)".format(
+                    filename, self.max_document_size))
+        if self.max_total_size is not None and self.total_size > self.max_total_size:
+            raise BatchLimitError(
+                "Documents are too large (maximum: {} bytes in total)".format(
+                    self.max_total_size))
+
+
+def get_batch_input_files(request, limits=None):
+    """Returns a list of (filename, content) tuples of all documents uploaded
+    in the given POST request. Uploaded zip/tar archives are unpacked
+    (in memory). Unless other BatchLimits are given, the limits are taken
+    from the app config.
+    """
+    if limits is None:
+        limits = BatchLimits(app.config['BATCH_MAX_DOCUMENTS'],
+                             app.config['BATCH_MAX_DOCUMENT_SIZE'],
+                             app.config['BATCH_MAX_TOTAL_SIZE'])
+    documents = []
+    for file_key in request.files:
+        for input_file in request.files.getlist(file_key):
+            input_bytes = read_input(input_file, binary=True)
+            input_filename = input_file.filename or file_key
+            documents.extend(unpack_archive(input_filename, input_bytes, limits))
+    return documents
+
+
+def unpack_archive(filename, content, limits=None):
+    """Returns a list of (filename, content) tuples of all regular files in
+    the given zip/tar archive. If the given content is not an archive,
+    it is returned as the only document.
+
+    The size of each member is checked against the given BatchLimits before
+    it is read. Tar archives must not contain links or special files.
+    """
+    if limits is None:
+        limits = BatchLimits()
+
+    if zipfile.is_zipfile(io.BytesIO(content)):
+        documents = []
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or is_hidden_file(member.filename):
+                    continue
+                # zipfile never reads more than the size given in the header
+                limits.add(member.filename, member.file_size)
+                documents.append((member.filename, archive.read(member)))
+        return documents
+
+    try:
+        archive = tarfile.open(fileobj=io.BytesIO(content))
+    except tarfile.TarError:
+        limits.add(filename, len(content))
+        return [(filename, content)]
+
+    documents = []
+    with archive:
+        for member in archive:
+            if member.isdir():
+                continue
+            if not member.isfile():
+                raise tarfile.TarError(
+                    "Archive member '{}' is not a regular file".format(member.name))
+            if is_hidden_file(member.name):
+                continue
+            limits.add(member.name, member.size)
+            documents.append((member.name, archive.extractfile(member).read()))
+    return documents
+
+
+def is_hidden_file(filepath):
+    """Returns True, iff the given archive member is a hidden file or
+    contains OS metadata (e.g. '__MACOSX/' entries in zip files)."""
+    return (filepath.startswith('__MACOSX/')
+            or posixpath.basename(filepath).startswith('.'))
+
+
+def get_output_filename(input_filename, output_format, used_filenames=()):
+    """Returns the name of the output file of a converted document, keeping
+    the directory structure of the input archive, e.g. 'dir/doc.rs3'
+    becomes 'dir/doc.dis'. A number is appended to the name, if it is
+    already in use.
+    """
+    input_root = posixpath.splitext(input_filename)[0]
+    output_filename = "{0}.{1}".format(input_root, output_format)
+    i = 1
+    while output_filename in used_filenames:
+        output_filename = "{0}-{1}.{2}".format(input_root, i, output_format)
+        i += 1
+    return output_filename
+
+
+def write_archive(files, archive_format='zip'):
+    """Writes the given (filename, content) tuples into an in-memory zip/tar
+    archive and returns it as a BytesIO buffer."""
+    buffer = io.BytesIO()
+    if archive_format == 'zip':
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for filename, content in files:
+                archive.writestr(filename, content)
+    else:
+        mode = 'w:gz' if archive_format == 'tar.gz' else 'w'
+        with tarfile.open(fileobj=buffer, mode=mode) as archive:
+            for filename, content in files:
+                member = tarfile.TarInfo(filename)
+                member.size = len(content)
+                archive.addfile(member, io.BytesIO(content))
+    buffer.seek(0)
+    return buffer
+
+
+def multipart_response(files):
+    """Returns a multipart/mixed response with one part (i.e. attachment)
+    for each of the given (filename, content) tuples."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for filename, content in files:
+        body.write("--{0}\r\nContent-Type: application/octet-stream\r\n"
+                   "Content-Disposition: attachment; filename=\"{1}\"\r\n\r\n".format(
+                       boundary, filename).encode('utf-8'))
+        body.write(content)
+        body.write(b'\r\n')
+    body.write("--{0}--\r\n".format(boundary).encode('utf-8'))
+    return app.response_class(
+        body.getvalue(), mimetype='multipart/mixed; boundary={}'.format(boundary))
+
+
 def cors_response(response, status=200):
     """Returns the given response with CORS='*' and the given status code."""
     response.status_code = status
@@ -160,8 +746,79 @@ def cors_response(response, status=200):
     return response
 
 
+def init_conversion_pool(app, workers=None, timeout=None, max_jobs_per_worker=None):
+    """Let the given app run all conversions in a pool of worker processes.
+
+    This can also be used to configure the app when it is served by an
+    external WSGI server.
+    """
+    app.config['CONVERSION_POOL'] = ConversionPool(
+        max_workers=workers, timeout=timeout,
+        max_jobs_per_worker=max_jobs_per_worker)
+    if workers:
+        # batch conversions need (at least) one thread per worker process
+        app.config['BATCH_WORKERS'] = max(app.config['BATCH_WORKERS'], workers)
+    return app.config['CONVERSION_POOL']
+
+
+def init_conversion_cache(app, max_bytes, cache_dir=None):
+    """Let the given app cache the results of its conversions in memory
+    (up to max_bytes) and optionally in the given directory.
+    """
+    app.config['CONVERSION_CACHE'] = ConversionCache(max_bytes, cache_dir=cache_dir)
+    return app.config['CONVERSION_CACHE']
+
+
+def init_tree_cache(app, max_bytes, ttl=None):
+    """Let the given app cache parsed input files in memory (up to max_bytes,
+    for at most ttl seconds), so that converting the same input file into
+    several output formats runs the reader only once.
+    """
+    app.config['TREE_CACHE'] = ConversionCache(max_bytes, ttl=ttl)
+    return app.config['TREE_CACHE']
+
+
 def main():
-    app.run(debug=False, host='0.0.0.0')
+    parser = argparse.ArgumentParser(
+        description="REST API for converting between RST file formats.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help=("number of worker processes used for conversions "
+              "(default: 0, i.e. convert in the request handling threads)"))
+    parser.add_argument(
+        '--timeout', type=float, default=None,
+        help="maximum number of seconds a conversion may take (needs --workers)")
+    parser.add_argument(
+        '--max-jobs-per-worker', type=int, default=None,
+        help="replace the worker processes after this many jobs (needs --workers)")
+    parser.add_argument(
+        '--cache-size', type=float, default=0,
+        help="cache conversion results in memory, up to the given number of MiB "
+             "(default: 0, i.e. don't cache)")
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help="also cache conversion results in this directory (needs --cache-size)")
+    parser.add_argument(
+        '--tree-cache-size', type=float, default=0,
+        help="cache parsed input files in memory, up to the given number of MiB "
+             "(default: 0, i.e. don't cache)")
+    parser.add_argument(
+        '--tree-cache-ttl', type=float, default=None,
+        help="maximum number of seconds a parsed input file is cached")
+    args = parser.parse_args()
+
+    if args.cache_size > 0:
+        init_conversion_cache(app, int(args.cache_size * 1024 ** 2),
+                              cache_dir=args.cache_dir)
+    if args.tree_cache_size > 0:
+        init_tree_cache(app, int(args.tree_cache_size * 1024 ** 2),
+                        ttl=args.tree_cache_ttl)
+    if args.workers > 0:
+        init_conversion_pool(app, workers=args.workers, timeout=args.timeout,
+                             max_jobs_per_worker=args.max_jobs_per_worker)
+    app.run(debug=False, host=args.host, port=args.port, threaded=True)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Arne Neumann <discoursegraphs.programming@arne.cl>
+
+"""
+This module contains a cache for the results of conversions (and for parsed
+input files), which is used by the REST API to answer repeated requests for
+the same input file without running the reader and/or writer again.
+"""
+
+from collections import OrderedDict
+import hashlib
+from importlib import metadata
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+def get_package_version():
+    """Return the version of the installed rstconverter package."""
+    try:
+        return metadata.version('rstconverter')
+    except metadata.PackageNotFoundError:  # e.g. running from a source checkout
+        return 'unknown'
+
+
+# cached results (and ETags) of older versions of the converters are not reused
+CACHE_VERSION = get_package_version()
+
+
+def make_cache_key(input_bytes, input_format, output_format=None, options=None):
+    """Return a key (hex string) that identifies the result of a conversion.
+
+    The key is the SHA-256 hash of the input file, the input/output formats,
+    the (JSON-serializable) conversion options and the version of this
+    package, so it can also be used as an HTTP ETag. Without an output
+    format, the key identifies the parsed input file.
+    """
+    key_hash = hashlib.sha256(input_bytes)
+    key_hash.update(b'\0')
+    key_hash.update(json.dumps(
+        [input_format, output_format, options or {}, CACHE_VERSION],
+        sort_keys=True).encode('utf-8'))
+    return key_hash.hexdigest()
+
+
+class ConversionCache(object):
+    """A thread-safe cache of conversion results (bytes).
+
+    Results are kept in memory and evicted in least-recently-used order,
+    once their total size exceeds ``max_bytes``. If a ``cache_dir`` is
+    given, results are also written to disk, so that results evicted
+    from memory (or cached by another process) can be reused. The disk tier
+    is best-effort, i.e. errors reading or writing it are logged and the
+    result is only kept in memory. If a ``ttl``
+    is given, results older than ``ttl`` seconds are treated as missing.
+
+    Parameters
+    ----------
+    max_bytes : int
+        maximum total size of the results kept in memory
+    cache_dir : str or None
+        directory used for the (unbounded) on-disk tier of the cache
+    ttl : float or None
+        maximum age of a result in seconds
+    """
+    def __init__(self, max_bytes, cache_dir=None, ttl=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.size = 0  # total size of the results kept in memory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, key):
+        return key in self._results or (
+            self.cache_dir is not None and os.path.exists(self._disk_path(key)))
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _is_expired(self, timestamp):
+        return self.ttl is not None and time.time() - timestamp > self.ttl
+
+    def _add(self, key, value, timestamp=None):
+        """Add a result to the in-memory tier and evict the least recently
+        used results. Must be called while holding the lock."""
+        if key in self._results:
+            self.size -= len(self._results.pop(key)[0])
+        if len(value) > self.max_bytes:
+            return
+        self._results[key] = (value, timestamp or time.time())
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._results.popitem(last=False)
+            self.size -= len(evicted)
+
+    def get(self, key):
+        """Return the cached result for the given key or None."""
+        with self._lock:
+            value, timestamp = self._results.get(key, (None, None))
+            if value is not None:
+                if not self._is_expired(timestamp):
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._results[key]
+                self.size -= len(value)
+                self.expired += 1
+
+        if self.cache_dir is not None:
+            value, timestamp = self._read_from_disk(key)
+            if value is not None:
+                with self._lock:
+                    self._add(key, value, timestamp)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _read_from_disk(self, key):
+        """Return the result stored in the on-disk tier and the time it
+        was stored or (None, None)."""
+        disk_path = self._disk_path(key)
+        try:
+            timestamp = os.path.getmtime(disk_path)
+            if self._is_expired(timestamp):
+                os.remove(disk_path)
+                with self._lock:
+                    self.expired += 1
+                return None, None
+            with open(disk_path, 'rb') as cache_file:
+                return cache_file.read(), timestamp
+        except FileNotFoundError:
+            return None, None
+        except OSError as err:
+            logging.log(logging.WARNING,
+                        "Can't read cached result from {0}: {1}".format(disk_path, err))
+            return None, None
+
+    def put(self, key, value):
+        """Add the result (bytes) of a conversion to the cache."""
+        with self._lock:
+            self._add(key, value)
+
+        if self.cache_dir is not None:
+            self._write_to_disk(key, value)
+
+    def _write_to_disk(self, key, value):
+        """Store a result in the on-disk tier (if possible)."""
+        disk_path = self._disk_path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            # write to a temporary file first, so that readers never see
+            # incomplete results
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(disk_path))
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(value)
+            os.replace(tmp_path, disk_path)
+        except OSError as err:
+            logging.log(logging.WARNING,
+                        "Can't write cached result to {0}: {1}".format(disk_path, err))
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        """Remove all results from the in-memory tier of the cache."""
+        with self._lock:
+            self._results.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return the hit/miss counters and the size of the cache."""
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'expired': self.expired,
+                    'entries': len(self._results), 'size': self.size,
+                    'max_size': self.max_bytes, 'ttl': self.ttl}
@@ -1,5 +1,4 @@
 import argparse
-import io
 import logging
 import sys
 
@@ -33,10 +32,8 @@ def main():
         )
     
     try:
-        if isinstance(args.output_file, io.TextIOWrapper):
-            write_function(tree, output_file=args.output_file.name)
-        else:
-            write_function(tree, output_file=args.output_file)
+        # output_file is either a path or sys.stdout
+        write_function(tree, output_file=args.output_file)
     except Exception as ex:
         logging.exception("Can't convert input file {} to {}".format(
             args.input_file, args.output_format))
@@ -6,10 +6,24 @@
 This module contains code that is used by more than one RST-related modules.
 """
 
+import codecs
+from contextlib import contextmanager
+import io
+import os
+
+
 class RSTBaseTree(object):
     """Base class for converter's from from RST file formats into
     DGParentedTree-based trees.
     """
+    @classmethod
+    def fromstring(cls, input_string, **kwargs):
+        """Create an instance from a string (or bytes) containing the
+        content of an input file."""
+        if isinstance(input_string, str):
+            input_string = input_string.encode('utf-8')
+        return cls(input_string, **kwargs)
+
     def _repr_png_(self):
         """This PNG representation will be automagically used inside
         IPython notebooks.
@@ -29,3 +43,104 @@ class RSTBaseTree(object):
 
     def __getitem__(self, key):
         return self.tree.__getitem__(key)
+
+
+def is_binary_stream(file_obj):
+    """Returns True, iff the given file-like object is known to read/write bytes."""
+    return isinstance(file_obj, (io.BufferedIOBase, io.RawIOBase))
+
+
+def get_filepath(input_file):
+    """Return the path of the given input file or None, if the input
+    was given as bytes or as a file-like object without a name.
+    """
+    if isinstance(input_file, (str, os.PathLike)):
+        return input_file
+    name = getattr(input_file, 'name', None)
+    return name if isinstance(name, str) else None
+
+
+@contextmanager
+def open_input(input_file, binary=False):
+    """Open an RST input file for reading.
+
+    Parameters
+    ----------
+    input_file : str, bytes or file-like object
+        the path to an input file, the content of an input file (bytes)
+        or a file-like object (opened in text or binary mode)
+    binary : bool
+        If True, yield a binary stream. Otherwise, yield a text stream
+        (input is decoded as UTF-8).
+    """
+    if isinstance(input_file, bytes):
+        if binary:
+            yield io.BytesIO(input_file)
+        else:
+            yield io.StringIO(input_file.decode('utf-8'))
+
+    elif hasattr(input_file, 'read'):
+        if binary and is_binary_stream(input_file):
+            yield input_file
+        elif not binary and isinstance(input_file, io.TextIOBase):
+            yield input_file
+        else:  # the stream has the wrong mode (or we can't tell)
+            content = input_file.read()
+            if binary:
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                yield io.BytesIO(content)
+            else:
+                if isinstance(content, bytes):
+                    content = content.decode('utf-8')
+                yield io.StringIO(content)
+
+    else:
+        if binary:
+            with open(input_file, 'rb') as input_stream:
+                yield input_stream
+        else:
+            with io.open(input_file, 'r', encoding='utf-8') as input_stream:
+                yield input_stream
+
+
+def read_input(input_file, binary=False):
+    """Return the content of an RST input file (given as a path, bytes or
+    a file-like object) as a string (or as bytes, iff binary is True).
+    """
+    with open_input(input_file, binary=binary) as input_stream:
+        return input_stream.read()
+
+
+@contextmanager
+def open_output(output_file, binary=False):
+    """Open an output file for writing.
+
+    Parameters
+    ----------
+    output_file : str or file-like object
+        the path to an output file or a file-like object (opened in text
+        or binary mode)
+    binary : bool
+        If True, yield a stream that accepts bytes. Otherwise, yield a
+        stream that accepts strings (which will be encoded as UTF-8).
+    """
+    if hasattr(output_file, 'write'):
+        sink_is_binary = not isinstance(output_file, io.TextIOBase)
+        if binary == sink_is_binary:
+            yield output_file
+        elif binary:  # bytes written to a text stream
+            buffer = io.BytesIO()
+            yield buffer
+            output_file.write(buffer.getvalue().decode('utf-8'))
+        else:  # strings written to a binary stream
+            buffer = io.StringIO()
+            yield buffer
+            output_file.write(buffer.getvalue().encode('utf-8'))
+
+    elif binary:
+        with open(output_file, 'wb') as output_stream:
+            yield output_stream
+    else:
+        with codecs.open(output_file, 'w', 'utf-8') as output_stream:
+            yield output_stream
@@ -5,6 +5,7 @@ import re
 import sys
 
 from rstconverter.dis.distree import DisRSTTree
+from rstconverter.tree import transform_leaves, wrap_text
 
 EDU_START_RE = re.compile("^_!")
 EDU_END_RE = re.compile("_!$")
@@ -16,21 +17,25 @@ class CodraRSTTree(DisRSTTree):
 
     The CODRA RST parser uses the same *.dis format that was used by the RST-DT corpus
     and early versions of RSTTool, but it's string escaping is different.
+    By default, the EDUs are cleaned up while the file is tokenized (cf. the
+    'codra' dialect of parse_dis_tree()).
     """
-    def __init__(self, dis_filepath, word_wrap=0, debug=False):
-        super(CodraRSTTree, self).__init__(dis_filepath, word_wrap=word_wrap, debug=debug)
-        self.cleanup_codra_edus()
-
-    def cleanup_codra_edus(self):
-        """Remove leading/trailing '_!' from CODRA EDUs and unescape its double quotes."""
-        for leafpos in self.tree.treepositions('leaves'):
-            edu_str = self.tree[leafpos]
-
-            edu_str = EDU_START_RE.sub("", edu_str)
-            edu_str = TRIPLE_ESCAPE_RE.sub('"', edu_str)
-            edu_str = EDU_END_RE.sub("", edu_str)
-
-            self.tree[leafpos] = edu_str
+    dialect = 'codra'
+
+    def normalize_tree(self, tree, word_wrap=0):
+        """Line-wrap the EDUs of the tree built by the two-stage path and
+        clean them up (in one traversal)."""
+        if word_wrap == 0:
+            return transform_leaves(tree, self.cleanup_edu_text)
+        return transform_leaves(
+            tree, lambda edu_str: self.cleanup_edu_text(wrap_text(edu_str, word_wrap)))
+
+    @staticmethod
+    def cleanup_edu_text(edu_str):
+        """Remove leading/trailing '_!' from a CODRA EDU and unescape its double quotes."""
+        edu_str = EDU_START_RE.sub("", edu_str)
+        edu_str = TRIPLE_ESCAPE_RE.sub('"', edu_str)
+        return EDU_END_RE.sub("", edu_str)
 
 # pseudo-function to create a document tree from a RST (.codra) file
 read_codra = CodraRSTTree
@@ -10,14 +10,13 @@ It contains some MIT licensed code from
 github.com/EducationalTestingService/discourse-parsing
 """
 
-import codecs
 from collections import defaultdict
-import os
 import re
-import tempfile
 
 from nltk.tree import ParentedTree
 
+from rstconverter.common import get_filepath, read_input
+
 
 PTB_BRACKET_ESCAPE = {'(': r'-LRB-',
                        ')': r'-RRB-',
@@ -32,45 +31,65 @@ SUBTREE_TYPES = (ROOT, NUC, SAT)
 NODE_TYPES = ('leaf', 'span')
 DIS_ESCAPES = (('(', r'-LRB-'), (')', r'-RRB-'))
 
+# an EDU, i.e. a text delimited by '_!' (which may contain brackets)
+EDU_RE = re.compile('_!(.*?)_!')
+
+# variants of the *.dis format: the RST-DT / RSTTool format and the output
+# of the CODRA parser (which escapes double quotes in EDUs as \\\")
+DIS_DIALECTS = ('dis', 'codra')
+CODRA_ESCAPED_QUOTE = '\\\\\\"'
+
+# tokens of a *.dis file. EDUs are opaque parts of a leaf, i.e. their
+# whitespace and brackets don't need to be escaped for the tokenizer.
+# Otherwise, this follows the tokenization of nltk.Tree.fromstring().
+DIS_TOKEN_RE = re.compile(r"""
+    (?P<open>\(\s*(?P<label>(?:\\[()]|[^\s()])+)?)  # start of a (sub)tree
+    |(?P<close>\))                                   # end of a (sub)tree
+    |(?P<leaf>(?:_!.*?_!|\\[()]|[^\s()])+)           # a leaf, e.g. an EDU
+    """, re.VERBOSE)
+
 
 class DisFile(object):
     """A DisFile instance represents the structure of a *.dis file as a ParentedTree.
 
     NOTE: The resulting tree represents the file format (i.e. the syntax of a *.dis file),
     not its meaning (i.e. it doesn't look like an RST tree).
+
+    ``dis_filepath`` can be a path, the content of a *.dis file (bytes) or
+    a file-like object.
     """
     def __init__(self, dis_filepath):
-        self.filepath = dis_filepath
-
-        with codecs.open(dis_filepath, 'r', 'utf-8') as disfile:
-            rst_tree_str = disfile.read().strip()
-            rst_tree_str = fix_rst_treebank_tree_str(rst_tree_str)
-            rst_tree_str = convert_parens_in_rst_tree_str(rst_tree_str)
-            self.tree = ParentedTree.fromstring(rst_tree_str)
+        self.filepath = get_filepath(dis_filepath)
 
-            # replace escaped brackets (e.g. -LRB-) with real brackets
-            for leaf_pos in self.tree.treepositions('leaves'):
-                leaf = self.tree[leaf_pos]
-                for (bracket, bracket_replacement) in DIS_ESCAPES:
-                    leaf = re.sub(bracket_replacement, bracket, leaf)
-                self.tree[leaf_pos] = leaf
+        rst_tree_str = read_input(dis_filepath).strip()
+        rst_tree_str = fix_rst_treebank_tree_str(rst_tree_str)
+        self.tree = parse_dis_tree(rst_tree_str)
 
     @classmethod
     def fromstring(cls, dis_string):
         """Create a DisFile instance from a string containing a *.dis parse."""
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(dis_string)
-        temp.close()
-        dis_file = cls(dis_filepath=temp.name)
-        os.unlink(temp.name)
-        return dis_file
+        if isinstance(dis_string, str):
+            dis_string = dis_string.encode('utf-8')
+        return cls(dis_filepath=dis_string)
 
 
-def get_edu_text(text_subtree):
+def get_edu_text(text_subtree, dialect='dis'):
     """return the text of the given EDU subtree, with '_!'-delimiters removed."""
     assert text_subtree.label() == 'text', "text_subtree: {}".format(text_subtree)
-    edu_str = ' '.join(word for word in text_subtree.leaves())
-    return re.sub('_!(.*?)_!', '\g<1>', edu_str)
+    return join_edu_leaves(text_subtree.leaves(), dialect=dialect)
+
+
+def join_edu_leaves(leaves, dialect='dis'):
+    """return the text of an EDU given the leaves of its (text ...) subtree,
+    with '_!'-delimiters removed. CODRA EDUs can also contain unpaired
+    delimiters at their start/end, which are removed as well."""
+    edu_str = EDU_RE.sub(r'\1', ' '.join(leaves))
+    if dialect == 'codra':
+        if edu_str.startswith('_!'):
+            edu_str = edu_str[2:]
+        if edu_str.endswith('_!'):
+            edu_str = edu_str[:-2]
+    return edu_str
 
 
 def get_tree_type(tree):
@@ -157,13 +176,15 @@ def fix_rst_treebank_tree_str(rst_tree_str):
     source: github.com/EducationalTestingService/discourse-parsing
     original license: MIT
     '''
-    return re.sub(r'\)//TT_ERR', ')', rst_tree_str)
+    return rst_tree_str.replace(')//TT_ERR', ')')
 
 
 def convert_parens_in_rst_tree_str(rst_tree_str):
     '''
     This converts '(' and ')' brackets the EDUs of the RST into PTB-style
     tokens (e.g., -LRB-) to escape them for nltk.
+
+    NOTE: This isn't needed for parse_dis_tree(), which doesn't split EDUs.
     '''
     def replace_brackets(matchobj):
         edu = matchobj.group(0)
@@ -172,3 +193,61 @@ def convert_parens_in_rst_tree_str(rst_tree_str):
         return edu
 
     return re.sub('_!(.*?)_!', replace_brackets, rst_tree_str)
+
+
+def normalize_dis_leaf(leaf, dialect='dis'):
+    """Return a leaf of a *.dis file as nltk.Tree.fromstring() would have
+    read it from a string with escaped brackets (cf. convert_parens_in_rst_tree_str()),
+    i.e. with normalized whitespace and unescaped -LRB-/-RRB- tokens.
+    In the 'codra' dialect, the double quotes of EDUs are unescaped as well.
+    """
+    if '_!' in leaf:  # only EDUs can contain whitespace
+        leaf = ' '.join(leaf.split())
+        if dialect == 'codra' and '\\' in leaf:
+            leaf = leaf.replace(CODRA_ESCAPED_QUOTE, '"')
+    if '-' in leaf:
+        for (bracket, bracket_replacement) in DIS_ESCAPES:
+            leaf = leaf.replace(bracket_replacement, bracket)
+    return leaf
+
+
+def parse_dis_tree(dis_str, make_tree=ParentedTree, dialect='dis'):
+    """Parse the content of a *.dis file into a tree that represents the
+    syntax of the file, e.g.::
+
+        ( Root (span 1 2)
+          ( Satellite (leaf 1) (rel2par Contrast) (text _!Although they did n't like it ,_!) )
+          ( Nucleus (leaf 2) (rel2par span) (text _!they accepted the offer ._!) )
+        )
+
+    Unlike nltk.Tree.fromstring(), EDUs (i.e. texts delimited by '_!') are
+    read as one leaf, so their brackets don't need to be escaped and unescaped.
+
+    ``make_tree`` is a tree class (or a function) that is called with the
+    label and the (already converted) children of each (sub)tree.
+    ``dialect`` is one of DIS_DIALECTS (cf. normalize_dis_leaf()).
+    """
+    if dialect not in DIS_DIALECTS:
+        raise ValueError("Unknown *.dis dialect: {}".format(dialect))
+    stack = [(None, [])]  # (label, children) of all unfinished (sub)trees
+    for match in DIS_TOKEN_RE.finditer(dis_str):
+        kind = match.lastgroup
+        if kind == 'leaf':
+            if len(stack) == 1:
+                raise ValueError("Expected '(' at position {}".format(match.start()))
+            stack[-1][1].append(normalize_dis_leaf(match.group('leaf'), dialect))
+        elif kind == 'close':
+            if len(stack) == 1:
+                raise ValueError("Unexpected ')' at position {}".format(match.start()))
+            label, children = stack.pop()
+            stack[-1][1].append(make_tree(label, children))
+        else:  # start of a (sub)tree
+            if len(stack) == 1 and stack[0][1]:
+                raise ValueError("Expected end of string at position {}".format(match.start()))
+            stack.append((match.group('label') or '', []))
+
+    if len(stack) > 1:
+        raise ValueError("Expected ')' at the end of the string")
+    if not stack[0][1]:
+        raise ValueError("Expected '(' at the end of the string")
+    return stack[0][1][0]
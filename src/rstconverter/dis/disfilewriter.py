@@ -6,11 +6,13 @@
 This module converts `DGParentedTree`s into .dis files.
 """
 
-import codecs
-import os
-import re
+import io
 
-from rstconverter.tree import DGParentedTree, t, is_leaf
+from rstconverter.common import open_output
+from rstconverter.tree import DGParentedTree, NodeTable, t, is_leaf
+
+# maximum line width of the .dis output (cf. nltk.Tree.pformat())
+DIS_MARGIN = 70
 
 
 class DisFileWriter(object):
@@ -20,16 +22,123 @@ class DisFileWriter(object):
             dgtree = dgtree.tree
 
         self.dgtree = dgtree
-        self.disfiletree = convert(dgtree)
+        self.nodes = DisNodeTable(dgtree)
+        self.spans = get_spans(dgtree)
+        self._disfiletree = None
 
         if output_filepath is not None:
-            with codecs.open(output_filepath, 'w', 'utf-8') as outfile:
-                outfile.write(self.to_dis_format())
+            with open_output(output_filepath) as outfile:
+                self.write(outfile)
+
+    @property
+    def disfiletree(self):
+        """The .dis representation of the tree as an nltk tree (which is
+        only built on demand, e.g. for pretty-printing)."""
+        if self._disfiletree is None:
+            self._disfiletree = convert(self.dgtree, spans=self.spans, nodes=self.nodes)
+        return self._disfiletree
 
     def to_dis_format(self):
         """Return a string representation of the tree in .dis format."""
-        dis_raw_str = self.disfiletree.pformat()
-        return re.sub('_!(.*?)_!', join_lines, dis_raw_str, flags=re.DOTALL)
+        output = io.StringIO()
+        self.write(output)
+        return output.getvalue()
+
+    def write(self, outfile):
+        """Write the tree in .dis format to the given file-like object.
+
+        The output is written in a single (non-recursive) traversal of the
+        tree and has the same layout as ``self.disfiletree.pformat()``
+        (with each EDU on a single line).
+        """
+        flat_lengths = self.get_flat_lengths()
+
+        def flat_length(dis_node):
+            if isinstance(dis_node, int):
+                return flat_lengths[dis_node]
+            label, children = dis_node
+            return get_flat_length(label, [len(child) for child in children])
+
+        stack = [(0, 0)]  # (.dis node or string, indentation)
+        while stack:
+            dis_node, indent = stack.pop()
+            if isinstance(dis_node, str):
+                outfile.write(dis_node)
+            elif flat_length(dis_node) + indent < DIS_MARGIN:
+                outfile.write(self.format_flat(dis_node))
+            else:
+                label, children = self.get_dis_node(dis_node)
+                outfile.write('(' + label)
+                child_indent = indent + 2
+                newline = '\n' + ' ' * child_indent
+                stack.append((')', None))
+                for child in reversed(children):
+                    if isinstance(child, str):
+                        stack.append((newline + child, None))
+                    else:
+                        stack.append((child, child_indent))
+                        stack.append((newline, None))
+
+    def get_dis_node(self, dis_node):
+        """Return the label and the children of the given .dis node.
+
+        A .dis node is either a (label, list of strings) tuple (e.g. the
+        'span' or 'text' nodes) or the index of a node in self.nodes. The
+        children of a .dis node are strings or .dis nodes.
+        """
+        if not isinstance(dis_node, int):
+            return dis_node
+
+        nodes = self.nodes
+        subtree = nodes.subtrees[dis_node]
+        if nodes.labels[dis_node] is None:  # an EDU
+            return ('text', [format_edu(subtree)])
+
+        first_edu_id, last_edu_id = self.spans[id(subtree)]
+        if nodes.parents[dis_node] is None:
+            children = [('span', ['1', str(last_edu_id)])]
+            label = 'Root'
+        else:
+            if first_edu_id == last_edu_id:
+                span = ('leaf', [str(first_edu_id)])
+            elif first_edu_id < last_edu_id:
+                span = ('span', [str(first_edu_id), str(last_edu_id)])
+            else:
+                raise NotImplementedError('Subtree has no leaves')
+            children = [span, ('rel2par', [nodes.rel2par(dis_node)])]
+            label = convert_label(nodes.labels[dis_node])
+
+        children.extend(nodes.nucsat_children(dis_node))
+        return label, children
+
+    def get_flat_lengths(self):
+        """Return the length of the single-line representation of each .dis
+        node (i.e. of each nucleus, satellite and EDU and of the root)."""
+        flat_lengths = [None] * len(self.nodes.subtrees)
+        # children have higher indices than their parents, so this
+        # calculates the lengths of all children before their parents
+        for node_index in reversed(range(len(flat_lengths))):
+            label = self.nodes.labels[node_index]
+            if node_index == 0 or label in (None, 'N', 'S'):
+                dis_label, children = self.get_dis_node(node_index)
+                child_lengths = []
+                for child in children:
+                    if isinstance(child, int):
+                        child_lengths.append(flat_lengths[child])
+                    elif isinstance(child, str):
+                        child_lengths.append(len(child))
+                    else:
+                        child_lengths.append(
+                            get_flat_length(child[0], [len(leaf) for leaf in child[1]]))
+                flat_lengths[node_index] = get_flat_length(dis_label, child_lengths)
+        return flat_lengths
+
+    def format_flat(self, dis_node):
+        """Return the single-line representation of the given .dis node."""
+        label, children = self.get_dis_node(dis_node)
+        child_strs = [child if isinstance(child, str) else self.format_flat(child)
+                      for child in children]
+        return '({} {})'.format(label, ' '.join(child_strs))
 
     def _repr_png_(self):
         """This PNG representation will be automagically used inside
@@ -48,113 +157,131 @@ class DisFileWriter(object):
         return self.disfiletree.__getitem__(key)
 
 
-def convert(parented_tree):
-    if is_root(parented_tree):
-        span_description = make_span(parented_tree)
-        children = [span_description]
-        for subtree in get_nucsat_subtrees(parented_tree):
-            children.append(convert(subtree))
-        orphaned_children = [orphanize(child) for child in children]
-        return t('Root', orphaned_children)
-    elif is_leaf(parented_tree):
-        return make_edu(parented_tree)
+class DisNodeTable(NodeTable):
+    """A NodeTable with the lookups needed for writing .dis files."""
+    def nucsat_children(self, node_index):
+        """Return the indices of all nucleus, satellite and leaf nodes
+        directly below the given node (i.e. relation nodes are skipped)."""
+        nucsat_children = []
+        for child_index in self.children[node_index]:
+            if self.labels[child_index] in (None, 'N', 'S'):
+                nucsat_children.append(child_index)
+            else:
+                nucsat_children.extend(self.nucsat_children(child_index))
+        return nucsat_children
+
+    def rel2par(self, node_index):
+        """Return the 'rel2par' value (i.e. the name of the relation to
+        its parent) of the given nucleus or satellite node."""
+        parent_index = self.parents[node_index]
+        if parent_index is None:
+            raise ValueError("Root node can't have a relation.")
+
+        label = self.labels[node_index]
+        parent_label = self.labels[parent_index]
+        if label == 'S':
+            return parent_label
+        elif label == 'N':
+            sibling_labels = [self.labels[child_index]
+                              for child_index in self.children[parent_index]
+                              if child_index != node_index]
+            if len(sibling_labels) == 1 and sibling_labels[0] == 'S':
+                return 'span'
+            elif all([sibling_label == 'N' for sibling_label in sibling_labels]):
+                return parent_label
+            else:
+                raise ValueError(
+                    "Can't mix sibling types. Expected 'N' or 'S', got: {}".format(sibling_labels))
+        else:
+            raise ValueError(
+                "Unknown nuclearity. Expected 'N' or 'S', got: {}".format(label))
+
+
+def convert(parented_tree, spans=None, nodes=None):
+    """Convert a DGParentedTree into a tree with the structure of a .dis file.
+
+    ``spans`` (cf. get_spans()) and ``nodes`` (a DisNodeTable) are computed
+    from the tree, if they aren't given.
+    """
+    if spans is None:
+        spans = get_spans(parented_tree)
+    if nodes is None:
+        nodes = DisNodeTable(parented_tree)
+    return convert_node(nodes, spans, 0)
+
+
+def convert_node(nodes, spans, node_index):
+    """Convert the node with the given index (in the DisNodeTable) into
+    a (sub)tree with the structure of a .dis file."""
+    subtree = nodes.subtrees[node_index]
+    if nodes.parents[node_index] is None:
+        children = [make_span(subtree, spans)]
+        tree_label = 'Root'
+    elif nodes.labels[node_index] is None:
+        return make_edu(subtree)
     else:
-        span_description = make_span(parented_tree)
-        rel_description = make_rel2par(parented_tree)
-        children = [span_description, rel_description]
-        for subtree in get_nucsat_subtrees(parented_tree):
-            children.append(convert(subtree))
-        tree_label = convert_label(parented_tree.label())
-        orphaned_children = [orphanize(child) for child in children]
-        return t(tree_label, orphaned_children)
+        children = [make_span(subtree, spans),
+                    t('rel2par', [nodes.rel2par(node_index)])]
+        tree_label = convert_label(nodes.labels[node_index])
+
+    for child_index in nodes.nucsat_children(node_index):
+        children.append(convert_node(nodes, spans, child_index))
+    return t(tree_label, children)
 
 
 def is_root(parented_tree):
     return hasattr(parented_tree, 'parent') and parented_tree.parent() is None
 
 
-def subtree_leaf_positions(subtree):
-    """Return tree positions of all leaves of a subtree."""
-    relative_leaf_positions = subtree.treepositions('leaves')
-    subtree_root_pos = subtree.treeposition()
-    absolute_leaf_positions = []
-    for rel_leaf_pos in relative_leaf_positions:
-        absolute_leaf_positions.append( subtree_root_pos + rel_leaf_pos)
-    return absolute_leaf_positions
-
+def get_spans(parented_tree):
+    """Return a dict that maps from the id() of each subtree of the given
+    tree to the (first, last) EDU (i.e. leaf) it covers, counting from 1.
 
-def all_leaf_positions(parented_tree):
-    """Return tree positions of all leaves of a ParentedTree,
-    even if the input is only a subtree of that ParentedTree.
+    The spans of all subtrees are calculated in a single (non-recursive)
+    post-order traversal of the tree.
     """
-    return parented_tree.root().treepositions('leaves')
+    spans = {}
+    num_leaves = 0
+    # (subtree, None) before its children are visited and
+    # (subtree, number of the first leaf it covers) afterwards
+    stack = [(parented_tree, None)]
+    while stack:
+        subtree, first_leaf = stack.pop()
+        if is_leaf(subtree):
+            num_leaves += 1
+        elif first_leaf is not None:
+            spans[id(subtree)] = (first_leaf, num_leaves)
+        else:
+            stack.append((subtree, num_leaves + 1))
+            stack.extend((child, None) for child in reversed(subtree))
+    return spans
 
 
-def make_span(parented_tree):
+def make_span(parented_tree, spans):
     """create a 'span' or 'leaf' subtree for dis/lisp/RST-DT-formatted trees.
-    
+
     Examples:
            span     (a subtree that covers the leaves 1 to 7)
-         ___|____   
-        1        7 
+         ___|____
+        1        7
 
         leaf        (a subtree that only covers leaf 7)
-         |   
+         |
          7
+
+    ``spans`` is the table of all spans of the tree (cf. get_spans()).
     """
-    all_leaves = all_leaf_positions(parented_tree)
     if is_root(parented_tree):
-        return t('span', ['1', str(len(all_leaves))])
-    
-    subtree_leaves = subtree_leaf_positions(parented_tree)
-    if len(subtree_leaves) == 1:
-        edu_id = all_leaves.index(subtree_leaves[0]) + 1
-        return t('leaf', [str(edu_id)])
-    elif len(subtree_leaves) > 1:
-        first_edu_id = all_leaves.index(subtree_leaves[0]) + 1
-        last_edu_id = all_leaves.index(subtree_leaves[-1]) + 1
+        return t('span', ['1', str(spans[id(parented_tree)][1])])
+    first_edu_id, last_edu_id = spans[id(parented_tree)]
+    if first_edu_id == last_edu_id:
+        return t('leaf', [str(first_edu_id)])
+    elif first_edu_id < last_edu_id:
         return t('span', [str(first_edu_id), str(last_edu_id)])
     else:
         raise NotImplementedError('Subtree has no leaves')
 
 
-def get_siblings(parented_subtree):
-    subtree_pos = parented_subtree.treeposition()
-    parent = parented_subtree.parent()
-    if parent is None:
-        return []
-    
-    siblings = []
-    for child in parent:
-        child_pos = child.treeposition()
-        if child_pos != subtree_pos:
-            siblings.append(child_pos)
-    return siblings
-
-
-def make_rel2par(nuc_or_sat_subtree):
-    if is_root(nuc_or_sat_subtree):
-        raise ValueError("Root node can't have a relation.")
-    subtree_root_label = nuc_or_sat_subtree.label()
-    parent_label = nuc_or_sat_subtree.parent().label()
-    if subtree_root_label == 'S':
-        return t('rel2par', [parent_label])
-    elif subtree_root_label == 'N':
-        siblings = get_siblings(nuc_or_sat_subtree)
-        root = nuc_or_sat_subtree.root()
-        sibling_labels = [root[sib].label() for sib in siblings]
-        if len(siblings) == 1 and sibling_labels[0] == 'S':
-            return t('rel2par', ['span'])
-        elif all([label == 'N' for label in sibling_labels]):
-            return t('rel2par', [parent_label])
-        else:
-            raise ValueError(
-                "Can't mix sibling types. Expected 'N' or 'S', got: {}".format(sibling_labels))
-    else:
-        raise ValueError(
-            "Unknown nuclearity. Expected 'N' or 'S', got: {}".format(subtree_root_label))
-
-
 def make_edu(edu_string):
     tokens = edu_string.split()
     tokens[0] = '_!' + tokens[0]
@@ -162,29 +289,15 @@ def make_edu(edu_string):
     return t('text', tokens)
 
 
-def get_nucsat_subtrees(parented_tree):
-    """Return all direct children of the given tree, that are either
-    a nucleus, satellite or a leaf node (i.e. all children except
-    for relation nodes.)
-    """
-    if is_leaf(parented_tree):
-        return [parented_tree]
-    
-    nucsat_children = []
-    for child in parented_tree:
-        if  is_leaf(child) or child.label() in ('N', 'S'):
-            nucsat_children.append(child)
-        else:
-            nucsat_children.extend( get_nucsat_subtrees(child) )
-    return nucsat_children
+def format_edu(edu_string):
+    """Return the .dis representation of an EDU's text."""
+    return '_!' + ' '.join(edu_string.split()) + '_!'
 
 
-def orphanize(parented_subtree):
-    if is_leaf(parented_subtree):
-        return parented_subtree
-    else:
-        parented_subtree._parent = None
-        return parented_subtree
+def get_flat_length(label, child_lengths):
+    """Return the length of the single-line representation of a .dis
+    node, i.e. '(label child1 child2 ...)'."""
+    return len(label) + 3 + sum(child_lengths) + max(len(child_lengths) - 1, 0)
 
 
 def convert_label(label):
@@ -196,14 +309,10 @@ def convert_label(label):
         return label
 
 
-def join_lines(matchobj):
-    edu_multiline_str = matchobj.group(0)
-    ed_oneline_str = ' '.join(line.strip()
-                               for line in edu_multiline_str.splitlines())
-    return re.sub('\n', '', ed_oneline_str)
-
-
 def write_dis(dgtree, output_file=None):
-    """Convert a DGParentedTree representation of an RST tree into a .dis file"""
+    """Convert a DGParentedTree representation of an RST tree into a .dis file.
+
+    ``output_file`` can be a path or a file-like object.
+    """
     return DisFileWriter(dgtree, output_filepath=output_file)
 
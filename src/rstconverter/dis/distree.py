@@ -8,39 +8,203 @@ annotate rhetorical structure) into an DisTree.
 """
 
 import argparse
+from collections import defaultdict
+from functools import partial
 import os
 import sys
-import tempfile
+from types import MappingProxyType
 
+from rstconverter.common import get_filepath, read_input
 from rstconverter.dis.common import (
-    DisFile, get_child_types, get_edu_text, get_node_type, get_relation_type,
-    get_tree_type, ROOT, NUC, SAT, SUBTREE_TYPES)
-from rstconverter.tree import t, word_wrap_tree
+    DisFile, fix_rst_treebank_tree_str, get_child_types, get_edu_text,
+    get_node_type, get_relation_type, get_tree_type, join_edu_leaves, parse_dis_tree,
+    NODE_TYPES, ROOT, NUC, SAT, SUBTREE_TYPES)
+from rstconverter.rs3.rs3filewriter import RS3FileWriter, TreeNodeTypes
+from rstconverter.rs3.rs3tree import (
+    Nuclearity, RS3Node, get_node_depths, get_node_positions)
+from rstconverter.tree import DGParentedTree, t, word_wrap_tree
 
 
 class DisRSTTree(object):
     """An DisRSTTree is a DGParentedTree representation (Rhetorical Structure tree)
-    parsed from a .dis file."""
-    def __init__(self, dis_filepath, word_wrap=0, debug=False):
+    parsed from a .dis file.
+
+    ``dis_filepath`` can be a path, the content of a .dis file (bytes) or
+    a file-like object.
+
+    By default, the tree is built directly from the tokens of the .dis file.
+    If ``two_stage`` is True, the syntax of the file is parsed into a
+    ParentedTree first (``disfile_tree``, e.g. for debugging), which is then
+    converted into the RST tree.
+
+    ``child_dict``, ``elem_dict``, ``edus``, ``reltypes``, ``edu_set`` and
+    ``edu_strings`` have the same semantics as the attributes of an RSTTree
+    (as if the tree was exported to and read from an .rs3 file). They are
+    computed from the tree on first access.
+    """
+    dialect = 'dis'  # variant of the *.dis format (cf. DIS_DIALECTS)
+
+    def __init__(self, dis_filepath, word_wrap=0, debug=False, two_stage=False):
         self.debug = debug
-        self.filepath = dis_filepath
-        self.child_dict, self.elem_dict, self.edus, self.reltypes = None, None, None, None # FIXME: implement if needed
-        self.edu_set = None  # FIXME: implement if needed
-        self.edu_strings = None  # FIXME: implement if needed
-        
-        self.disfile_tree = DisFile(dis_filepath).tree
-        tree = dis2tree(self.disfile_tree)
-        self.tree = word_wrap_tree(tree, width=word_wrap)
+        self.filepath = get_filepath(dis_filepath)
+        self._rs3_writer = None  # will be created by get_rs3_writer() (on demand)
+        self._rs3_data = None  # will be filled by get_rs3_data() (on demand)
+        self._tree_relations = None  # (tree, relations) collected while parsing
+
+        if two_stage:
+            self.disfile_tree = DisFile(dis_filepath).tree
+            self.tree = self.normalize_tree(dis2tree(self.disfile_tree), word_wrap=word_wrap)
+        else:
+            # the EDUs are already cleaned up by the tokenizer (cf. dialect)
+            self.disfile_tree = None
+            dis_str = fix_rst_treebank_tree_str(read_input(dis_filepath).strip())
+            relations = {}
+            tree = dis_str2tree(dis_str, dialect=self.dialect, relations=relations)
+            self.tree = word_wrap_tree(tree, width=word_wrap)
+            self._tree_relations = (self.tree, MappingProxyType(relations))
+
+    def normalize_tree(self, tree, word_wrap=0):
+        """Return the tree built by the two-stage path with line-wrapped
+        leaves (i.e. EDUs).
+
+        Subclasses can override this to clean up the EDUs as well (in the
+        same traversal of the tree).
+        """
+        return word_wrap_tree(tree, width=word_wrap)
+
+    @property
+    def tree_relations(self):
+        """Maps from the names of the relations used in the tree to their
+        types, as collected while parsing the .dis file (cf. dis_str2tree()).
+        None, if the tree was built by the two-stage path or was replaced.
+        """
+        if self._tree_relations is not None and self._tree_relations[0] is self.tree:
+            return self._tree_relations[1]
+        return None
+
+    def get_rs3_writer(self):
+        """Return an RS3FileWriter for the tree. It is only used for its
+        node table and relations (i.e. nothing is written). A new one is
+        created if the tree was replaced."""
+        if self._rs3_writer is None or self._rs3_writer.dgtree is not self.tree:
+            self._rs3_writer = RS3FileWriter(self, debug=False)
+            self._rs3_data = None
+        return self._rs3_writer
+
+    @property
+    def node_table(self):
+        """The NodeTable of the tree (the node IDs used in child_dict,
+        elem_dict etc. are the positions in this table, starting at 1)."""
+        return self.get_rs3_writer().nodes
+
+    @property
+    def reltypes(self):
+        """Maps from the names of the relations used in the tree to their
+        types ('rst' or 'multinuc')."""
+        return self.get_rs3_writer().relations
+
+    def get_rs3_data(self):
+        """Return the parent-child relations and node attributes of the tree
+        (cf. rs3tree.get_rs3_data()), which are computed on first access.
+        """
+        writer = self.get_rs3_writer()
+        if self._rs3_data is not None:
+            return self._rs3_data
+
+        children = defaultdict(list)
+        elements = {}
+        ordered_edus = []
+
+        # an .rs3 file lists the segments (in document order) before the groups
+        for node_type in (TreeNodeTypes.leaf_node, TreeNodeTypes.relation_node):
+            for node_index, node in enumerate(writer.nodes.subtrees):
+                if writer.get_node_type(node_index) != node_type:
+                    continue
+
+                elem_id = writer.get_node_id(node_index)
+                relname, parent_id = writer.get_relname_and_parent(node_index)
+                children[parent_id].append(elem_id)
+                if node_type == TreeNodeTypes.leaf_node:
+                    elements[elem_id] = RS3Node('segment', parent=parent_id, relname=relname,
+                                                text=node)
+                    ordered_edus.append(elem_id)
+                else:
+                    elements[elem_id] = RS3Node(
+                        'group', parent=parent_id, relname=relname,
+                        group_type=writer.get_group_type(node_index))
+
+        for node in elements.values():
+            if node.relname is None:
+                node.nuclearity = Nuclearity.root
+            else:
+                node.reltype = writer.get_reltype(node.relname)
+                if node.reltype == 'rst':
+                    node.nuclearity = Nuclearity.satellite
+                else:  # the N of a 'span' or one of the Ns of a 'multinuc'
+                    node.nuclearity = Nuclearity.nucleus
+
+        edu_positions = {edu_id: i for i, edu_id in enumerate(ordered_edus)}
+        self._rs3_data = {
+            'child_dict': children, 'elem_dict': elements, 'edus': ordered_edus,
+            'edu_set': set(ordered_edus),
+            'edu_strings': [elements[edu_id].text for edu_id in ordered_edus],
+            'edu_positions': edu_positions,
+            'node_positions': get_node_positions(children, edu_positions),
+            'node_depths': get_node_depths(children)}
+        return self._rs3_data
+
+    @property
+    def child_dict(self):
+        return self.get_rs3_data()['child_dict']
+
+    @property
+    def elem_dict(self):
+        return self.get_rs3_data()['elem_dict']
+
+    @property
+    def edus(self):
+        return self.get_rs3_data()['edus']
+
+    @property
+    def edu_set(self):
+        return self.get_rs3_data()['edu_set']
+
+    @property
+    def edu_strings(self):
+        return self.get_rs3_data()['edu_strings']
+
+    @property
+    def edu_positions(self):
+        return self.get_rs3_data()['edu_positions']
+
+    @property
+    def node_positions(self):
+        return self.get_rs3_data()['node_positions']
+
+    @property
+    def node_depths(self):
+        return self.get_rs3_data()['node_depths']
+
+    def node_height(self, node_id):
+        """Return the number of nodes on the path from the given node to
+        its root (a root node has height 1)."""
+        assert node_id in self.elem_dict
+        return self.node_depths[node_id]
+
+    def node_position(self, node_id):
+        """Return the linear position of the given node, i.e. the position
+        of the first EDU it contains."""
+        return self.node_positions[node_id]
+
+    def get_relname(self, node_id):
+        return self.elem_dict[node_id]['relname']
 
     @classmethod
     def fromstring(cls, dis_string):
         """Create a DisRSTTree instance from a string containing a *.dis parse."""
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(dis_string)
-        temp.close()
-        dis_tree = cls(dis_filepath=temp.name)
-        os.unlink(temp.name)
-        return dis_tree
+        if isinstance(dis_string, str):
+            dis_string = dis_string.encode('utf-8')
+        return cls(dis_filepath=dis_string)
 
     def _repr_png_(self):
         """This PNG representation will be automagically used inside
@@ -108,6 +272,95 @@ def dis2tree(dis_tree, wrap_tree=False):
     return get_wrapped_tree(dis_tree, rst_tree, wrap_tree=wrap_tree)
 
 
+def dis_str2tree(dis_str, dialect='dis', relations=None):
+    """Convert the content of a *.dis file into an RST tree (DGParentedTree),
+    without building a tree of the syntax of the file first (cf. dis2tree()).
+
+    If a ``relations`` dict is given, the names of the relations in the tree
+    and their types ('rst' or 'multinuc') are added to it (with the same
+    result as RS3FileWriter.get_relations()).
+    """
+    relation_nodes = None if relations is None else {}
+    make_tree = partial(make_rst_node, dialect=dialect, relation_nodes=relation_nodes)
+    _, _, rst_tree, _ = parse_dis_tree(dis_str, make_tree=make_tree, dialect=dialect)
+    if relations is not None:
+        relations.update((relname, reltype) for relname, (_, reltype) in relation_nodes.items())
+    return rst_tree
+
+
+def make_rst_node(label, children, dialect='dis', relation_nodes=None):
+    """Convert a (sub)tree of a *.dis file, given its label and its already
+    converted children, for dis_str2tree().
+
+    Returns a (label, leaves) tuple for the properties of a node, e.g.
+    (span 1 3), (rel2par span) or (text _!...!_). For a Root, Nucleus or
+    Satellite, returns a (label, relation name, RST tree, is_leaf) tuple.
+    The RST tree of a leaf is already wrapped in a 'N' or 'S' node, while
+    the wrapping of other nodes depends on their parent (cf. dis2tree()).
+
+    If ``relation_nodes`` is a dict, the type of each relation is stored in
+    it, i.e. relation name -> (position, reltype). If a relation occurs with
+    different types, the last one (in pre-order) is kept, like in
+    RS3FileWriter.get_relations(). The pre-order position of a node is given
+    by its span, i.e. (first EDU, -last EDU).
+    """
+    if label not in SUBTREE_TYPES:
+        return label, children
+
+    node_type = children[0][0]
+    assert node_type in NODE_TYPES, "node_type: {}".format(node_type)
+    if label == ROOT:
+        relname = None
+        subtrees = children[1:]
+    else:
+        # the relation type is stored in the (rel2par ...) property
+        relname = children[1][1][0]
+        subtrees = children[2:]
+
+    if node_type == 'leaf':
+        text_label, text = children[2]
+        assert text_label == 'text', "text_subtree: {}".format(children[2])
+        edu_text = join_edu_leaves(text, dialect=dialect)
+        return label, relname, DGParentedTree(get_wrapper_label(label), [edu_text]), True
+
+    nuc_ids, sat_ids = [], []
+    for i, (child_label, _, _, _) in enumerate(subtrees):
+        assert child_label in SUBTREE_TYPES, "tree_type: {}".format(child_label)
+        if child_label == NUC:
+            nuc_ids.append(i)
+        else:
+            sat_ids.append(i)
+
+    if not sat_ids:  # this is a multinuc relation
+        assert len(nuc_ids) > 1, "len: {}".format(len(nuc_ids))
+        # all subtrees of a multinuc have the same relation, so we can just read it from the first one
+        reltype = subtrees[0][1]
+    else:  # this is a nucleus-satellite relation
+        assert len(nuc_ids) == 1 and len(sat_ids) == 1, \
+            "child_types: {}".format([child[0] for child in subtrees])
+        # the relation type is only stored in the satellite
+        reltype = subtrees[sat_ids[0]][1]
+
+    if relation_nodes is not None:
+        span = children[0][1]
+        position = (int(span[0]), -int(span[-1]))
+        if reltype not in relation_nodes or relation_nodes[reltype][0] < position:
+            relation_nodes[reltype] = (position, 'multinuc' if not sat_ids else 'rst')
+
+    rst_subtrees = []
+    for child_label, _, child_tree, child_is_leaf in subtrees:
+        if not child_is_leaf:
+            child_tree = DGParentedTree(get_wrapper_label(child_label), [child_tree])
+        rst_subtrees.append(child_tree)
+    return label, relname, DGParentedTree(reltype, rst_subtrees), False
+
+
+def get_wrapper_label(tree_type):
+    """Return the label of the node that wraps an RST (sub)tree of the given
+    type (cf. get_element_wrapper())."""
+    return 'N' if tree_type == NUC else 'S'
+
+
 def get_wrapped_tree(dis_tree, rst_tree, wrap_tree=False):
     if wrap_tree:
         tree_wrapper = get_element_wrapper(dis_tree)
@@ -8,60 +8,75 @@ This module converts the output of the DPLP RST parser into a DPLPRSTTree.
 
 import argparse
 from collections import defaultdict
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
 import re
 import sys
 import os
 
-from nltk.tree import Tree, ParentedTree
-
-from rstconverter.tree import DGParentedTree, word_wrap_tree
+from rstconverter.common import read_input
+from rstconverter.tree import DGParentedTree, parse_tree_literal, word_wrap_tree
 
 # nuclearity of child nodes followed by their parent relation name, e.g. NS-elaboration
 DPLP_REL_RE = re.compile(r"^(N|S)(N|S)-(.*)$")
 
+# number of columns of a .merge file: sentence ID, token ID, token, lemma,
+# POS tag, dependency label, head ID, NER tag, partial constituency parse, EDU ID
+MERGE_COLUMNS = 10
+MERGE_TOKEN, MERGE_LEMMA, MERGE_POS, MERGE_EDU = 2, 3, 4, 9
+
+# the parse tree follows the .merge part of a DPLP output file
+DPLP_TREE_START = 'ParentedTree'
+
 
 class DPLPRSTTree(object):
     """A DPLPRSTTree is a DGParentedTree representation (Rhetorical Structure tree)
-    parsed from the DPLP's parser output"""
+    parsed from the DPLP's parser output.
+
+    ``dplp_filepath`` can be a path, the content of a DPLP output file
+    (bytes) or a file-like object.
+
+    The input is read in one pass: the tokens of the 'merge file' part are
+    stored in a MergeTable (``merge_table``) and the RST tree is built while
+    the parse tree part is parsed. ``edu_texts`` maps from EDU IDs (int) to
+    the texts of the EDUs.
+    """
     def __init__(self, dplp_filepath, word_wrap=0, debug=False):
         self.debug = debug
 
-        merge_file_str, parsetree_str = self.split_input(dplp_filepath)
-        
-        # FIXME: dplpstr2dplptree output is no longer a tree
-        self.parsetree = self.dplpstr2dplptree(parsetree_str)
-        self.edus = self.extract_edus(merge_file_str)
+        input_str = read_input(dplp_filepath)
+        tree_start = input_str.find(DPLP_TREE_START)
+        if tree_start == -1:
+            raise ValueError("DPLP output doesn't contain a parse tree")
+
+        self.merge_table = MergeTable(input_str, end=tree_start)
+        self.edu_texts = self.merge_table.get_edu_texts()
 
-        self.add_edus()
-        tree = self.dplptree2dgparentedtree()
+        make_tree = partial(make_rst_node, edu_texts=self.edu_texts)
+        tree = parse_tree_literal(input_str, tree_class=make_tree, pos=tree_start)
+        if isinstance(tree, str):  # tree only consists of one EDU
+            tree = DGParentedTree('N', [tree])
         self.tree = word_wrap_tree(tree, width=word_wrap)
 
-    def split_input(self, input_filepath):
+    @property
+    def edus(self):
+        """dict from EDU IDs (int) to the tokens of the EDUs (list(str))"""
+        return self.merge_table.get_edu_tokens()
+
+    @staticmethod
+    def split_input(input_filepath):
         """Splits the input file into the 'merge file' (which contains
         the EDUs) and the 'parsetree file'."""
-        with open(input_filepath, 'r') as input_file:
-            input_file_str = input_file.read()
-            merge_file_str, parsetree_str = input_file_str.split('ParentedTree', 1)
-            return merge_file_str, 'ParentedTree' + parsetree_str
+        input_file_str = read_input(input_filepath)
+        merge_file_str, parsetree_str = input_file_str.split(DPLP_TREE_START, 1)
+        return merge_file_str, DPLP_TREE_START + parsetree_str
 
     @staticmethod
     def dplpstr2dplptree(parse_tree_str):
-        """convert the output of the DPLP RST parser into a DGParentedTree
-        representation of that parse tree.
-
-        Parameters:
-        parse_tree_str : str
-            DPLP RST parser output
-
-        Returns:
-        tree : nltk.tree.Tree
-            parse tree object of DPLP's output string
-        """
-        # This is basically a poor man's typecast used to avoid errors like:
-        # ValueError: Can not insert a subtree that already has a parent.
-        parented_tree_str = re.sub('ParentedTree', 'Tree', parse_tree_str)
-        return eval(parented_tree_str)
-
+        """convert the output of the DPLP RST parser into an nltk.tree.Tree
+        representation of that parse tree (with EDU IDs as leaves)."""
+        return parse_tree_literal(parse_tree_str)
 
     @staticmethod
     def extract_edus(merge_file_str):
@@ -71,57 +86,7 @@ class DPLPRSTTree(object):
         -------
         edus : dict from EDU IDs (int) to words (list(str))
         """
-        lines = merge_file_str.splitlines()
-
-        edus = defaultdict(list)
-        for line in lines:
-            if line.strip():  # ignore empty lines
-                token = line.split('\t')[2]
-                edu_id = int(line.split('\t')[9])
-                edus[edu_id].append(token)
-        return edus
-
-    def add_edus(self):
-        leaf_positions = self.parsetree.treepositions('leaves')
-
-        for leaf_pos in leaf_positions:
-            edu_id = int(self.parsetree[leaf_pos])
-            edu_tokens = self.edus[edu_id]
-            parent_pos = leaf_pos[:-1]
-            try:
-                self.parsetree[parent_pos] = " ".join(edu_tokens)
-            except IndexError:
-                assert len(leaf_positions) == 1  # tree has only one EDU
-                self.parsetree.set_label('N')  # change tree root from 'EDU' to 'N'
-                self.parsetree[leaf_pos] = " ".join(edu_tokens)
-
-    def dplptree2dgparentedtree(self):
-        """Convert the tree from DPLP's format into a conventional binary tree,
-        which can be easily converted into output formats like RS3.
-        """
-        def transform(dplp_tree):
-            """Transform a DPLP parse tree into a more conventional parse tree."""
-            if isinstance(dplp_tree, str):
-                return dplp_tree
-            if not hasattr(dplp_tree, 'label'):
-                return dplp_tree
-            if len(dplp_tree) == 1:  # tree only consists of one EDU
-                return dplp_tree
-
-            assert len(dplp_tree) == 2, "We can only handle binary trees."
-
-            match = DPLP_REL_RE.match(dplp_tree.label())
-            assert match, "Relation '{}' does not match regex '{}'".format(dplp_tree.label(), DPLP_REL_RE)
-            left_child_nuc, right_child_nuc, relname = match.groups()
-            dplp_tree._label = relname
-
-            for i, child_nuclearity in enumerate([left_child_nuc, right_child_nuc]):
-                child = dplp_tree[i]
-                dplp_tree[i] = Tree(child_nuclearity, [transform(child)])
-            return dplp_tree
-
-        tree = transform(self.parsetree)
-        return DGParentedTree.convert(tree)
+        return MergeTable(merge_file_str).get_edu_tokens()
 
     def _repr_png_(self):
         """This PNG representation will be automagically used inside
@@ -144,5 +109,85 @@ class DPLPRSTTree(object):
         return self.tree.__getitem__(key)
 
 
+class MergeTable(object):
+    """Columns of the tokens in the .merge part of a DPLP output file
+    (one entry per token, in the order of the file).
+
+    Only the lines between the positions ``start`` and ``end`` of
+    ``merge_str`` are read.
+
+    Attributes
+    ----------
+    tokens : list(str)
+        the tokens
+    edu_ids : list(int)
+        the ID of the EDU that each token belongs to
+    lemmas : list(str) or None
+        the lemma of each token (only stored if ``annotations`` is True)
+    pos_tags : list(str) or None
+        the POS tag of each token (only stored if ``annotations`` is True)
+    """
+    def __init__(self, merge_str, start=0, end=None, annotations=False):
+        self.tokens = []
+        self.edu_ids = []
+        self.lemmas = [] if annotations else None
+        self.pos_tags = [] if annotations else None
+
+        # Slicing copies the .merge part once, but splitlines() is much
+        # faster than finding the line breaks in place (in a Python loop).
+        for line in merge_str[start:end].splitlines():
+            if not line.strip():  # ignore empty lines
+                continue
+            columns = line.split('\t')
+            if len(columns) < MERGE_COLUMNS:
+                raise ValueError("Invalid line in .merge file: {!r}".format(line))
+            self.tokens.append(columns[MERGE_TOKEN])
+            self.edu_ids.append(int(columns[MERGE_EDU]))
+            if annotations:
+                self.lemmas.append(columns[MERGE_LEMMA])
+                self.pos_tags.append(columns[MERGE_POS])
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def get_edu_tokens(self):
+        """Return a dict from EDU IDs (int) to the tokens of the EDUs."""
+        edu_tokens = defaultdict(list)
+        for edu_id, token in zip(self.edu_ids, self.tokens):
+            edu_tokens[edu_id].append(token)
+        return edu_tokens
+
+    def get_edu_texts(self):
+        """Return a dict from EDU IDs (int) to the texts of the EDUs (i.e.
+        their tokens joined by spaces). The tokens of an EDU are joined at
+        once (EDUs are usually contiguous in a .merge file)."""
+        edu_texts = {}
+        for edu_id, edu_tokens in groupby(zip(self.edu_ids, self.tokens), key=itemgetter(0)):
+            edu_text = ' '.join([token for _, token in edu_tokens])
+            if edu_id in edu_texts:  # the EDU is not contiguous
+                edu_text = edu_texts[edu_id] + ' ' + edu_text
+            edu_texts[edu_id] = edu_text
+        return edu_texts
+
+
+def make_rst_node(label, children, edu_texts):
+    """Convert a (sub)tree of DPLP's parse tree into a conventional binary tree,
+    given its label and its already converted children (cf. parse_tree_literal()).
+
+    An EDU, e.g. ParentedTree('EDU', ['1']), is replaced by its text.
+    A relation, e.g. ParentedTree('NS-elaboration', [EDU_1, EDU_2]), is
+    converted into DGParentedTree('elaboration', [N(EDU_1), S(EDU_2)]).
+    """
+    if label == 'EDU':
+        return edu_texts.get(int(children[0]), '')
+
+    assert len(children) == 2, "We can only handle binary trees."
+    match = DPLP_REL_RE.match(label)
+    assert match, "Relation '{}' does not match regex '{}'".format(label, DPLP_REL_RE)
+    left_child_nuc, right_child_nuc, relname = match.groups()
+    return DGParentedTree(relname, [DGParentedTree(left_child_nuc, [children[0]]),
+                                    DGParentedTree(right_child_nuc, [children[1]])])
+
+
 # pseudo-function to create a document tree from a RST (.dplp) file
 read_dplp = DPLPRSTTree
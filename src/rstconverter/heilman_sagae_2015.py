@@ -19,7 +19,7 @@ import nltk
 from nltk.tree import Tree, ParentedTree
 
 # ~ from discoursegraphs import DiscourseDocumentGraph, EdgeTypes
-from rstconverter.common import RSTBaseTree
+from rstconverter.common import get_filepath, read_input, RSTBaseTree
 from rstconverter.tree import DGParentedTree, word_wrap_tree, t
 
 
@@ -54,10 +54,14 @@ NUC_TYPES = get_class_attribs(NucType)
 
 class HS2015RSTTree(RSTBaseTree):
     """A HS2015RSTTree is a DGParentedTree representation (Rhetorical Structure tree)
-    parsed from a .hs2015 file."""
+    parsed from a .hs2015 file.
+
+    ``hs2015_filepath`` can be a path, the content of a .hs2015 file (bytes)
+    or a file-like object.
+    """
     def __init__(self, hs2015_filepath, word_wrap=0, debug=False):
         self.debug = debug
-        self.filepath = hs2015_filepath
+        self.filepath = get_filepath(hs2015_filepath)
 
         self.hs2015file_tree, self.edus = parse_hs2015(hs2015_filepath)
 
@@ -174,9 +178,9 @@ def parse_hs2015(heilman_filepath):
 
     Parameters
     ----------
-    heilman_filepath : str
+    heilman_filepath : str, bytes or file-like object
         path to a file containing the output of Heilman and Sagae's 2015
-        discourse parser
+        discourse parser (or the content of such a file)
 
     Returns
     -------
@@ -186,8 +190,7 @@ def parse_hs2015(heilman_filepath):
         a list of EDUs, where each EDU is represented as
         a list of tokens
     """
-    with open(heilman_filepath, 'r') as parsed_file:
-        heilman_json = json.load(parsed_file)
+    heilman_json = json.loads(read_input(heilman_filepath))
 
     edus = heilman_json['edu_tokens']
 
@@ -14,8 +14,8 @@ import os
 
 from nltk.tree import Tree
 
-from rstconverter.common import RSTBaseTree
-from rstconverter.tree import DGParentedTree, word_wrap_tree
+from rstconverter.common import get_filepath, read_input, RSTBaseTree
+from rstconverter.tree import DGParentedTree, parse_tree_literal, word_wrap_tree
 
 # relation name followed by nuclearity of its child notes, e.g. Contrast[S][N]
 HILDA_REL_RE = re.compile(r"^(.*)\[(N|S)\]\[(N|S)\]$")
@@ -23,17 +23,20 @@ HILDA_REL_RE = re.compile(r"^(.*)\[(N|S)\]\[(N|S)\]$")
 
 class HILDARSTTree(RSTBaseTree):
     """A HILDARSTTree is a DGParentedTree representation (Rhetorical Structure tree)
-    parsed from a .hilda file."""
+    parsed from a .hilda file.
+
+    ``hilda_filepath`` can be a path, the content of a .hilda file (bytes)
+    or a file-like object.
+    """
     def __init__(self, hilda_filepath, word_wrap=0, debug=False):
         self.debug = debug
-        self.filepath = hilda_filepath
+        self.filepath = get_filepath(hilda_filepath)
 
-        with open(hilda_filepath, 'r') as hilda_file:
-            hilda_str = hilda_file.read()
-            self.hildafile_tree = self.hildastr2hildatree(hilda_str)
+        hilda_str = read_input(hilda_filepath)
+        self.hildafile_tree = self.hildastr2hildatree(hilda_str)
 
-            tree = self.hildatree2dgparentedtree()
-            self.tree = word_wrap_tree(tree, width=word_wrap)
+        tree = self.hildatree2dgparentedtree()
+        self.tree = word_wrap_tree(tree, width=word_wrap)
 
     @staticmethod
     def hildastr2hildatree(parse_tree_str):
@@ -48,12 +51,9 @@ class HILDARSTTree(RSTBaseTree):
         tree : nltk.tree.Tree
             parse tree object of HILDA's output string
         """
-        # This is basically a poor man's typecast.
-        # (ParseTree is a subclass of nltk.tree.ParentedTree that is only used by HILDA.
-        # DGParentedTree is a subclass of nltk.tree.ParentedTree that is only used by discoursegraphs.)
-        parented_tree_str = re.sub('ParseTree', 'Tree', parse_tree_str)
-        # Try this in golang, suckers!
-        return eval(parented_tree_str)
+        # ParseTree is a subclass of nltk.tree.ParentedTree that is only used by HILDA,
+        # so we parse it into a plain nltk.tree.Tree.
+        return parse_tree_literal(parse_tree_str)
 
     def hildatree2dgparentedtree(self):
         """Convert the tree from HILDA's format into a conventional binary tree,
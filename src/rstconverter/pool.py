@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Arne Neumann <discoursegraphs.programming@arne.cl>
+
+"""
+This module contains a pool of worker processes that is used by the REST API
+to run CPU-bound conversions in parallel (i.e. without being serialized by
+the GIL of the web server process).
+"""
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import importlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+
+
+# modules that are imported by every worker process before it accepts jobs
+WARMUP_MODULES = ('rstconverter.app', 'svgling')
+
+# set by init_worker(): the queue a worker process reports started jobs to
+_job_starts = None
+
+
+class ConversionTimeout(Exception):
+    """A job did not finish within the timeout of the ConversionPool."""
+    pass
+
+
+def init_worker(job_starts=None, modules=WARMUP_MODULES):
+    """Import all modules needed for conversions, so that the first job
+    a worker process gets doesn't have to pay for it."""
+    global _job_starts
+    _job_starts = job_starts
+    for module in modules:
+        importlib.import_module(module)
+
+
+def run_tracked_job(job_id, function, *args, **kwargs):
+    """Report to the pool that the given job has started, then run it."""
+    if _job_starts is not None:
+        _job_starts.put(job_id)
+    return function(*args, **kwargs)
+
+
+def ping():
+    """No-op job used to start all worker processes of a pool."""
+    return os.getpid()
+
+
+def warm_up(executor, num_workers):
+    """Start all worker processes of the given executor (and wait for them)."""
+    for future in [executor.submit(ping) for _ in range(num_workers)]:
+        future.result()
+
+
+def terminate_workers(executor):
+    """Terminate the worker processes of a ProcessPoolExecutor, including
+    those that are still running a job."""
+    processes = getattr(executor, '_processes', None) or {}
+    for process in list(processes.values()):
+        if process.is_alive():
+            process.terminate()
+
+
+class ConversionPool(object):
+    """A pool of warm worker processes for running conversion jobs.
+
+    Parameters
+    ----------
+    max_workers : int or None
+        number of worker processes (default: number of CPUs)
+    timeout : float or None
+        maximum number of seconds a job may run (the time it spends waiting
+        for a free worker process doesn't count)
+    max_jobs_per_worker : int or None
+        If set, each worker process is replaced by a fresh one after it has
+        run this many jobs (including the job that warmed it up), e.g. to give
+        back memory it has accumulated. The replacement is started in the
+        background, as soon as the old worker exits. Worker processes are
+        then started with the 'spawn' method instead of being forked.
+    """
+    def __init__(self, max_workers=None, timeout=None, max_jobs_per_worker=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.recycled = 0  # number of times the pool was replaced
+        if max_jobs_per_worker is None:
+            self._context = multiprocessing.get_context()
+        else:
+            self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._executor = None
+        self._job_starts = None
+        self._job_ids = itertools.count()
+        self._queued_jobs = {}  # job ID -> future of a job that hasn't started yet
+        with self._lock:
+            executor = self._start_executor()
+        warm_up(executor, self.max_workers)
+
+    def _start_executor(self, terminate=False):
+        """Replace the current executor with a fresh one and return it.
+        Must be called while holding the lock; the new executor should be
+        warmed up (cf. warm_up()) after the lock was released.
+
+        Jobs that are already running in the old executor will still finish,
+        unless ``terminate`` is True (e.g. if a job hangs). In that case, its
+        worker processes are terminated.
+        """
+        old_executor, old_job_starts = self._executor, self._job_starts
+        # each executor gets its own queue, as a terminated worker process
+        # might leave the lock of its queue behind in a locked state
+        self._job_starts = self._context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=self._context,
+            initializer=init_worker, initargs=(self._job_starts,),
+            max_tasks_per_child=self.max_jobs_per_worker)
+        watcher = threading.Thread(
+            target=self._watch_job_starts, args=(self._job_starts,), daemon=True)
+        watcher.start()
+
+        if old_executor is not None:
+            if terminate:
+                terminate_workers(old_executor)
+            old_executor.shutdown(wait=False)
+            old_job_starts.put(None)
+            self.recycled += 1
+        return self._executor
+
+    def _watch_job_starts(self, job_starts):
+        """Record the start time of each job reported by a worker process
+        (runs in a background thread until it gets None)."""
+        for job_id in iter(job_starts.get, None):
+            with self._lock:
+                future = self._queued_jobs.pop(job_id, None)
+            if future is not None:
+                future.start_time = time.monotonic()
+                future.started.set()
+
+    def _job_done(self, job_id, future):
+        """Forget a finished (or cancelled) job."""
+        with self._lock:
+            self._queued_jobs.pop(job_id, None)
+        future.started.set()
+
+    def _recycle(self, executor, terminate=False):
+        """Replace the given executor, unless this already happened
+        (e.g. in another thread)."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            new_executor = self._start_executor(terminate=terminate)
+        warm_up(new_executor, self.max_workers)
+
+    def submit(self, function, *args, **kwargs):
+        """Schedule a job and return a future representing its result.
+
+        The function and its arguments must be picklable.
+        """
+        with self._lock:
+            job_id = next(self._job_ids)
+            executor = self._executor
+            future = executor.submit(
+                run_tracked_job, job_id, function, *args, **kwargs)
+            future.executor = executor
+            future.start_time = None
+            future.started = threading.Event()
+            self._queued_jobs[job_id] = future
+        future.add_done_callback(lambda future: self._job_done(job_id, future))
+        return future
+
+    def result(self, future):
+        """Wait for the result of a submitted job.
+
+        Raises a ConversionTimeout, if the job doesn't finish in time after
+        it was started by a worker process. A job that is still waiting for
+        a worker is simply cancelled. As a running job can't be cancelled,
+        the pool is replaced and the worker processes of the old pool are
+        terminated (other jobs running in them will fail with a
+        BrokenProcessPool error). If a worker process died, the pool is
+        replaced as well, so that later jobs aren't stuck behind the broken one.
+        """
+        try:
+            if self.timeout is None:
+                return future.result()
+            future.started.wait()
+            remaining = self.timeout
+            if future.start_time is not None:
+                remaining -= time.monotonic() - future.start_time
+            return future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            if not future.cancel():
+                self._recycle(future.executor, terminate=True)
+            raise ConversionTimeout(
+                "Job did not finish within {} seconds.".format(self.timeout))
+        except BrokenProcessPool:
+            self._recycle(future.executor)
+            raise
+
+    def run(self, function, *args, **kwargs):
+        """Run a job in a worker process and return its result."""
+        return self.result(self.submit(function, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        """Shut down the worker processes."""
+        with self._lock:
+            self._executor.shutdown(wait=wait)
+            self._job_starts.put(None)
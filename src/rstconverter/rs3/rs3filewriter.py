@@ -7,14 +7,17 @@
 
 import codecs
 from collections import defaultdict, OrderedDict
+import itertools
+from types import MappingProxyType
 
 from lxml import etree
 from lxml.builder import E
 import nltk
 
-from rstconverter.tree import DGParentedTree
+from rstconverter.common import open_output
+from rstconverter.tree import DGParentedTree, NodeTable
 from rstconverter.rs3.rs3tree import (
-    extract_relations, is_leaf, NUCLEARITY_LABELS, RSTTree)
+    is_leaf, NUCLEARITY_LABELS, RSTTree)
 
 
 class TreeNodeTypes(object):
@@ -42,11 +45,30 @@ def get_node_type(dgtree):
         return TreeNodeTypes.relation_node
 
 
+def gen_relations_elem(relation_items):
+    """Create a <relations> etree element from (relation name, relation type)
+    tuples."""
+    relations_elem = E('relations')
+    for relname, reltype in relation_items:
+        relations_elem.append(
+            E('rel', OrderedDict([('name', relname), ('type', reltype)])))
+    return relations_elem
+
+
+def gen_relations_fragment(relation_items, level=2):
+    """Return the <relations> element (bytes) of an RS3 file, pretty-printed
+    and indented as it would be at the given level of the <rst> tree."""
+    fragment = etree.tostring(
+        gen_relations_elem(relation_items), encoding='UTF-8', pretty_print=True)
+    indent = b'  ' * level
+    return b''.join(indent + line for line in fragment.splitlines(True))
+
+
 class RS3FileWriter(object):
     """Convert a DGParentedTree representation of an RST tree into an .rs3 file"""
     # There's no consensus on the set of RST relations, so I chose to include
     # those that are used by default in RSTTool and rstWeb.
-    default_relations = {
+    default_relations = MappingProxyType({
         'Antithesis': 'rst',
         'Background': 'rst',
         'Cause': 'rst',
@@ -72,101 +94,97 @@ class RS3FileWriter(object):
         'Sequence': 'multinuc',
         'Solutionhood': 'rst',
         'Summary': 'rst'
-    }
+    })
+    # the <relations> header of all files that only use default relations
+    default_relation_items = tuple(sorted(default_relations.items()))
+    default_relations_fragment = gen_relations_fragment(default_relation_items)
 
     def __init__(self, dgtree, debug=True, output_filepath=None):
         # dgtree is an RSTTree or DisTree (and contains a DGParentedTree)
+        rst_tree = None
         if hasattr(dgtree, 'tree') and isinstance(dgtree.tree, DGParentedTree):
-            dgtree = dgtree.tree
+            rst_tree, dgtree = dgtree, dgtree.tree
 
         self.dgtree = dgtree
         self.body = defaultdict(list)  # will be filled by gen_body()
-        self.relations = extract_relations(self.dgtree)
-        self.treepositions = {treepos:str(i) for i, treepos in
-                             enumerate(dgtree.treepositions(), 1)}
-        self.etree = self.gen_etree()
+        # the node IDs (1, 2, ...) follow the (pre-)order of the nodes in the table
+        self.nodes = NodeTable(dgtree)
+        # e.g. a DisRSTTree collects the relations of its tree while parsing
+        # it, so we don't need to extract them again
+        relations = getattr(rst_tree, 'tree_relations', None)
+        if relations is None:
+            relations = MappingProxyType(self.get_relations())
+        self.relations = relations
+        self._etree = None  # will be built by the etree property (on demand)
 
         if debug is True:
             print(etree.tostring(self.etree, pretty_print=True))
 
         if output_filepath is not None:
-            with open(output_filepath, 'wb') as outfile:
-                outfile.write(etree.tostring(
-                    self.etree, encoding='UTF-8', xml_declaration=True, pretty_print=True))
-
-    def has_parent(self, treepos):
-        """Returns True, iff this node has a parent."""
-        return self.get_parent_treepos(treepos) is not None
+            with open_output(output_filepath, binary=True) as outfile:
+                self.write(outfile)
 
-    def get_node_id(self, treepos):
-        """Given the treeposition of a node, return its node ID for rs3."""
-        return self.treepositions[treepos]
+    @property
+    def etree(self):
+        """The lxml etree representation of the rs3 file.
 
-    @staticmethod
-    def get_parent_treepos(treepos):
-        """Given a treeposition, return the treeposition of its parent."""
-        if treepos == ():  # this is the root node
-            return None
-        return treepos[:-1]
-
-    def get_children_treepos(self, treepos):
-        """Given a treeposition, return the treepositions of its children."""
-        children_treepos = []
-        for i, child in enumerate(self.dgtree[treepos]):
-            if isinstance(child, nltk.Tree):
-                children_treepos.append(child.treeposition())
-            elif is_leaf(child):
-                # we can't call .treeposition() on a leaf node
-                treepos_list = list(treepos)
-                treepos_list.append(i)
-                leaf_treepos = tuple(treepos_list)
-                children_treepos.append(leaf_treepos)
-        return children_treepos
-
-    def get_siblings_treepos(self, treepos):
-        """Given a treeposition, return the treepositions of its siblings."""
-        parent_pos = self.get_parent_treepos(treepos)
-        siblings_treepos = []
-
-        if parent_pos is not None:
-            for child_treepos in self.get_children_treepos(parent_pos):
-                if child_treepos != treepos:
-                    siblings_treepos.append(child_treepos)
-        return siblings_treepos
-
-    def get_cousins_treepos(self, treepos):
-        """Given a treeposition, return the treeposition of its siblings."""
-        cousins_pos = []
-
-        mother_pos = self.get_parent_treepos(treepos)
-        if mother_pos is not None:
-            aunts_pos = self.get_siblings_treepos(mother_pos)
-            for aunt_pos in aunts_pos:
-                cousins_pos.extend( self.get_children_treepos(aunt_pos) )
-        return cousins_pos
-
-    def get_parent_label(self, treepos):
-        """Given the treeposition of a node, return the label of its parent.
-        Returns None, if the tree has no parent.
+        It is only built on demand, as write() streams the rs3 file without
+        keeping all of its elements in memory.
         """
-        parent_pos = self.get_parent_treepos(treepos)
-        if parent_pos is not None:
-            parent = self.dgtree[parent_pos]
-            return parent.label()
+        if self._etree is None:
+            self._etree = self.gen_etree()
+        return self._etree
+
+    def get_relations(self):
+        """Return a (relation name, relation type) dict of all the RST
+        relations occurring in the tree (cf. extract_relations())."""
+        relations = {}
+        for node_index, label in enumerate(self.nodes.labels):
+            if self.get_node_type(node_index) == TreeNodeTypes.relation_node:
+                child_labels = self.get_children_labels(node_index)
+                assert all(child_label in NUCLEARITY_LABELS for child_label in child_labels)
+                if 'S' in child_labels:
+                    relations[label] = 'rst'
+                else:
+                    relations[label] = 'multinuc'
+        return relations
+
+    def get_node_type(self, node_index):
+        """Returns the type of the node with the given index."""
+        label = self.nodes.labels[node_index]
+        if label is None:
+            return TreeNodeTypes.leaf_node
+        elif label == '':
+            node = self.nodes.subtrees[node_index]
+            assert node == DGParentedTree('', []), \
+                "The tree has no root label, but isn't empty: {}".format(node)
+            return TreeNodeTypes.empty_tree
+        elif label in NUCLEARITY_LABELS:
+            return TreeNodeTypes.nuclearity_node
         else:
-            return None
-
-    def get_children_labels(self, treepos):
-        """Given the treeposition of a node, return the labels of its children."""
-        children_labels = []
-        node = self.dgtree[treepos]
-        for child in node:
-            if is_leaf(child):
-                # we can't call .label() on a leaf node
-                children_labels.append(child)
-            else:
-                children_labels.append(child.label())
-        return children_labels
+            return TreeNodeTypes.relation_node
+
+    @staticmethod
+    def get_node_id(node_index):
+        """Given the index of a node, return its node ID for rs3."""
+        return str(node_index + 1)
+
+    def get_cousins(self, node_index):
+        """Given the index of a node, return the indices of its cousins
+        (i.e. the children of the siblings of its parent)."""
+        parent_index = self.nodes.parents[node_index]
+        grandparent_index = self.nodes.parents[parent_index]
+        return [cousin_index
+                for aunt_index in self.nodes.children[grandparent_index]
+                if aunt_index != parent_index
+                for cousin_index in self.nodes.children[aunt_index]]
+
+    def get_children_labels(self, node_index):
+        """Given the index of a node, return the labels of its children
+        (leaf nodes are represented by their text)."""
+        return [self.nodes.subtrees[child_index] if self.nodes.labels[child_index] is None
+                else self.nodes.labels[child_index]
+                for child_index in self.nodes.children[node_index]]
 
     def get_reltype(self, relname):
         """Given a relation name, return its type, i.e. 'rst' or 'multinuc'
@@ -197,6 +215,27 @@ class RS3FileWriter(object):
         tree.append(body)
         return tree
 
+    def get_relation_items(self, include_default_relations=True):
+        """Return the sorted (relation name, relation type) tuples that are
+        listed in the <relations> header of the RS3 file.
+
+        If `include_default_relations` is `True`, always include the set
+        of RST relations commonly included in RSTTool/rstWeb. If set to
+        `False`, only include those relations that are actually used in
+        the input file.
+        """
+        if not include_default_relations:
+            return tuple(sorted(self.relations.items()))
+
+        if all(self.default_relations.get(relname) == reltype
+               for relname, reltype in self.relations.items()):
+            return self.default_relation_items
+
+        # the relations in the input file always overrule the defaults
+        relations = dict(self.default_relations)
+        relations.update(self.relations)
+        return tuple(sorted(relations.items()))
+
     def gen_relations(self, include_default_relations=True):
         """Create the <relations> etree element of an RS3 file.
         This represents all relation types (both 'rst' and 'multinuc').
@@ -204,96 +243,135 @@ class RS3FileWriter(object):
         Example relation:
             <rel name="circumstance" type="rst" />
 
-        If `include_default_relations` is `True`, always include the set
-        of RST relations commonly included in RSTTool/rstWeb. If set to
-        `False`, only include those relations that are actually used in
-        the input file.
+        cf. get_relation_items() for `include_default_relations`.
         """
-        if include_default_relations:
-            # the relations in the input file always overrule the defaults
-            self.default_relations.update(self.relations)
-            self.relations = self.default_relations
+        return gen_relations_elem(self.get_relation_items(include_default_relations))
 
-        relations_elem = E('relations')
-        for relname in sorted(self.relations):
-            relations_elem.append(
-                E('rel', OrderedDict([('name', relname), ('type', self.relations[relname])])))
-        return relations_elem
+    def gen_relations_fragment(self, include_default_relations=True):
+        """Return the (pretty-printed) <relations> element of an RS3 file
+        as bytes, cf. gen_relations().
+        """
+        relation_items = self.get_relation_items(include_default_relations)
+        if relation_items is self.default_relation_items:
+            return self.default_relations_fragment
+        return gen_relations_fragment(relation_items)
 
     def gen_body(self):
         """Create the <body> etree element of an RS3 file (contains segments
         and groups) given a DGParentedTree.
         """
-        # We need to sort the treepositions, as RSTTool relies on <segment>
-        # elements to be in linear order of the EDUs in the text.
-        for treepos in sorted(self.treepositions):
-            node = self.dgtree[treepos]
-            node_id = self.get_node_id(treepos)
-            node_type = get_node_type(node)
-
-            if node_type in (TreeNodeTypes.leaf_node,
-                             TreeNodeTypes.relation_node):
-                relname, parent_id = self.get_relname_and_parent(treepos)
-
-                attrib_list = [('id', node_id)]
-                if parent_id is not None:
-                    attrib_list.extend([('parent', parent_id), ('relname', relname)])
-
-                if node_type == TreeNodeTypes.leaf_node:
-                    self.body['segments'].append(E('segment', node, OrderedDict(attrib_list)))
-
-                else:  # node_type == TreeNodeTypes.relation_node:
-                    group_type = self.get_group_type(treepos)
-                    # insert 'type' attrib between 'id' and 'parent'
-                    attrib_list.insert(1, ('type', group_type))
-                    self.body['groups'].append(E('group', OrderedDict(attrib_list)))
-
-    def get_group_type(self, treepos):
-        node = self.dgtree[treepos]
-        assert get_node_type(node) == TreeNodeTypes.relation_node
-        labels = self.get_children_labels(treepos)
+        self.body['segments'].extend(self.iter_body_elements(TreeNodeTypes.leaf_node))
+        self.body['groups'].extend(self.iter_body_elements(TreeNodeTypes.relation_node))
+
+    def iter_body_elements(self, node_type):
+        """Yield the <segment> (for leaf nodes) or <group> elements (for
+        relation nodes) of the <body> of an RS3 file, one at a time.
+        """
+        assert node_type in (TreeNodeTypes.leaf_node, TreeNodeTypes.relation_node)
+        # The nodes are in pre-order, i.e. <segment> elements are in linear
+        # order of the EDUs in the text (which RSTTool relies on).
+        for node_index, node in enumerate(self.nodes.subtrees):
+            if self.get_node_type(node_index) != node_type:
+                continue
+
+            relname, parent_id = self.get_relname_and_parent(node_index)
+
+            attrib_list = [('id', self.get_node_id(node_index))]
+            if parent_id is not None:
+                attrib_list.extend([('parent', parent_id), ('relname', relname)])
+
+            if node_type == TreeNodeTypes.leaf_node:
+                yield E('segment', node, OrderedDict(attrib_list))
+
+            else:  # node_type == TreeNodeTypes.relation_node:
+                group_type = self.get_group_type(node_index)
+                # insert 'type' attrib between 'id' and 'parent'
+                attrib_list.insert(1, ('type', group_type))
+                yield E('group', OrderedDict(attrib_list))
+
+    def write(self, outfile):
+        """Write the tree as an rs3 file into the given (binary) file-like object.
+
+        The <segment> and <group> elements are generated and written one at
+        a time, but the output is identical to the pretty-printed etree.
+        """
+        outfile.write(b"<?xml version='1.0' encoding='UTF-8'?>\n<rst>\n  <header>\n")
+        outfile.write(self.gen_relations_fragment())
+        outfile.write(b'  </header>\n  ')
+        with etree.xmlfile(outfile, encoding='UTF-8') as xml_file:
+            # rs3 files usually list the segments before the groups
+            body_elements = itertools.chain(
+                self.iter_body_elements(TreeNodeTypes.leaf_node),
+                self.iter_body_elements(TreeNodeTypes.relation_node))
+            write_children(xml_file, E('body'), body_elements, level=1)
+        outfile.write(b'\n</rst>\n')
+
+    def get_group_type(self, node_index):
+        assert self.get_node_type(node_index) == TreeNodeTypes.relation_node
+        labels = self.get_children_labels(node_index)
         if (len(labels) == 2) and ('S' in labels):
             return 'span'
         elif (len(labels) > 1) and set(labels) == {'N'}:
             return 'multinuc'
         else:
-            raise ValueError("Unknown group type of node '{}'.".format(node))
+            raise ValueError("Unknown group type of node '{}'.".format(
+                self.nodes.subtrees[node_index]))
 
-    def get_relname_and_parent(self, treepos):
+    def get_relname_and_parent(self, node_index):
         """Return the (relation name, parent ID) tuple that a node is in.
         Return None if this node is not in a relation.
         """
-        node = self.dgtree[treepos]
-        node_type = get_node_type(node)
+        node_type = self.get_node_type(node_index)
         assert node_type in (TreeNodeTypes.relation_node, TreeNodeTypes.leaf_node)
 
-        parent_pos = self.get_parent_treepos(treepos)
-        if parent_pos is None:  # a root node has no upward relation
+        parent_index = self.nodes.parents[node_index]
+        if parent_index is None:  # a root node has no upward relation
             return None, None
-        else:
-            parent_label = self.get_parent_label(treepos)
-            grandparent_pos = self.get_parent_treepos(parent_pos)
-
-            if grandparent_pos is None:
-                # a tree with only one EDU/leaf and a 'N' parent but no relation
-                return None, None
-            else:
-                grandparent_id = self.get_node_id(grandparent_pos)
-                grandparent_label = self.get_parent_label(parent_pos)
-                reltype = self.get_reltype(grandparent_label)
-
-                if reltype == 'rst':
-                    if parent_label == 'N':
-                        return 'span', grandparent_id
-                    elif parent_label == 'S':
-                        cousins_pos = self.get_cousins_treepos(treepos)
-                        assert len(cousins_pos) == 1
-                        cousin_id = self.get_node_id(cousins_pos[0])
-                        return grandparent_label, cousin_id
-                elif reltype == 'multinuc':
-                    return grandparent_label, grandparent_id
+
+        grandparent_index = self.nodes.parents[parent_index]
+        if grandparent_index is None:
+            # a tree with only one EDU/leaf and a 'N' parent but no relation
+            return None, None
+
+        parent_label = self.nodes.labels[parent_index]
+        grandparent_id = self.get_node_id(grandparent_index)
+        grandparent_label = self.nodes.labels[grandparent_index]
+        reltype = self.get_reltype(grandparent_label)
+
+        if reltype == 'rst':
+            if parent_label == 'N':
+                return 'span', grandparent_id
+            elif parent_label == 'S':
+                cousins = self.get_cousins(node_index)
+                assert len(cousins) == 1
+                return grandparent_label, self.get_node_id(cousins[0])
+        elif reltype == 'multinuc':
+            return grandparent_label, grandparent_id
+
+
+def write_children(xml_file, elem, children, level=0):
+    """Write an (empty) etree element and the given child elements into an
+    lxml.etree.xmlfile, indented like lxml's pretty printer does.
+    """
+    indent = '\n' + '  ' * (level + 1)
+    children = iter(children)
+    first_child = next(children, None)
+    if first_child is None:
+        xml_file.write(elem)
+        return
+
+    with xml_file.element(elem.tag, elem.attrib):
+        xml_file.write(indent)
+        xml_file.write(first_child)
+        for child in children:
+            xml_file.write(indent)
+            xml_file.write(child)
+        xml_file.write(indent[:-2])
 
 
 def write_rs3(dgtree, output_file):
-    """Convert a DGParentedTree representation of an RST tree into an .rs3 file"""
+    """Convert a DGParentedTree representation of an RST tree into an .rs3 file.
+
+    ``output_file`` can be a path or a file-like object.
+    """
     RS3FileWriter(dgtree, debug=False, output_filepath=output_file)
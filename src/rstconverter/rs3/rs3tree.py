@@ -5,19 +5,18 @@
 """This module converts .rs3 files into `NLTK ParentedTree`s."""
 
 import codecs
-from collections import defaultdict
+from collections import defaultdict, deque
 import logging
-import tempfile
-import textwrap
-from operator import itemgetter, methodcaller
+from operator import itemgetter
 import os
+import sys
 
 from lxml import etree
 from lxml.builder import E
 
+from rstconverter.common import get_filepath, open_input
 from rstconverter.tree import (
-    DGParentedTree, debug_root_label, p, t, is_leaf)
-from rstconverter.rs3 import extract_relationtypes
+    DGParentedTree, debug_root_label, p, t, is_leaf, wrap_text)
 
 NUCLEARITY_LABELS = ('N', 'S')
 VIRTUAL_ROOT = 'virtual-root'
@@ -29,6 +28,73 @@ class SchemaTypes(object):
     two_sided = 'two_sided' # S-N-S
 
 
+class Nuclearity(object):
+    """Enumerator of the nuclearity of RS3 nodes"""
+    root = 'root'
+    nucleus = 'nucleus'
+    satellite = 'satellite'
+
+
+class RS3Node(object):
+    """Attributes of a <segment> or <group> element of an .rs3 file.
+
+    Nodes support (a subset of) the dict interface, e.g. ``node['relname']``
+    or ``node.get('parent')``, so that they can be used like the dicts
+    that were previously stored in RSTTree.elem_dict. Unset attributes
+    are empty strings.
+    """
+    __slots__ = ('parent', 'relname', 'nuclearity', 'reltype',
+                 'element_type', 'text', 'group_type')
+
+    def __init__(self, element_type, parent=None, relname=None, text='', group_type=''):
+        self.element_type = element_type
+        self.parent = parent
+        self.relname = relname
+        self.nuclearity = ''
+        self.reltype = ''
+        self.text = text
+        self.group_type = group_type
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (RS3Node, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return 'RS3Node({})'.format(dict(self.items()))
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def values(self):
+        return [getattr(self, key) for key in self.__slots__]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+
 class NoRootError(ValueError):
     """An RST Tree with multiple nodes without an ancestor."""
     pass
@@ -45,26 +111,34 @@ class TooFewChildrenError(ValueError):
 
 
 class RSTTree(object):
-    """An RSTTree is a DGParentedTree representation of an .rs3 file."""
-    def __init__(self, rs3_file, word_wrap=0, debug=False):
+    """An RSTTree is a DGParentedTree representation of an .rs3 file.
+
+    ``rs3_file`` can be a path, the content of an .rs3 file (bytes) or a
+    file-like object.
+    """
+    def __init__(self, rs3_file, word_wrap=0, debug=False, recursive=False):
         self.debug = debug
-        self.filepath = rs3_file
+        self.filepath = get_filepath(rs3_file)
         self.child_dict, self.elem_dict, self.edus, self.reltypes = \
             get_rs3_data(rs3_file, word_wrap=word_wrap)
         self.edu_set = set(self.edus)
         self.edu_strings = [self.elem_dict[edu_id]['text']
                             for edu_id in self.edus]
-        self.tree = self.dt()
+        # maps from EDU IDs resp. node IDs to their linear position
+        self.edu_positions = {edu_id: i for i, edu_id in enumerate(self.edus)}
+        self.node_positions = get_node_positions(self.child_dict, self.edu_positions)
+        # maps from node IDs to their distance from the root (roots have depth 1)
+        self.node_depths = get_node_depths(self.child_dict)
+        # subtrees built by dt_iterative(), but not yet used by their parents
+        self._subtrees = {}
+        self.tree = self.dt() if recursive else self.dt_iterative()
 
     @classmethod
     def fromstring(cls, rs3_string):
         """Create an RSTTree instance from a string content an *.rs3 file."""
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(rs3_string)
-        temp.close()
-        rst_tree = cls(rs3_file=temp.name)
-        os.unlink(temp.name)
-        return rst_tree
+        if isinstance(rs3_string, str):
+            rs3_string = rs3_string.encode('utf-8')
+        return cls(rs3_file=rs3_string)
 
     def _repr_png_(self):
         """This PNG representation will be automagically used inside
@@ -95,15 +169,15 @@ class RSTTree(object):
         return self.tree.__getitem__(key)
 
     def node_height(self, node_id):
+        """Return the number of nodes on the path from the given node to
+        its root (a root node has height 1)."""
         assert node_id in self.elem_dict
+        return self.node_depths[node_id]
 
-        height = 0
-        lookup_id = node_id
-
-        while lookup_id is not None:
-            lookup_id = self.elem_dict[lookup_id]['parent']
-            height += 1
-        return height
+    def node_position(self, node_id):
+        """Return the linear position of the given node, i.e. the position
+        of the first EDU it contains."""
+        return self.node_positions[node_id]
 
     def get_relname(self, node_id):
         return self.elem_dict[node_id]['relname']
@@ -133,11 +207,35 @@ class RSTTree(object):
             return self.group2tree(
                 elem_id, elem, elem_type, start_node=start_node)
 
+    def dt_iterative(self):
+        """Create an RSTTree from the output of get_rs3_data() without
+        recursion, i.e. it also works for very deep trees.
+
+        This produces the same tree as dt(), but builds the subtree of each
+        node before the subtree of its parent (using the same methods as
+        dt()), so subtree() never has to recurse.
+        """
+        # reverse breadth-first order: children come before their parents
+        for node_id in reversed(list(self.node_depths)):
+            self._subtrees[node_id] = self.dt(start_node=node_id)
+        tree = self.root2tree()
+        self._subtrees.clear()
+        return tree
+
+    def subtree(self, node_id):
+        """Return the DGParentedTree of the subtree rooted in the given node,
+        either one that was already built by dt_iterative() or by calling
+        dt() recursively.
+        """
+        if node_id in self._subtrees:
+            return self._subtrees.pop(node_id)
+        return self.dt(start_node=node_id)
+
     def root2tree(self, start_node=None):
         root_nodes = self.child_dict[start_node]
         num_roots = len(root_nodes)
         if num_roots == 1:
-            return self.dt(start_node=root_nodes[0])
+            return self.subtree(root_nodes[0])
         elif num_roots > 1:
             # An undesired, but common case (at least in the PCC corpus).
             # This happens if there's one EDU not to connected to the rest
@@ -145,9 +243,9 @@ class RSTTree(object):
             # nodes part of a multinuc relation called VIRTUAL_ROOT.
             logging.log(logging.INFO,
                         "File '{}' has {} roots!".format(
-                            os.path.basename(self.filepath), num_roots))
+                            os.path.basename(self.filepath or '<string>'), num_roots))
 
-            root_subtrees = [n_wrap(self.dt(start_node=root_id),
+            root_subtrees = [n_wrap(self.subtree(root_id),
                                     debug=self.debug, root_id=root_id)
                              for root_id in root_nodes]
             sorted_subtrees = self.sort_subtrees(*root_subtrees)
@@ -171,10 +269,10 @@ class RSTTree(object):
             if len(self.child_dict[elem_id]) == 1:
                 # this group is the root of another N-S relation
                 subtree_id = self.child_dict[elem_id][0]
-                subtree = self.dt(start_node=subtree_id)
+                subtree = self.subtree(subtree_id)
 
             else:
-                subtrees = [self.elem_wrap(self.dt(start_node=c), debug=self.debug, root_id=c)
+                subtrees = [self.elem_wrap(self.subtree(c), debug=self.debug, root_id=c)
                             for c in self.child_dict[elem_id]]
                 sorted_subtrees = self.sort_subtrees(*subtrees)
                 first_child_id = self.child_dict[elem_id][0]
@@ -195,7 +293,7 @@ class RSTTree(object):
                                       if self.elem_dict[c]['reltype'] == 'multinuc']
                 multinuc_relname = self.get_relname(multinuc_child_ids[0])
 
-                multinuc_elements = [self.dt(start_node=mc)
+                multinuc_elements = [self.subtree(mc)
                                      for mc in multinuc_child_ids]
                 sorted_subtrees = self.sort_subtrees(*multinuc_elements)
 
@@ -213,7 +311,7 @@ class RSTTree(object):
                     assert all([self.elem_dict[child_id]['nuclearity'] == 'satellite'
                                 for child_id in other_child_ids])
 
-                    sat_subtrees = [self.dt(start_node=child_id)
+                    sat_subtrees = [self.subtree(child_id)
                                     for child_id in other_child_ids]
                     return self.order_schema(nuc_tree, sat_subtrees)
 
@@ -228,7 +326,7 @@ class RSTTree(object):
                 if len(self.child_dict[elem_id]) == 1:
                     # this span at the top of a tree was only added for visual purposes
                     child_id = self.child_dict[elem_id][0]
-                    return self.dt(start_node=child_id)
+                    return self.subtree(child_id)
 
                 elif len(self.child_dict[elem_id]) == 2:
                     child_nuclearities = set([self.elem_dict[child_id]['nuclearity']
@@ -242,9 +340,9 @@ class RSTTree(object):
                             children[self.elem_dict[child_id]['nuclearity']] = child_id
 
                         sat_id = children['satellite']
-                        sat_subtree = self.dt(start_node=sat_id)
+                        sat_subtree = self.subtree(sat_id)
 
-                        nuc_subtree = self.dt(start_node=children['nucleus'])
+                        nuc_subtree = self.subtree(children['nucleus'])
                         nuc_tree = n_wrap(nuc_subtree, debug=self.debug, root_id=elem_id)
 
                         return self.sorted_nucsat_tree(nuc_tree, sat_subtree)
@@ -254,7 +352,7 @@ class RSTTree(object):
                         # basically a multinuc relation in a <group ... type="span"/>
                         # instead of a <group ... type="multinuc" />.
                         # RSTTool accepts this, we should too.
-                        subtrees = [self.dt(start_node=child_id)
+                        subtrees = [self.subtree(child_id)
                                     for child_id in self.child_dict[elem_id]]
                         return self.sorted_nucsat_tree(*subtrees)
 
@@ -265,10 +363,10 @@ class RSTTree(object):
 
                     assert len(children['nucleus']) == 1
 
-                    nuc_subtree = self.dt(start_node=children['nucleus'][0])
+                    nuc_subtree = self.subtree(children['nucleus'][0])
                     nuc_tree = t('N', nuc_subtree, debug=self.debug, root_id=elem_id)
 
-                    sat_subtrees = [self.dt(start_node=sat_child_id)
+                    sat_subtrees = [self.subtree(sat_child_id)
                                     for sat_child_id in children['satellite']]
 
                     return self.order_schema(nuc_tree, sat_subtrees)
@@ -296,7 +394,7 @@ class RSTTree(object):
                     logging.log(
                         logging.INFO,
                         "Segment '{}' in file '{}' is a non-root nucleus without children".format(
-                            elem_id, os.path.basename(self.filepath)))
+                            elem_id, os.path.basename(self.filepath or '<string>')))
 
                     if elem.get('relname') == 'span':
                         parent_elem = self.elem_dict.get(elem.get('parent'))
@@ -308,7 +406,7 @@ class RSTTree(object):
         if len(self.child_dict[elem_id]) == 1:
             # this segment is (also) the N in an N-S relation
             sat_id = self.child_dict[elem_id][0]
-            sat_subtree = self.dt(start_node=sat_id)
+            sat_subtree = self.subtree(sat_id)
             return self.sorted_nucsat_tree(tree, sat_subtree)
 
         elif len(self.child_dict[elem_id]) >= 2:
@@ -317,7 +415,7 @@ class RSTTree(object):
             assert all([self.elem_dict[child_id]['nuclearity'] == 'satellite'
                         for child_id in self.child_dict[elem_id]])
 
-            sat_subtrees = [self.dt(start_node=child_id)
+            sat_subtrees = [self.subtree(child_id)
                             for child_id in self.child_dict[elem_id]]
             return self.order_schema(tree, sat_subtrees)
 
@@ -383,8 +481,15 @@ class RSTTree(object):
         return nuc_tree
 
     def get_linear_position(self, subtree):
-        first_leaf_text = subtree.leaves()[0]
-        return self.edu_strings.index(first_leaf_text)
+        """Return the linear position of the first EDU in the given subtree.
+
+        We follow the leftmost path down to the first EDU, whose parent
+        (an 'N' or 'S' node) carries the ID of its segment.
+        """
+        node = subtree
+        while not is_leaf(node[0]):
+            node = node[0]
+        return self.edu_positions[node.root_id]
 
     def sort_subtrees(self, *subtrees):
         """sort the given subtrees (of type DGParentedTree) based on their
@@ -393,11 +498,12 @@ class RSTTree(object):
         they are sorted by their height in reverse order (i.e. the child
         appears before its parent).
         """
-        subtrees_desc_height = sorted(subtrees,
-                                      key=methodcaller('node_height', self),
-                                      reverse=True)
-        return sorted(subtrees_desc_height,
-                      key=methodcaller('get_position', self))
+        return sorted(subtrees, key=self.subtree_sort_key)
+
+    def subtree_sort_key(self, subtree):
+        """Sort key for subtrees: linear position, then height (descending)."""
+        return (self.node_positions[subtree.root_id],
+                -self.node_depths[subtree.root_id])
 
     def sorted_nucsat_tree(self, nuc_tree, sat_tree):
         sorted_subtrees = self.sort_subtrees(nuc_tree, sat_tree)
@@ -422,58 +528,65 @@ def get_rs3_data(rs3_file, word_wrap=0):
     """helper function to build RSTTrees: data on parent-child relations
     and node attributes.
 
-    TODO: add proper documentation
+    The .rs3 file is parsed incrementally (using lxml's iterparse), i.e.
+    each <rel>, <segment> and <group> element is discarded as soon as its
+    data has been extracted, so we never keep the whole XML tree in memory.
+
+    Returns
+    -------
+    children : defaultdict(list)
+        maps from a node ID to the IDs of its child nodes
+        (the root nodes are the children of None)
+    elements : dict of (str, RS3Node)
+        maps from a node ID to its attributes ('parent', 'relname',
+        'nuclearity', 'reltype', 'element_type', 'text', 'group_type')
+    ordered_edus : list(str)
+        IDs of all segments in document order
+    reltypes : dict of (str, str)
+        maps from relation names to relation types ('rst' or 'multinuc')
     """
-    rs3_etree = etree.parse(rs3_file)
-    reltypes = extract_relationtypes(rs3_etree)
-
-    elements = defaultdict(lambda: defaultdict(str))
+    reltypes = {}
+    elements = {}
     children = defaultdict(list)
     ordered_edus = []
 
-    for elem in rs3_etree.iter('segment', 'group'):
-        elem_id = elem.attrib['id']
-        parent_id = elem.attrib.get('parent')
-        elements[elem_id]['parent'] = parent_id
-        children[parent_id].append(elem_id)
+    with open_input(rs3_file, binary=True) as rs3_stream:
+        for _event, elem in etree.iterparse(
+                rs3_stream, events=('end',), tag=('rel', 'segment', 'group')):
+            if elem.tag == 'rel':
+                if 'type' in elem.attrib:
+                    reltypes[sys.intern(elem.attrib['name'])] = sys.intern(elem.attrib['type'])
+            else:
+                add_rs3_element(elem, elements, children, ordered_edus, word_wrap)
 
-        relname = elem.attrib.get('relname')
-        elements[elem_id]['relname'] = relname
+            # free the memory used by this element and its preceding siblings
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    # relation types are only known after the whole file has been read
+    for node in elements.values():
+        relname = node.relname
         if relname is None:
             # Nodes without a parent have no relname attribute.
             # They might well the N of a relation.
-            elements[elem_id]['nuclearity'] = 'root'
+            node.nuclearity = Nuclearity.root
         else:
             reltype = reltypes.get(relname, 'span')
-            elements[elem_id]['reltype'] = reltype
+            node.reltype = reltype
             if reltype == 'rst':
                 # this elem is the S of an N-S relation, its parent is the N
-                elements[elem_id]['nuclearity'] = 'satellite'
+                node.nuclearity = Nuclearity.satellite
             elif reltype == 'multinuc':
                 # this elem is one of several Ns of a multinuc relation.
                 # its parent is the multinuc relation node.
-                elements[elem_id]['nuclearity'] = 'nucleus'
+                node.nuclearity = Nuclearity.nucleus
             elif reltype == 'span':
                 # this elem is the N of an N-S relation, its parent is a span
-                elements[elem_id]['nuclearity'] = 'nucleus'
+                node.nuclearity = Nuclearity.nucleus
             else:
                 raise NotImplementedError("Unknown reltype: {}".format(reltypes[relname]))
 
-        elem_type = elem.tag
-        elements[elem_id]['element_type'] = elem_type
-
-        if elem_type == 'segment':
-            edu_text = normalize_edu_string(elem.text)
-            if word_wrap != 0:
-                dedented_text = textwrap.dedent(edu_text).strip()
-                edu_text = textwrap.fill(dedented_text, width=word_wrap)
-
-            elements[elem_id]['text'] = edu_text
-            ordered_edus.append(elem_id)
-
-        else:  # elem_type == 'group':
-            elements[elem_id]['group_type'] = elem.attrib.get('type')
-
     if len(elements) > 0:
         # add VIRTUAL_ROOT to reltypes dict for export, but only if the
         # rs3 file is not empty
@@ -482,6 +595,84 @@ def get_rs3_data(rs3_file, word_wrap=0):
     return children, elements, ordered_edus, reltypes
 
 
+def add_rs3_element(elem, elements, children, ordered_edus, word_wrap=0):
+    """Add the data of a <segment> or <group> element to the
+    dictionaries/lists built by get_rs3_data()."""
+    elem_id = elem.attrib['id']
+    parent_id = elem.attrib.get('parent')
+    relname = elem.attrib.get('relname')
+    if relname is not None:
+        # there are only a few relation names, but many nodes
+        relname = sys.intern(relname)
+    children[parent_id].append(elem_id)
+
+    if elem.tag == 'segment':
+        edu_text = normalize_edu_string(elem.text)
+        if word_wrap != 0:
+            edu_text = wrap_text(edu_text, word_wrap)
+
+        elements[elem_id] = RS3Node('segment', parent=parent_id, relname=relname,
+                                    text=edu_text)
+        ordered_edus.append(elem_id)
+
+    else:  # elem.tag == 'group':
+        group_type = elem.attrib.get('type')
+        if group_type is not None:
+            group_type = sys.intern(group_type)
+        elements[elem_id] = RS3Node('group', parent=parent_id, relname=relname,
+                                    group_type=group_type)
+
+
+def get_node_depths(child_dict):
+    """Return a dict that maps from node IDs to their depth, i.e. the
+    number of nodes on the path from the node to its root (roots have
+    depth 1).
+
+    The depths are computed in one breadth-first traversal of child_dict,
+    starting from the root nodes (i.e. the children of None).
+    """
+    depths = {}
+    # we use get() because child_dict is a defaultdict and we don't want
+    # to add new keys to it.
+    queue = deque((root_id, 1) for root_id in child_dict.get(None, []))
+    while queue:
+        node_id, depth = queue.popleft()
+        if node_id not in depths:
+            depths[node_id] = depth
+            queue.extend((child_id, depth + 1)
+                         for child_id in child_dict.get(node_id, []))
+    return depths
+
+
+def get_node_positions(child_dict, edu_positions):
+    """Return a dict that maps from node IDs to their linear position.
+
+    The position of an EDU is its index in the document, the position of
+    any other node is the minimum position of its children.
+
+    Parameters
+    ----------
+    child_dict : dict from str to list(str)
+        maps from a node ID to the IDs of its child nodes
+        (the root nodes are the children of None)
+    edu_positions : dict from str to int
+        maps from an EDU ID to its linear position in the document
+    """
+    positions = dict(edu_positions)
+
+    # children are handled before their parents, i.e. we iterate over
+    # the nodes in reverse breadth-first order
+    for node_id in reversed(list(get_node_depths(child_dict))):
+        if node_id in edu_positions:
+            continue
+        child_positions = [positions[child_id]
+                           for child_id in child_dict.get(node_id, [])
+                           if child_id in positions]
+        if child_positions:
+            positions[node_id] = min(child_positions)
+    return positions
+
+
 def normalize_edu_string(edu_string):
     """Remove superfluous whitespace from an EDU and return it."""
     return ' '.join(edu_string.strip().split())
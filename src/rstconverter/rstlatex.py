@@ -17,6 +17,7 @@ import re
 
 import nltk
 
+from rstconverter.common import open_output
 from rstconverter.rs3.rs3tree import RSTTree
 
 
@@ -37,7 +38,7 @@ class RSTLatexFileWriter(object):
         self.rstlatextree = rsttree2rstlatex(tree)
 
         if output_filepath is not None:
-            with codecs.open(output_filepath, 'w', 'utf-8') as outfile:
+            with open_output(output_filepath) as outfile:
                 outfile.write(self.rstlatextree + '\n')
 
     def __str__(self):
@@ -214,5 +215,8 @@ def indent_tab(text, number):
 
 
 def write_rstlatex(tree, output_file=None):
-    """Converts an RST tree into a rst.sty Latex string representation"""
+    """Converts an RST tree into a rst.sty Latex string representation.
+
+    ``output_file`` can be a path or a file-like object.
+    """
     return RSTLatexFileWriter(tree, output_filepath=output_file)
@@ -14,28 +14,35 @@ import os
 
 from nltk.tree import Tree
 
-from rstconverter.common import RSTBaseTree
+from rstconverter.common import get_filepath, read_input, RSTBaseTree
 from rstconverter.tree import DGParentedTree, t, word_wrap_tree
 
 # nuclearity of the child nodes, followed by the relation name, e.g. 'NS-Contrast'
 STAGEDP_REL_RE = re.compile(r"^(N|S)(N|S)-(.*)$")
 
+# paragraph/sentence markers at the start of an EDU
+STAGEDP_EDU_MARKERS = ('<P>_', '<S>_')
+
 
 class StageDPRSTTree(RSTBaseTree):
     """A StageDPRSTTree is a DGParentedTree representation (Rhetorical Structure tree)
-    parsed from a .stagedp file."""
+    parsed from a .stagedp file.
+
+    ``stagedp_filepath`` can be a path, the content of a .stagedp file
+    (bytes) or a file-like object.
+    """
     def __init__(self, stagedp_filepath, word_wrap=0):
-        self.filepath = stagedp_filepath
+        self.filepath = get_filepath(stagedp_filepath)
 
-        with open(stagedp_filepath, 'r') as stagedp_file:
-            stagedp_str = stagedp_file.read()
-            self.stagedp_file_tree = self.stagedp2tree(stagedp_str)
-            tree = self.stagedptree2dgparentedtree()
-            self.tree = word_wrap_tree(tree, width=word_wrap)
+        stagedp_str = read_input(stagedp_filepath)
+        self.stagedp_file_tree = self.stagedp2tree(stagedp_str)
+        tree = self.stagedptree2dgparentedtree()
+        self.tree = word_wrap_tree(tree, width=word_wrap)
  
     def stagedp2tree(self, parse_string):
-        """convert the output of the StageDP RST parser into a DGParentedTree
-        representation of that parse tree.
+        """convert the output of the StageDP RST parser into an nltk.tree.Tree
+        representation of that parse tree (the EDUs are cleaned up later,
+        cf. stagedptree2dgparentedtree()).
 
         Parameters:
         parse_tree_str : str
@@ -45,79 +52,86 @@ class StageDPRSTTree(RSTBaseTree):
         tree : nltk.tree.Tree
             parse tree object of StageDP's output string
         """
-        tree = Tree.fromstring(parse_string)
-
-        for i, leaf in enumerate(tree.leaves()):
-            leaf_pos = tree.leaf_treeposition(i)
-            tree[leaf_pos] = self.cleanup_edu_text(tree[leaf_pos])
-        return tree   
+        return Tree.fromstring(parse_string)
 
     @staticmethod
     def cleanup_edu_text(text):
         """Given a StageDP-formatted EDU, return a human-readable version without markup."""
-        return ' '.join(tok for tok in text[2:-2].split('_')
-                        if tok not in ('<P>', '<S>'))
+        edu_text = text[2:-2]
+        # EDUs usually start with paragraph/sentence markers, e.g. '<P>_<S>_They_did_...'
+        while edu_text.startswith(STAGEDP_EDU_MARKERS):
+            edu_text = edu_text[4:]
+        if '<P>' in edu_text or '<S>' in edu_text:
+            return ' '.join(tok for tok in edu_text.split('_')
+                            if tok not in ('<P>', '<S>'))
+        return edu_text.replace('_', ' ')
 
     def stagedptree2dgparentedtree(self):
         """Convert the tree from StageDP's format into a conventional binary tree,
         which can be easily converted into output formats like RS3.
+
+        The input tree::
+
+                            NS-Explanation
+                    _______________|_______________
+                  EDU                             EDU
+                   |                               |
+             They did n't                   Two weeks later
+            like the offer .                they were found
+                                                 dead .
+
+        is converted into::
+
+                               Explanation
+                    _______________|_______________
+                   N                               S
+                   |                               |
+             They did n't                   Two weeks later
+            like the offer .                they were found
+                                                 dead .
+
+        The EDUs are cleaned up and the relation/nuclearity labels are
+        converted in a single (non-recursive) traversal of the tree.
         """
-        def transform(stagedp_tree, is_tree_root=False):
-            """Transform a StageDP parse tree into a more conventional parse tree.
-
-            The input tree::
-
-                                NS-Explanation                 
-                        _______________|_______________          
-                      EDU                             EDU       
-                       |                               |         
-                 They did n't                   Two weeks later 
-                like the offer .                they were found 
-                                                     dead .
-
-            is converted into::
-
-                                   Explanation                 
-                        _______________|_______________          
-                       N                               S       
-                       |                               |         
-                 They did n't                   Two weeks later 
-                like the offer .                they were found 
-                                                     dead .
-            """
-            if isinstance(stagedp_tree, str) or not hasattr(stagedp_tree, 'label'):
-                return stagedp_tree
-
-            if len(stagedp_tree) == 1:
-                assert stagedp_tree.label() == 'EDU'
-                if is_tree_root: 
-                    # This is not really an RST tree, but parsers sometimes produce output
-                    # that only consists of one EDU.
-                    #
-                    # TODO/FIXME: only do this if this tree has no parent
-                    # either by using a parented tree, or, if that's not possible,
-                    # by adding a parameter to the recursive transform() func
-                    stagedp_tree.set_label('N')
-                    return stagedp_tree
-                else:  # a leaf nucleus or satellite
-                    return stagedp_tree[0] # we remove the 'EDU' node above the actual leaf node
-
-            elif len(stagedp_tree) == 2:  # handle normal binary tree case 
-                match = STAGEDP_REL_RE.match(stagedp_tree.label())
-                assert match, "Relation '{}' does not match regex '{}'".format(stagedp_tree.label(), STAGEDP_REL_RE)
+        stagedp_tree = self.stagedp_file_tree
+        if len(stagedp_tree) == 1:
+            assert stagedp_tree.label() == 'EDU'
+            # This is not really an RST tree, but parsers sometimes produce output
+            # that only consists of one EDU.
+            return DGParentedTree('N', [self.cleanup_edu_text(stagedp_tree[0])])
+
+        subtrees = []  # all subtrees in pre-order
+        stack = [stagedp_tree]
+        while stack:
+            subtree = stack.pop()
+            subtrees.append(subtree)
+            stack.extend(child for child in subtree if isinstance(child, Tree))
+
+        converted = {}  # id(subtree) -> converted subtree (or EDU text)
+
+        def get_converted(child):
+            if isinstance(child, Tree):
+                return converted.pop(id(child))
+            return self.cleanup_edu_text(child)
+
+        # in reverse pre-order, all children are converted before their parent
+        for subtree in reversed(subtrees):
+            if len(subtree) == 1:
+                assert subtree.label() == 'EDU'
+                # we remove the 'EDU' node above the actual leaf node
+                converted[id(subtree)] = get_converted(subtree[0])
+
+            elif len(subtree) == 2:  # handle normal binary tree case
+                match = STAGEDP_REL_RE.match(subtree.label())
+                assert match, "Relation '{}' does not match regex '{}'".format(subtree.label(), STAGEDP_REL_RE)
                 left_child_nuc, right_child_nuc, relname = match.groups()
-                stagedp_tree.set_label(relname)
-
-                for i, child_nuclearity in enumerate([left_child_nuc, right_child_nuc]):
-                    transformed_child_tree = transform(stagedp_tree[i])
-                    stagedp_tree[i] = Tree(child_nuclearity, [transformed_child_tree])
-                return stagedp_tree
+                converted[id(subtree)] = DGParentedTree(relname, [
+                    DGParentedTree(left_child_nuc, [get_converted(subtree[0])]),
+                    DGParentedTree(right_child_nuc, [get_converted(subtree[1])])])
             else:
                 raise ValueError("We can't handle trees with more than two children.")
 
-        # ~ import pudb; pudb.set_trace()
-        tree = transform(self.stagedp_file_tree, is_tree_root=True)
-        return DGParentedTree.convert(tree)
+        return converted[id(stagedp_tree)]
 
 
 # pseudo-function to create a document tree from a RST (.stagedp) file
@@ -7,12 +7,40 @@ This module contains code to convert discourse graphs into rooted, ordered
 trees.
 """
 
+import ast
 from collections import defaultdict, deque
+import functools
 import io
+import pickle
+import re
 import textwrap
 
 from nltk.tree import Tree, ParentedTree
 
+from rstconverter.common import open_output
+
+# a Python string literal (as produced by repr()), optionally with a prefix,
+# e.g. u'...' in the output of Python 2
+_STRING_LITERAL = (r"[uUbBrR]{0,2}(?:" + r"'[^'\\]*(?:\\.[^'\\]*)*'" + '|'
+                   + r'"[^"\\]*(?:\\.[^"\\]*)*"' + ")")
+
+# escaped quotes/backslashes vs. all other escape sequences (e.g. \n, \x..)
+_SIMPLE_ESCAPE_RE = re.compile(r"""\\(['"\\])""")
+_COMPLEX_ESCAPE_RE = re.compile(r"""\\[^'"\\]""")
+
+# tokens of a tree literal like ParseTree('Contrast[S][N]', ['foo', 'bar']),
+# the children can be given as a list or as a tuple
+TREE_LITERAL_RE = re.compile(
+    r"""\s*(?:
+        (?P<open>[A-Za-z_]\w*\(\s*(?P<label>{0})\s*,\s*(?P<bracket>[\[(]))  # start of a (sub)tree
+        |(?P<leaf>{0})                                       # a leaf
+        |(?P<close>(?P<close_bracket>[\])])\s*\))              # end of a (sub)tree
+        |(?P<comma>,)
+    )""".format(_STRING_LITERAL), re.VERBOSE)
+
+# closing brackets of the children of a (sub)tree
+_CLOSING_BRACKETS = {'[': ']', '(': ')'}
+
 
 class DGParentedTree(ParentedTree):
     """An nltk.tree.ParentedTree with an additional root_id parameter."""
@@ -30,12 +58,7 @@ class DGParentedTree(ParentedTree):
         """
         if node_id is None:
             node_id = self.root_id
-
-        if node_id in rst_tree.edu_set:
-            return rst_tree.edus.index(node_id)
-
-        return min(self.get_position(rst_tree, child_node_id)
-                   for child_node_id in rst_tree.child_dict[node_id])
+        return rst_tree.node_position(node_id)
 
     def node_height(self, rst_tree, node_id=None):
         if node_id is None:
@@ -100,22 +123,238 @@ def p(tree):
     return tree.pretty_print()
 
 
+def transform_leaves(tree, function):
+    """Replace each leaf (i.e. string) of the tree in-place with the result
+    of calling the given function on it.
+
+    All leaves are transformed in a single (iterative) traversal of the tree,
+    while looking up each leaf via leaf_treeposition() would walk the tree
+    once per leaf.
+    """
+    if not isinstance(tree, Tree):  # the tree only consists of a leaf
+        return function(tree)
+
+    stack = [tree]
+    while stack:
+        subtree = stack.pop()
+        for i, child in enumerate(subtree):
+            if isinstance(child, Tree):
+                stack.append(child)
+            else:
+                subtree[i] = function(child)
+    return tree
+
+
+@functools.lru_cache(maxsize=4096)
+def wrap_text(text, width):
+    """line-wrap a (leaf) text, e.g. an EDU, for pretty-printing.
+
+    The results are memoized, as the same texts are often wrapped
+    repeatedly (e.g. for each output format of a document).
+    """
+    return textwrap.fill(textwrap.dedent(text).strip(), width=width)
+
+
 def word_wrap_tree(parented_tree, width=0):
     """line-wrap an NLTK ParentedTree for pretty-printing"""
     if width != 0:
-        for i, leaf_text in enumerate(parented_tree.leaves()):
-            dedented_text = textwrap.dedent(leaf_text).strip()
-            parented_tree[parented_tree.leaf_treeposition(i)] = textwrap.fill(dedented_text, width=width)
+        transform_leaves(parented_tree, lambda leaf_text: wrap_text(leaf_text, width))
     return parented_tree
 
 
+def parse_string_literal(literal):
+    """Return the value of a (single or double quoted) Python string literal.
+    Prefixed literals (e.g. u'...', r'...' or b'...') are also accepted,
+    bytes are decoded as UTF-8.
+    """
+    if literal[0] in 'uU' and literal[1] not in 'bB':
+        # the same as an unprefixed (or raw) literal in Python 3
+        literal = literal[1:]
+    if literal[0] not in '\'"':
+        try:
+            value = ast.literal_eval(literal)
+        except SyntaxError:
+            raise ValueError("Invalid string literal: {!r}".format(literal))
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    value = literal[1:-1]
+    if '\\' in value:
+        if _COMPLEX_ESCAPE_RE.search(value):
+            return ast.literal_eval(literal)
+        return _SIMPLE_ESCAPE_RE.sub(r'\1', value)
+    return value
+
+
+def parse_tree_literal(tree_str, tree_class=Tree, pos=0):
+    """Parse the string representation of a tree, i.e. a nested call of
+    a tree constructor with a label and a list of children, e.g.::
+
+        ParseTree('Contrast[S][N]', ["Although they did n't like it ,", 'they accepted the offer .'])
+
+    The children can also be given as a tuple and the strings can be
+    prefixed (e.g. u'...' in the output of parsers running on Python 2).
+    The name of the constructor (e.g. ParseTree, ParentedTree) is ignored and
+    all (sub)trees are created as instances of the given tree class.
+    This is a safe (and faster) replacement for calling eval() on the string.
+
+    ``tree_class`` can also be a function that is called with the label and
+    the (already converted) children of each (sub)tree. Parsing starts at
+    position ``pos`` of the string (e.g. after a header), without copying it.
+    """
+    stack = []  # (label, children, closing bracket) of all unfinished (sub)trees
+    tree = None
+    expect_item = False  # True after an opening bracket or a comma
+    start = pos
+
+    for match in TREE_LITERAL_RE.finditer(tree_str, pos):
+        if match.start() != pos or tree is not None:
+            break
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind == 'leaf':
+            if not expect_item:
+                raise ValueError("Unexpected leaf at position {}".format(match.start()))
+            stack[-1][1].append(parse_string_literal(match.group('leaf')))
+            expect_item = False
+        elif kind == 'comma':
+            if expect_item or not stack:
+                raise ValueError("Unexpected comma at position {}".format(match.start()))
+            expect_item = True
+        elif kind == 'close':
+            if not stack or stack[-1][2] != match.group('close_bracket'):
+                raise ValueError("Unexpected {!r} at position {}".format(
+                    match.group('close'), match.start()))
+            label, children, _ = stack.pop()
+            subtree = tree_class(label, children)
+            if stack:
+                stack[-1][1].append(subtree)
+            else:
+                tree = subtree
+            expect_item = False
+        else:  # start of a (sub)tree
+            if stack and not expect_item:
+                raise ValueError("Missing comma at position {}".format(match.start()))
+            stack.append((parse_string_literal(match.group('label')), [],
+                          _CLOSING_BRACKETS[match.group('bracket')]))
+            expect_item = True
+
+    if tree_str[pos:].strip():
+        raise ValueError(
+            "Can't parse tree literal at position {}: {!r}".format(pos, tree_str[pos:pos+30]))
+    if tree is None:
+        raise ValueError("Incomplete tree literal: {!r}".format(tree_str[start:start+30]))
+    return tree
+
+
+def flatten_tree(tree):
+    """Return the nodes of a tree as a flat list (in pre-order), e.g. to
+    serialize it without recursion (pickle recurses once per tree level).
+
+    A (sub)tree is represented by a (label, number of children, root_id)
+    tuple, a leaf by itself.
+    """
+    nodes = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tree):
+            nodes.append((node.label(), len(node), getattr(node, 'root_id', None)))
+            stack.extend(reversed(node))
+        else:
+            nodes.append(node)
+    return nodes
+
+
+def unflatten_tree(nodes, tree_class=DGParentedTree):
+    """Build a tree from the flat list of its nodes (cf. flatten_tree()).
+
+    The nodes are read in reverse pre-order, so that the children of each
+    (sub)tree are complete before the (sub)tree itself is created.
+    """
+    stack = []
+    for node in reversed(nodes):
+        if isinstance(node, tuple):
+            label, num_children, root_id = node
+            children = [stack.pop() for _ in range(num_children)]
+            stack.append(tree_class(label, children, root_id=root_id))
+        else:
+            stack.append(node)
+    return stack[0]
+
+
+def dumps_tree(tree):
+    """Serialize a DGParentedTree (of any depth) into bytes."""
+    return pickle.dumps(flatten_tree(tree), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads_tree(tree_bytes):
+    """Return the DGParentedTree serialized by dumps_tree()."""
+    return unflatten_tree(pickle.loads(tree_bytes))
+
+
+def copy_tree(tree):
+    """Return a deep copy of a DGParentedTree (of any depth)."""
+    return unflatten_tree(flatten_tree(tree))
+
+
+class NodeTable(object):
+    """Table of all nodes of a tree (in pre-order), which allows
+    constant-time lookups of a node's parent, children and label.
+
+    Attributes
+    ----------
+    subtrees : list
+        all subtrees and leaves of the tree
+    parents : list(int or None)
+        index of the parent of each node (None for the root)
+    children : list(list(int))
+        indices of the children of each node
+    labels : list(str or None)
+        label (e.g. 'N', 'S' or a relation name) of each node
+        (None for leaves)
+    index : dict of (int, int)
+        maps from the id() of each subtree to its index
+    """
+    def __init__(self, tree):
+        self.subtrees = []
+        self.parents = []
+        self.children = []
+        self.labels = []
+        self.index = {}
+
+        stack = [(tree, None)]
+        while stack:
+            subtree, parent_index = stack.pop()
+            node_index = len(self.subtrees)
+            self.subtrees.append(subtree)
+            self.parents.append(parent_index)
+            self.children.append([])
+            if parent_index is not None:
+                self.children[parent_index].append(node_index)
+
+            if is_leaf(subtree):
+                self.labels.append(None)
+            else:
+                self.labels.append(subtree.label())
+                self.index[id(subtree)] = node_index
+                stack.extend((child, node_index) for child in reversed(subtree))
+
+    def __len__(self):
+        return len(self.subtrees)
+
+
 def is_leaf(elem):
     """Returns True, iff the given tree node is a leaf node."""
     return isinstance(elem, str)
 
 
 def write_svgtree(tree, output_file=None):
-    """convert an nltk.tree into an SVG file using svgling."""
+    """convert an nltk.tree into an SVG file using svgling.
+
+    ``output_file`` can be a path or a file-like object. If it is None,
+    the SVG image is returned as a string.
+    """
     # We're not importing svgling globally because it monkey-patches
     # nltk's tree drawing mechanism, i.e. all trees in Jupyter will
     # look different when importing svgling.
@@ -130,5 +369,6 @@ def write_svgtree(tree, output_file=None):
         drawing.write(f)
         return f.getvalue()
     else:
-        drawing.saveas(output_file)
+        with open_output(output_file) as outfile:
+            drawing.write(outfile)
 
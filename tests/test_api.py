@@ -6,7 +6,13 @@
 
 
 import base64
+import email
+import io
+import json
 import os
+import tarfile
+import zipfile
+
 import pexpect
 import pytest
 import requests
@@ -144,3 +150,117 @@ def test_convert_one_edu_dplp2tree(fixtures_input_dir):
     input_filepath = os.path.join(fixtures_input_dir, 'one-edu.dplp')
     res = post_file(input_filepath, 'dplp', 'tree.prettyprint')
     assert res.content.decode('utf-8') == read_file('tests/fixtures/output/one-edu.dplp.tree.prettyprint')
+
+
+def test_convert_etag(fixtures_input_dir):
+    """Repeated conversions of the same input can be answered with
+    '304 Not Modified'."""
+    input_filepath = os.path.join(fixtures_input_dir, 'short.rs3')
+    res = post_file(input_filepath, 'rs3', 'dis')
+    assert res.status_code == 200
+    etag = res.headers['ETag']
+
+    url = 'http://localhost:5000/convert/rs3/dis'
+    with open(input_filepath) as input_file:
+        input_text = input_file.read()
+    res = requests.post(url, files={'input': input_text}, headers={'If-None-Match': etag})
+    assert res.status_code == 304
+    assert res.content == b''
+
+    # a different output format has a different ETag
+    url = 'http://localhost:5000/convert/rs3/rstlatex'
+    res = requests.post(url, files={'input': input_text}, headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    assert res.headers['ETag'] != etag
+
+def test_convert_multiple_outputs(fixtures_input_dir):
+    """API converts one file into several output formats at once"""
+    input_filepath = os.path.join(fixtures_input_dir, 'short.rs3')
+    with open(input_filepath) as input_file:
+        input_text = input_file.read()
+
+    url = 'http://localhost:5000/convert/rs3?outputs=dis,rstlatex,svgtree'
+    res = requests.post(url, files={'input': ('short.rs3', input_text)})
+    assert res.status_code == 200
+    outputs = res.json()
+    assert sorted(outputs) == ['dis', 'rstlatex', 'svgtree']
+    assert outputs['dis'] == {
+        'filename': 'short.dis',
+        'content': read_file('tests/fixtures/output/short.rs3.dis')}
+    assert outputs['svgtree']['content'] == read_file('tests/fixtures/output/short.rs3.svgtree')
+
+    res = requests.post(url + '&envelope=multipart', files={'input': ('short.rs3', input_text)})
+    assert res.status_code == 200
+    message = email.message_from_bytes(
+        b'Content-Type: ' + res.headers['Content-Type'].encode('utf-8') + b'\r\n\r\n' + res.content)
+    parts = {part.get_filename(): part.get_payload(decode=True).decode('utf-8')
+             for part in message.get_payload()}
+    assert parts == {output['filename']: output['content'] for output in outputs.values()}
+
+    # unknown output formats
+    res = requests.post(url + ',wrong_format', files={'input': input_text})
+    assert res.status_code == 400
+
+def test_convert_batch_files(fixtures_input_dir):
+    """API converts several uploaded files at once and reports broken inputs."""
+    url = 'http://localhost:5000/convert-batch/rs3/dis'
+    files = [
+        ('input', ('short.rs3', read_file(os.path.join(fixtures_input_dir, 'short.rs3')))),
+        ('input', ('broken.rs3', '<rst><body>')),
+    ]
+    res = requests.post(url, files=files)
+    assert res.status_code == 200
+    assert res.headers['X-Failed-Documents'] == '1'
+
+    with zipfile.ZipFile(io.BytesIO(res.content)) as archive:
+        assert sorted(archive.namelist()) == ['errors.json', 'short.dis']
+        assert archive.read('short.dis').decode('utf-8') == \
+            read_file('tests/fixtures/output/short.rs3.dis')
+        errors = json.loads(archive.read('errors.json'))
+        assert list(errors.keys()) == ['broken.rs3']
+
+
+def test_convert_batch_archive(fixtures_input_dir):
+    """API converts all documents contained in an uploaded zip archive."""
+    archive_buffer = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, 'w') as archive:
+        archive.write(os.path.join(fixtures_input_dir, 'short.rs3'), 'corpus/a.rs3')
+        archive.write(os.path.join(fixtures_input_dir, 'short.rs3'), 'corpus/b.rs3')
+
+    url = 'http://localhost:5000/convert-batch/rs3/dis'
+    res = requests.post(url, files={'input': ('corpus.zip', archive_buffer.getvalue())})
+    assert res.status_code == 200
+    assert res.headers['X-Failed-Documents'] == '0'
+
+    with zipfile.ZipFile(io.BytesIO(res.content)) as archive:
+        assert sorted(archive.namelist()) == ['corpus/a.dis', 'corpus/b.dis']
+        for name in archive.namelist():
+            assert archive.read(name).decode('utf-8') == \
+                read_file('tests/fixtures/output/short.rs3.dis')
+
+
+def test_unpack_archive_limits():
+    """Archive members are checked against the batch limits before they are
+    read, and tar archives must not contain links."""
+    from rstconverter.app import BatchLimitError, BatchLimits, unpack_archive
+
+    archive_buffer = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(3):
+            archive.writestr('doc{}.rs3'.format(i), b'x' * 1000)
+    content = archive_buffer.getvalue()
+
+    assert len(unpack_archive('corpus.zip', content, BatchLimits(3, 1000, 3000))) == 3
+    for limits in (BatchLimits(max_documents=2), BatchLimits(max_document_size=999),
+                   BatchLimits(max_total_size=2999)):
+        with pytest.raises(BatchLimitError):
+            unpack_archive('corpus.zip', content, limits)
+
+    archive_buffer = io.BytesIO()
+    with tarfile.open(fileobj=archive_buffer, mode='w') as archive:
+        link = tarfile.TarInfo('doc.rs3')
+        link.type = tarfile.SYMTYPE
+        link.linkname = '/etc/passwd'
+        archive.addfile(link)
+    with pytest.raises(tarfile.TarError):
+        unpack_archive('corpus.tar', archive_buffer.getvalue())
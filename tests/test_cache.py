@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Arne Neumann <discoursegraphs.programming@arne.cl>
+
+"""Tests for the cache of conversion results used by the REST API."""
+
+import io
+import os
+import time
+
+from rstconverter.app import (
+    app, convert_document, run_conversion, run_conversions, READ_FUNCTIONS,
+    WRITE_FUNCTIONS)
+import rstconverter.cache
+from rstconverter.cache import ConversionCache, make_cache_key
+from rstconverter.rs3 import RS3FileWriter
+from rstconverter.tree import DGParentedTree
+
+
+def test_cache_key(monkeypatch):
+    """Cache keys depend on the input, the formats, the options and the
+    version of the package."""
+    key = make_cache_key(b'input', 'rs3', 'dis')
+    assert key == make_cache_key(b'input', 'rs3', 'dis', options={})
+    assert key != make_cache_key(b'input2', 'rs3', 'dis')
+    assert key != make_cache_key(b'input', 'rs3', 'rstlatex')
+    assert key != make_cache_key(b'input', 'rs3', 'dis', options={'word_wrap': 20})
+    monkeypatch.setattr(rstconverter.cache, 'CACHE_VERSION', 'other-version')
+    assert key != make_cache_key(b'input', 'rs3', 'dis')
+
+
+def test_cache_evicts_least_recently_used():
+    """The in-memory tier of the cache is bounded by the size of its results."""
+    cache = ConversionCache(max_bytes=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'  # 'b' is now the least recently used result
+    cache.put('c', b'cccc')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa'
+    assert cache.get('c') == b'cccc'
+    assert cache.size == 8
+
+    cache.put('d', b'd' * 11)  # results larger than the cache aren't kept
+    assert cache.get('d') is None
+    assert cache.stats() == {'hits': 3, 'disk_hits': 0, 'misses': 2, 'expired': 0,
+                             'entries': 2, 'size': 8, 'max_size': 10, 'ttl': None}
+
+
+def test_cache_disk_tier(tmpdir):
+    """Results evicted from memory are still found on disk."""
+    cache_dir = str(tmpdir.join('cache'))
+    cache = ConversionCache(max_bytes=4, cache_dir=cache_dir)
+    cache.put('a' * 64, b'aaaa')
+    cache.put('b' * 64, b'bbbb')
+    assert len(cache) == 1
+    assert cache.get('a' * 64) == b'aaaa'
+    assert cache.disk_hits == 1
+
+    # the disk tier can be shared with other caches
+    other_cache = ConversionCache(max_bytes=4, cache_dir=cache_dir)
+    assert other_cache.get('b' * 64) == b'bbbb'
+
+
+def test_cache_disk_errors(tmpdir):
+    """Errors of the disk tier are logged and the results are kept in memory."""
+    cache_dir = tmpdir.join('cache')
+    cache = ConversionCache(max_bytes=4, cache_dir=str(cache_dir))
+    cache_dir.join('cc').write('not a directory')
+    cache.put('c' * 64, b'cccc')
+    assert cache.get('c' * 64) == b'cccc'
+
+    cache.put('d' * 64, b'dddd')  # evicts 'cccc' from memory
+    assert cache.get('c' * 64) is None
+
+
+def test_cache_ttl(tmpdir):
+    """Results older than the cache's TTL are treated as missing."""
+    cache = ConversionCache(max_bytes=100, cache_dir=str(tmpdir), ttl=0.1)
+    cache.put('a' * 64, b'aaaa')
+    assert cache.get('a' * 64) == b'aaaa'
+    time.sleep(0.2)
+    assert cache.get('a' * 64) is None
+    assert (cache.hits, cache.misses, cache.expired) == (1, 1, 2)  # memory and disk
+    assert len(cache) == 0 and 'a' * 64 not in cache
+
+
+def test_run_conversion_uses_cache(fixtures_input_dir):
+    """Cached results are returned without running the conversion again."""
+    with open(os.path.join(fixtures_input_dir, 'short.rs3'), 'rb') as input_file:
+        input_bytes = input_file.read()
+
+    cache = ConversionCache(max_bytes=1024 ** 2)
+    app.config['CONVERSION_CACHE'] = cache
+    try:
+        expected = convert_document(input_bytes, 'rs3', 'dis')
+        assert run_conversion(input_bytes, 'rs3', 'dis') == expected
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        key = make_cache_key(input_bytes, 'rs3', 'dis')
+        cache.put(key, b'cached result')
+        assert run_conversion(input_bytes, 'rs3', 'dis') == b'cached result'
+        assert (cache.hits, cache.misses) == (1, 1)
+    finally:
+        app.config['CONVERSION_CACHE'] = None
+
+
+def test_run_conversion_uses_tree_cache(fixtures_input_dir, monkeypatch):
+    """With a tree cache, an input file is only parsed once, no matter
+    how many output formats it is converted into."""
+    with open(os.path.join(fixtures_input_dir, 'short.rs3'), 'rb') as input_file:
+        input_bytes = input_file.read()
+
+    read_calls = []
+    read_rs3 = READ_FUNCTIONS['rs3']
+    def counting_read_rs3(*args, **kwargs):
+        read_calls.append(args)
+        return read_rs3(*args, **kwargs)
+
+    output_formats = ('dis', 'rs3', 'rstlatex', 'svgtree')
+    expected = {output_format: convert_document(input_bytes, 'rs3', output_format)
+                for output_format in output_formats}
+
+    monkeypatch.setitem(READ_FUNCTIONS, 'rs3', counting_read_rs3)
+    cache = ConversionCache(max_bytes=1024 ** 2, ttl=60)
+    app.config['TREE_CACHE'] = cache
+    try:
+        # the svgtree writer word-wraps the tree, this must not change the cached tree
+        for output_format in output_formats + ('dis',):
+            assert run_conversion(input_bytes, 'rs3', output_format) == expected[output_format]
+        assert len(read_calls) == 1
+        assert (cache.hits, cache.misses) == (4, 1)
+    finally:
+        app.config['TREE_CACHE'] = None
+
+
+def make_deep_rs3(num_edus):
+    """Return an .rs3 file (bytes) with a right-branching tree that is
+    deeper than Python's recursion limit allows to pickle."""
+    tree = 'EDU {}'.format(num_edus)
+    for edu_id in range(num_edus - 1, 0, -1):
+        tree = DGParentedTree('elaboration', [
+            DGParentedTree('N', ['EDU {}'.format(edu_id)]),
+            DGParentedTree('S', [tree])])
+    output_buffer = io.BytesIO()
+    RS3FileWriter(tree, debug=False, output_filepath=output_buffer)
+    return output_buffer.getvalue()
+
+
+def test_tree_cache_deep_tree():
+    """Trees deeper than Python's recursion limit can be cached."""
+    input_bytes = make_deep_rs3(800)
+    expected = convert_document(input_bytes, 'rs3', 'rs3')
+    app.config['TREE_CACHE'] = ConversionCache(max_bytes=1024 ** 2)
+    try:
+        assert run_conversion(input_bytes, 'rs3', 'rs3') == expected
+        assert run_conversion(input_bytes, 'rs3', 'rs3') == expected
+    finally:
+        app.config['TREE_CACHE'] = None
+
+
+def test_run_conversions_deep_tree(monkeypatch):
+    """Deep trees can be converted into several formats (with or without
+    a tree cache) and a failing writer only fails its own output format."""
+    input_bytes = make_deep_rs3(800)
+    expected = {output_format: convert_document(input_bytes, 'rs3', output_format)
+                for output_format in ('rs3', 'dis')}
+
+    def failing_writer(tree, output_file):
+        raise RecursionError("maximum recursion depth exceeded")
+    monkeypatch.setitem(WRITE_FUNCTIONS, 'failing', failing_writer)
+
+    for tree_cache in (None, ConversionCache(max_bytes=1024 ** 2)):
+        app.config['TREE_CACHE'] = tree_cache
+        try:
+            results = run_conversions(input_bytes, 'rs3', ['rs3', 'dis', 'failing'])
+        finally:
+            app.config['TREE_CACHE'] = None
+        assert results['rs3'] == (expected['rs3'], None)
+        assert results['dis'] == (expected['dis'], None)
+        output_bytes, error = results['failing']
+        assert output_bytes is None and 'maximum recursion depth' in error.message
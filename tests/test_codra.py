@@ -9,6 +9,7 @@ import pytest
 
 import rstconverter as rstc
 from rstconverter.dis.codra import CodraRSTTree
+from rstconverter.dis.common import parse_dis_tree
 from rstconverter.rs3 import RS3FileWriter, RSTTree
 
 """Basic tests for the *.codra format for Rhetorical Structure Theory."""
@@ -29,3 +30,20 @@ def test_read_codra_tree():
     # as their pretty-print representations are identical
     assert input_tree.tree.pprint() == produced_output_tree.tree.pprint()
 
+
+def test_codra_dialect():
+    """The 'codra' dialect of the tokenizer cleans up the EDUs like
+    CodraRSTTree.cleanup_edu_text() (while reading the file)."""
+    codra_str = (
+        '( Root (span 1 2)\n'
+        '  ( Nucleus (leaf 1) (rel2par span) (text _!He said \\\\\\" no ( really ) \\\\\\"_!) )\n'
+        '  ( Satellite (leaf 2) (rel2par Elaboration) (text _!Fine ._!) )\n'
+        ')\n')
+    codra_tree = CodraRSTTree(codra_str.encode('utf-8'))
+    assert codra_tree.tree.leaves() == ['He said " no ( really ) "', 'Fine .']
+
+    two_stage_tree = CodraRSTTree(codra_str.encode('utf-8'), two_stage=True)
+    assert codra_tree.tree == two_stage_tree.tree
+
+    with pytest.raises(ValueError):
+        parse_dis_tree(codra_str, dialect='rstdt')
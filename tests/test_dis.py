@@ -2,14 +2,21 @@
 # -*- coding: utf-8 -*-
 # Author: Arne Neumann <discoursegraphs.programming@arne.cl>
 
+import io
 import os
 from tempfile import NamedTemporaryFile
 
+from nltk.tree import ParentedTree
 import pytest
 
 import rstconverter as rstc
+from rstconverter.dis.common import (
+    convert_parens_in_rst_tree_str, get_edu_text, parse_dis_tree)
+from rstconverter.dis.disfilewriter import (
+    DisFileWriter, DisNodeTable, get_spans)
 from rstconverter.dis.distree import DisRSTTree
 from rstconverter.rs3 import RS3FileWriter, RSTTree
+from rstconverter.tree import DGParentedTree
 
 """
 Basic tests for the *.dis format for Rhetorical Structure Theory.
@@ -39,3 +46,157 @@ def test_read_dis2_tree(fixtures_input_dir):
     produced_output_tree = RSTTree(tempfile.name)
 
     assert input_tree.tree == produced_output_tree.tree
+
+
+def test_read_dis_from_bytes(fixtures_input_dir):
+    """A *.dis file can be parsed from bytes, a string or a file-like object."""
+    dis_filepath = os.path.join(fixtures_input_dir, 'rst-example1.dis')
+    tree_from_file = rstc.read_distree(dis_filepath)
+
+    with open(dis_filepath, 'rb') as dis_file:
+        dis_bytes = dis_file.read()
+    with open(dis_filepath, 'r') as dis_file:
+        tree_from_stream = rstc.read_distree(dis_file)
+
+    assert tree_from_file.tree == tree_from_stream.tree == \
+        rstc.read_distree(dis_bytes).tree == \
+        DisRSTTree.fromstring(dis_bytes.decode('utf-8')).tree
+
+
+def test_dis_writer_tables(fixtures_input_dir):
+    """The precomputed span and node tables agree with the tree itself."""
+    for input_filename in ('rst-example1.dis', 'rst-example2.dis'):
+        tree = rstc.read_distree(os.path.join(fixtures_input_dir, input_filename)).tree
+        spans = get_spans(tree)
+        nodes = DisNodeTable(tree)
+        assert spans[id(tree)] == (1, len(tree.leaves()))
+        assert nodes.parents[0] is None
+
+        all_leaves = tree.treepositions('leaves')
+        for subtree in tree.subtrees():
+            node_index = nodes.index[id(subtree)]
+            # span table vs. the tree positions of the leaves of each node
+            subtree_leaves = [subtree.treeposition() + leaf_pos
+                              for leaf_pos in subtree.treepositions('leaves')]
+            assert spans[id(subtree)] == (all_leaves.index(subtree_leaves[0]) + 1,
+                                          all_leaves.index(subtree_leaves[-1]) + 1)
+            assert [nodes.subtrees[child_index] for child_index in nodes.children[node_index]] == list(subtree)
+            if subtree.parent() is not None:
+                assert nodes.subtrees[nodes.parents[node_index]] is subtree.parent()
+
+
+def make_chain_tree(num_edus, edu_id=1):
+    """Return a right-branching RST tree (deep enough to wrap even short
+    lines in .dis format)."""
+    edu_text = 'This is EDU number {} .'.format(edu_id)
+    if edu_id == num_edus:
+        return edu_text
+    return DGParentedTree('elaboration', [
+        DGParentedTree('N', [edu_text]),
+        DGParentedTree('S', [make_chain_tree(num_edus, edu_id + 1)])])
+
+
+def test_dis_writer_layout(fixtures_input_dir):
+    """The .dis writer wraps long lines like nltk's Tree.pformat(), but
+    keeps each EDU on a single line."""
+    trees = [('chain-50.dis', make_chain_tree(50))]
+    for input_filename in ('rst-example1.dis', 'rst-example2.dis'):
+        trees.append((input_filename + '.dis', rstc.read_distree(
+            os.path.join(fixtures_input_dir, input_filename))))
+
+    for expected_filename, tree in trees:
+        with open(os.path.join('tests/fixtures/output', expected_filename)) as dis_file:
+            assert DisFileWriter(tree).to_dis_format() == dis_file.read()
+
+    assert DisFileWriter(DGParentedTree('N', ['Only one EDU .'])).to_dis_format() == \
+        '(Root (span 1 1) (text _!Only one EDU ._!))'
+
+
+def test_parse_dis_tree():
+    """EDUs are read as single leaves, even if they contain brackets."""
+    dis_str = (
+        "( Root (span 1 2)\n"
+        "  ( Nucleus (leaf 1) (rel2par span) (text _!foo (bar)\t baz -LRB- 1 )_!) )\n"
+        "  ( Satellite (leaf 2) (rel2par elaboration) (text _!a) b_!) )\n"
+        ")")
+    disfile_tree = parse_dis_tree(dis_str)
+    assert disfile_tree[1] == ParentedTree('Nucleus', [
+        ParentedTree('leaf', ['1']), ParentedTree('rel2par', ['span']),
+        ParentedTree('text', ['_!foo (bar) baz ( 1 )_!'])])
+    assert get_edu_text(disfile_tree[2][2]) == 'a) b'
+
+    # the EDUs are the same as with nltk and escaped brackets
+    with open(os.path.join('tests/fixtures/input', 'long.codra')) as dis_file:
+        dis_str = dis_file.read()
+    nltk_tree = ParentedTree.fromstring(convert_parens_in_rst_tree_str(dis_str))
+    is_text = lambda subtree: subtree.label() == 'text'
+    assert [get_edu_text(text).replace('-LRB-', '(').replace('-RRB-', ')')
+            for text in nltk_tree.subtrees(is_text)] == \
+        [get_edu_text(text) for text in parse_dis_tree(dis_str).subtrees(is_text)]
+
+    for invalid_str in ("", "(Root (span 1 2)", "(Root) (Root)", "Root (span 1 2)", ")"):
+        with pytest.raises(ValueError):
+            parse_dis_tree(invalid_str)
+
+
+@pytest.mark.parametrize("reader, filename", [
+    (DisRSTTree, 'rst-example1.dis'), (DisRSTTree, 'rst-example2.dis'),
+    (rstc.read_codra, 'short.codra'), (rstc.read_codra, 'long.codra')])
+def test_read_dis_two_stage(fixtures_input_dir, reader, filename):
+    """The direct builder produces the same trees as the two-stage path."""
+    input_filepath = os.path.join(fixtures_input_dir, filename)
+    direct_tree = reader(input_filepath)
+    two_stage_tree = reader(input_filepath, two_stage=True)
+    assert direct_tree.disfile_tree is None
+    assert isinstance(two_stage_tree.disfile_tree, ParentedTree)
+    assert direct_tree.tree == two_stage_tree.tree
+
+
+@pytest.mark.parametrize("reader, filename", [
+    (DisRSTTree, 'rst-example1.dis'), (rstc.read_codra, 'long.codra')])
+def test_dis_rs3_data(fixtures_input_dir, reader, filename):
+    """The indexes of a DisRSTTree are the same as those of an RSTTree
+    read from its .rs3 export."""
+    input_tree = reader(os.path.join(fixtures_input_dir, filename))
+    output_buffer = io.BytesIO()
+    RS3FileWriter(input_tree, debug=False, output_filepath=output_buffer)
+    rs3_tree = RSTTree(output_buffer.getvalue())
+
+    assert input_tree.child_dict == rs3_tree.child_dict
+    assert input_tree.elem_dict == rs3_tree.elem_dict
+    assert input_tree.edus == rs3_tree.edus
+    assert input_tree.edu_set == rs3_tree.edu_set
+    assert input_tree.edu_strings == rs3_tree.edu_strings
+    for relname, reltype in input_tree.reltypes.items():
+        assert rs3_tree.reltypes[relname] == reltype
+
+    for node_id in input_tree.elem_dict:
+        assert input_tree.tree.get_position(input_tree, node_id) == \
+            input_tree.tree.get_position(rs3_tree, node_id)
+        assert input_tree.node_height(node_id) == rs3_tree.node_height(node_id)
+
+    # the relations collected while parsing are the same as the extracted ones
+    # and they are reused by the .rs3 export (but not for a replaced tree)
+    assert input_tree.tree_relations == RS3FileWriter(input_tree.tree, debug=False).relations
+    assert RS3FileWriter(input_tree, debug=False).relations is input_tree.tree_relations
+    input_tree.tree = DGParentedTree('N', ['Only one EDU .'])
+    assert input_tree.tree_relations is None
+    assert input_tree.edu_strings == ['Only one EDU .']
+    assert RS3FileWriter(input_tree, debug=False).nodes.subtrees[1] == 'Only one EDU .'
+
+
+def test_dis_tree_relations_preorder():
+    """If a relation is used with different types, the type of its last
+    occurrence (in pre-order) is used, like in RS3FileWriter.get_relations()."""
+    dis_str = (
+        '( Root (span 1 4)\n'
+        '  ( Nucleus (span 1 2) (rel2par span)\n'
+        '    ( Nucleus (leaf 1) (rel2par Contrast) (text _!one_!) )\n'
+        '    ( Nucleus (leaf 2) (rel2par Contrast) (text _!two_!) ) )\n'
+        '  ( Satellite (span 3 4) (rel2par Contrast)\n'
+        '    ( Nucleus (leaf 3) (rel2par Contrast) (text _!three_!) )\n'
+        '    ( Nucleus (leaf 4) (rel2par Contrast) (text _!four_!) ) )\n'
+        ')\n')
+    input_tree = DisRSTTree(dis_str.encode('utf-8'))
+    assert dict(input_tree.tree_relations) == {'Contrast': 'multinuc'}
+    assert input_tree.tree_relations == RS3FileWriter(input_tree.tree, debug=False).relations
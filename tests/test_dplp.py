@@ -5,9 +5,11 @@
 import os
 from tempfile import NamedTemporaryFile
 
+from nltk.tree import Tree
 import pytest
 
 import rstconverter as rstc
+from rstconverter.dplp import DPLPRSTTree, MergeTable
 from rstconverter.tree import t
 
 """
@@ -46,3 +48,42 @@ def test_read_dplp_too_long(fixtures_input_dir):
     produced_output_tree = rstc.read_rs3tree(tempfile.name)
 
     assert input_tree.tree == produced_output_tree.tree
+
+
+def test_dplp_helpers(fixtures_input_dir):
+    """The helpers of the older, multi-pass reader still work."""
+    input_file = os.path.join(fixtures_input_dir, 'short.dplp')
+    input_tree = rstc.read_dplp(input_file)
+    merge_file_str, parsetree_str = DPLPRSTTree.split_input(input_file)
+
+    assert DPLPRSTTree.extract_edus(merge_file_str) == input_tree.edus == {
+        1: ['Although', 'they', "didn't", 'like', 'it,'],
+        2: ['they', 'accepted', 'the', 'offer.']}
+    assert input_tree.edu_texts == {
+        1: "Although they didn't like it,", 2: 'they accepted the offer.'}
+    assert DPLPRSTTree.dplpstr2dplptree(parsetree_str) == \
+        Tree('NS-elaboration', [Tree('EDU', ['1']), Tree('EDU', ['2'])])
+
+
+def test_merge_table(fixtures_input_dir):
+    """The tokens of the .merge part are stored column-wise (empty lines
+    and additional columns are ignored)."""
+    with open(os.path.join(fixtures_input_dir, 'short.dplp')) as dplp_file:
+        dplp_str = dplp_file.read()
+    merge_table = MergeTable(dplp_str, end=dplp_str.find('ParentedTree'), annotations=True)
+    assert len(merge_table) == 9
+    assert merge_table.tokens[:3] == ['Although', 'they', "didn't"]
+    assert merge_table.lemmas[:3] == ['although', 'they', "didn't"]
+    assert merge_table.pos_tags[:3] == ['IN', 'PRP', 'VBP']
+    assert merge_table.edu_ids == [1, 1, 1, 1, 1, 2, 2, 2, 2]
+    assert merge_table.get_edu_texts() == {
+        1: "Although they didn't like it,", 2: 'they accepted the offer.'}
+
+    merge_str = ('\n0\t1\tgood\tgood\tJJ\tamod\t2\tO\t (NP (JJ good)\t1\textra\n\n'
+                 '0\t2\tfood\tfood\tNN\troot\t0\tO\t (NN food))\t1\n')
+    merge_table = MergeTable(merge_str)
+    assert merge_table.get_edu_texts() == {1: 'good food'}
+    assert merge_table.lemmas is None
+
+    with pytest.raises(ValueError):
+        MergeTable('0\t1\tgood\tgood\tJJ\n')
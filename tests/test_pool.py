@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Arne Neumann <discoursegraphs.programming@arne.cl>
+
+"""Tests for the pool of worker processes used by the REST API."""
+
+import os
+import time
+
+import pytest
+
+from rstconverter.app import convert_document
+from rstconverter.pool import ConversionPool, ConversionTimeout
+
+
+def test_pool_converts_documents(fixtures_input_dir):
+    """Documents converted in a worker process are identical to documents
+    converted in the current process."""
+    with open(os.path.join(fixtures_input_dir, 'short.rs3'), 'rb') as input_file:
+        input_bytes = input_file.read()
+
+    pool = ConversionPool(max_workers=2)
+    try:
+        assert pool.run(convert_document, input_bytes, 'rs3', 'dis') == \
+            convert_document(input_bytes, 'rs3', 'dis')
+    finally:
+        pool.shutdown()
+
+
+def test_pool_recycles_workers():
+    """The pool's worker processes are replaced after N jobs per worker
+    (the job that warmed up a worker counts, too)."""
+    pool = ConversionPool(max_workers=1, max_jobs_per_worker=3)
+    try:
+        pids = [pool.run(os.getpid) for _ in range(4)]
+        assert pids[0] == pids[1]
+        assert pids[1] != pids[2]
+        assert pids[2] == pids[3]
+        assert pool.recycled == 0
+    finally:
+        pool.shutdown()
+
+
+def test_pool_timeout():
+    """A job that takes too long raises an error and doesn't block later jobs."""
+    pool = ConversionPool(max_workers=1, timeout=0.5)
+    try:
+        old_workers = list(pool._executor._processes.values())
+        with pytest.raises(ConversionTimeout):
+            pool.run(time.sleep, 5)
+        assert pool.run(os.getpid) != os.getpid()
+
+        # the worker that was running the job was terminated
+        for worker in old_workers:
+            worker.join(timeout=2)
+            assert not worker.is_alive()
+    finally:
+        pool.shutdown(wait=False)
+
+
+def test_pool_timeout_starts_with_job():
+    """The time a job waits for a free worker doesn't count towards its
+    timeout, and it doesn't terminate the job that is running before it."""
+    pool = ConversionPool(max_workers=1, timeout=1)
+    try:
+        running = pool.submit(time.sleep, 0.8)
+        queued = pool.submit(time.sleep, 0.5)
+        assert pool.result(queued) is None
+        assert pool.result(running) is None
+        assert pool.recycled == 0
+    finally:
+        pool.shutdown()
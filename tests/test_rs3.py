@@ -4,10 +4,13 @@
 
 """Basic tests for the ``rs3`` module"""
 
+from concurrent.futures import ThreadPoolExecutor
+import io
 import logging
 import os
 from tempfile import NamedTemporaryFile
 
+from lxml import etree
 import pytest
 
 import rstconverter as rstc
@@ -174,3 +177,90 @@ def test_rs3filewriter_pcc_10575():
     # ~ success_rate = okay / (okay+fail) * 100
     # ~ assert success_rate == 100, \
         # ~ "{0}% of PCC files could be loop-converted ({1} of {2})".format(success_rate, okay, okay+fail)
+
+
+def test_rs3_inmemory_input_output():
+    """RS3 files can be read from and written to memory, without touching the disk."""
+    rs3_filepath = os.path.join(RS3TREE_DIR, 'foo-bar-circ-foo-to-bar.rs3')
+    tree_from_file = RSTTree(rs3_filepath)
+
+    with open(rs3_filepath, 'rb') as rs3_file:
+        rs3_bytes = rs3_file.read()
+        rs3_file.seek(0)
+        tree_from_stream = RSTTree(rs3_file)
+
+    tree_from_bytes = rstc.read_rs3tree(rs3_bytes)
+    tree_from_string = RSTTree.fromstring(rs3_bytes.decode('utf-8'))
+    assert tree_from_file.tree == tree_from_stream.tree == \
+        tree_from_bytes.tree == tree_from_string.tree
+
+    tempfile = NamedTemporaryFile()
+    rstc.write_rs3(tree_from_bytes, tempfile.name)
+    output_buffer = io.BytesIO()
+    rstc.write_rs3(tree_from_bytes, output_buffer)
+    output_stringio = io.StringIO()
+    rstc.write_rs3(tree_from_bytes, output_stringio)
+
+    with open(tempfile.name, 'rb') as rs3_file:
+        expected_output = rs3_file.read()
+    assert output_buffer.getvalue() == expected_output
+    assert output_stringio.getvalue() == expected_output.decode('utf-8')
+
+
+def test_rs3filewriter_deep_tree():
+    """Writing a deep (right-branching) tree doesn't need recursion."""
+    num_edus = 2000
+    tree = 'EDU {}'.format(num_edus)
+    for edu_id in range(num_edus - 1, 0, -1):
+        tree = DGParentedTree('elaboration', [
+            DGParentedTree('N', ['EDU {}'.format(edu_id)]),
+            DGParentedTree('S', [tree])])
+
+    output_buffer = io.BytesIO()
+    RS3FileWriter(tree, debug=False, output_filepath=output_buffer)
+    produced_output_tree = RSTTree(output_buffer.getvalue())
+    assert produced_output_tree.edu_strings == [
+        'EDU {}'.format(edu_id) for edu_id in range(1, num_edus + 1)]
+
+
+@pytest.mark.parametrize("rs3tree_example_filename", [
+    'empty.rs3', 'foo-bar-elab-foo-to-bar.rs3',
+    'eins-zwei-drei-(joint-eins-and-zwei-and-drei).rs3', 'maz-10575-excerpt.rs3'])
+def test_rs3filewriter_streaming_layout(rs3tree_example_filename):
+    """write() produces the same bytes as pretty-printing the whole etree."""
+    input_tree = example2tree(rs3tree_example_filename)
+    writer = RS3FileWriter(input_tree, debug=False)
+
+    output_buffer = io.BytesIO()
+    writer.write(output_buffer)
+    assert output_buffer.getvalue() == etree.tostring(
+        writer.etree, encoding='UTF-8', xml_declaration=True, pretty_print=True)
+
+
+def test_rs3filewriter_relations_are_isolated():
+    """Relations of one document don't leak into the header of another,
+    even if the documents are converted in parallel threads."""
+    def make_tree(doc_id):
+        return DGParentedTree('relation-{}'.format(doc_id), [
+            DGParentedTree('N', ['foo {}'.format(doc_id)]),
+            DGParentedTree('S', ['bar {}'.format(doc_id)])])
+
+    def get_header_relations(doc_id):
+        output_buffer = io.BytesIO()
+        RS3FileWriter(make_tree(doc_id), debug=False, output_filepath=output_buffer)
+        relations = etree.fromstring(output_buffer.getvalue()).iterfind('header/relations/rel')
+        return {rel.attrib['name']: rel.attrib['type'] for rel in relations}
+
+    default_relations = dict(RS3FileWriter.default_relations)
+    num_docs = 64
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        headers = list(executor.map(get_header_relations, range(num_docs)))
+
+    for doc_id, relations in enumerate(headers):
+        expected_relations = dict(default_relations)
+        expected_relations['relation-{}'.format(doc_id)] = 'rst'
+        assert relations == expected_relations
+
+    assert RS3FileWriter.default_relations == default_relations
+    with pytest.raises(TypeError):
+        RS3FileWriter.default_relations['Contrast'] = 'rst'
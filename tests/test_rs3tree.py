@@ -16,7 +16,7 @@ import pytest
 
 from rstconverter.tree import p, t, debug_root_label
 from rstconverter.rs3 import extract_relationtypes, RS3FileWriter, RSTTree
-from rstconverter.rs3.rs3tree import n, s, TooManyChildrenError, VIRTUAL_ROOT
+from rstconverter.rs3.rs3tree import n, s, RS3Node, TooManyChildrenError, VIRTUAL_ROOT
 import rstconverter as rstc
 
 
@@ -1128,3 +1128,95 @@ def test_fix_rs3filewriter_newlines_in_edus():
     
     assert produced_good_output_tree.tree == \
         produced_bad_output_tree.tree
+
+
+def test_duplicate_edu_texts():
+    """EDUs with identical texts are ordered by their position, not their text."""
+    rs3_string = """<?xml version='1.0' encoding='UTF-8'?>
+<rst>
+  <header>
+    <relations>
+      <rel name="elaboration" type="rst"/>
+    </relations>
+  </header>
+  <body>
+    <segment id="1" parent="2" relname="elaboration">foo</segment>
+    <segment id="2">bar</segment>
+    <segment id="3" parent="2" relname="elaboration">foo</segment>
+  </body>
+</rst>
+"""
+    produced = RSTTree.fromstring(rs3_string)
+    assert produced.edu_strings == produced.tree.leaves() == ['foo', 'bar', 'foo']
+    assert produced.node_positions == {'1': 0, '2': 1, '3': 2}
+
+
+def test_node_heights():
+    """The height of each node (i.e. its distance from the root) is
+    precomputed once per document."""
+    produced = example2tree('eins-zwei-drei-(circ-eins-from-(joint-zwei-and-drei).rs3')
+    for node_id, elem in produced.elem_dict.items():
+        expected_height = 1
+        parent_id = elem['parent']
+        while parent_id is not None:
+            parent_id = produced.elem_dict[parent_id]['parent']
+            expected_height += 1
+        assert produced.node_height(node_id) == produced.node_depths[node_id] == expected_height
+
+
+def test_iterative_builder_equals_recursive_builder():
+    """The non-recursive tree builder produces the same trees as dt()."""
+    for rs3_filepath in glob.glob(os.path.join(PCC_RS3_DIR, '*.rs3')):
+        assert RSTTree(rs3_filepath).tree == RSTTree(rs3_filepath, recursive=True).tree
+
+
+def test_iterative_builder_deep_tree():
+    """The default tree builder can handle trees that are deeper than
+    Python's recursion limit."""
+    num_edus = 2000
+    segments = ['<segment id="1">EDU 1</segment>']
+    for i in range(2, num_edus + 1):
+        segments.append(
+            '<segment id="{0}" parent="{1}" relname="elaboration">EDU {0}</segment>'.format(i, i - 1))
+    rs3_string = (
+        '<rst><header><relations><rel name="elaboration" type="rst"/></relations></header>'
+        '<body>{}</body></rst>').format(''.join(segments))
+
+    produced = RSTTree.fromstring(rs3_string)
+    assert len(produced.edu_strings) == num_edus
+
+    # (elaboration (N EDU 1) (elaboration (S EDU 2) (elaboration ...)))
+    # n.b. we can't use tree.leaves() here, as it is recursive
+    edus = []
+    subtree = produced.tree
+    while subtree.label() == 'elaboration':
+        edus.append(subtree[0][0])
+        subtree = subtree[1]
+    edus.append(subtree[0])
+    assert edus == produced.edu_strings
+
+
+def test_elem_dict_node_records():
+    """The node records in RSTTree.elem_dict can be used like dicts."""
+    produced = example2tree('eins-zwei-drei-(circ-eins-from-(joint-zwei-and-drei).rs3')
+    for node_id, elem in produced.elem_dict.items():
+        assert isinstance(elem, RS3Node)
+        assert set(elem.keys()) == {'parent', 'relname', 'nuclearity', 'reltype',
+                                    'element_type', 'text', 'group_type'}
+        assert elem['element_type'] == elem.get('element_type') == elem.element_type
+        assert elem['nuclearity'] in ('root', 'nucleus', 'satellite')
+        if elem['element_type'] == 'segment':
+            assert elem['text'] == produced.edu_strings[produced.edus.index(node_id)]
+
+    # relation names are interned, i.e. shared by all nodes
+    relnames = {}
+    for elem in produced.elem_dict.values():
+        relname = relnames.setdefault(elem['relname'], elem['relname'])
+        assert relname is elem['relname']
+
+    elem = next(iter(produced.elem_dict.values()))
+    with pytest.raises(KeyError):
+        elem['no-such-attribute']
+    with pytest.raises(KeyError):
+        elem['__class__']  # only node attributes can be looked up
+    assert elem.get('no-such-attribute', 'default') == 'default'
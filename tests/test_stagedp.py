@@ -51,3 +51,14 @@ def test_read_stagedp_long(fixtures_input_dir):
     assert input_tree.tree == produced_output_tree.tree
 
 
+def test_cleanup_edu_text():
+    """EDU texts are cleaned up like splitting them into tokens and
+    removing the paragraph/sentence markers."""
+    def reference_cleanup(text):
+        return ' '.join(tok for tok in text[2:-2].split('_')
+                        if tok not in ('<P>', '<S>'))
+
+    for edu_text in ("_!<P>_<S>_They_did_n't_like_the_offer_.!_",
+                     "_!<S>_Two_weeks_later_!_", "_!no_markers!_", "_!<P>!_",
+                     "_!foo_<S>_bar_<P>!_", "_!a<P>b__c!_", "_!<S>_<S>_<P>_x!_"):
+        assert StageDPRSTTree.cleanup_edu_text(edu_text) == reference_cleanup(edu_text)
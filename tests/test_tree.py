@@ -2,11 +2,17 @@
 # coding: utf-8
 # Author: Arne Neumann <discoursegraphs.programming@arne.cl>
 
+import io
+import os
 from tempfile import NamedTemporaryFile
 
 from lxml import etree
+from nltk.tree import Tree
+import pytest
 
-from rstconverter.tree import debug_root_label, DGParentedTree, t
+from rstconverter.tree import (
+    copy_tree, debug_root_label, DGParentedTree, dumps_tree, loads_tree,
+    parse_tree_literal, t, transform_leaves, word_wrap_tree)
 import rstconverter as rstc
 
 
@@ -48,3 +54,84 @@ def test_write_svgtree():
 
     # return SVG as string
     assert EXPECTED_SVG_TREE == rstc.write_svgtree(tree)
+
+
+def test_parse_tree_literal(fixtures_input_dir):
+    assert parse_tree_literal("ParentedTree('EDU', ['1'])") == Tree('EDU', ['1'])
+    assert parse_tree_literal(
+        """ParseTree('Contrast[S][N]', ["Although they did n't like it ,", 'it\\'s "fine" .'])\n"""
+        ) == Tree('Contrast[S][N]', ["Although they did n't like it ,", 'it\'s "fine" .'])
+
+    # produces the same trees as eval()
+    with open(os.path.join(fixtures_input_dir, 'long.hilda')) as hilda_file:
+        hilda_str = hilda_file.read()
+    assert parse_tree_literal(hilda_str) == eval(hilda_str.replace('ParseTree', 'Tree'))
+
+    # HILDA running on Python 2 produces prefixed strings, children can be tuples
+    hilda_py2_str = (
+        "ParseTree(u'Contrast[S][N]', [u\"Although they did n't like it ,\", "
+        "ParseTree(u'Elaboration[N][S]', (u'they accepted the offer', ur'\\o/ .'))])")
+    assert parse_tree_literal(hilda_py2_str) == Tree('Contrast[S][N]', [
+        "Although they did n't like it ,",
+        Tree('Elaboration[N][S]', ['they accepted the offer', '\\o/ .'])])
+    hilda_py3_str = (
+        "ParseTree('Contrast[S][N]', [\"Although they did n't like it ,\", "
+        "ParseTree('Elaboration[N][S]', ['they accepted the offer', '\\\\o/ .'])])")
+    assert rstc.read_hilda(io.BytesIO(hilda_py2_str.encode('utf-8'))).tree == \
+        rstc.read_hilda(io.BytesIO(hilda_py3_str.encode('utf-8'))).tree
+
+    for invalid_str in ("", "ParseTree('foo', ['bar']", "ParseTree('foo', ['bar'])]",
+                        "ParseTree('foo', ['bar' 'baz'])", "__import__('os').getcwd()",
+                        "ParseTree('foo', ('bar'])", "ParseTree(ub'foo', ['bar'])"):
+        with pytest.raises(ValueError):
+            parse_tree_literal(invalid_str)
+
+
+def test_word_wrap_tree():
+    tree = DGParentedTree('elaboration', [
+        DGParentedTree('N', ['  a rather long text that needs wrapping']),
+        DGParentedTree('S', ['short'])])
+    assert word_wrap_tree(tree, width=0) is tree
+    assert tree.leaves() == ['  a rather long text that needs wrapping', 'short']
+
+    assert word_wrap_tree(tree, width=12) is tree
+    assert tree.leaves() == ['a rather\nlong text\nthat needs\nwrapping', 'short']
+    assert tree[0].parent() is tree and tree[0][0] == tree.leaves()[0]
+
+    # a deep tree is transformed without recursion
+    num_edus = 5000
+    deep_tree = DGParentedTree('N', ['EDU {}'.format(num_edus)])
+    for edu_id in range(num_edus - 1, 0, -1):
+        deep_tree = DGParentedTree('elaboration', [
+            DGParentedTree('N', ['EDU {}'.format(edu_id)]), deep_tree])
+    transform_leaves(deep_tree, str.lower)
+    for edu_id in range(1, num_edus):
+        assert deep_tree[0][0] == 'edu {}'.format(edu_id)
+        deep_tree = deep_tree[1]
+    assert deep_tree[0] == 'edu {}'.format(num_edus)
+
+
+def test_dumps_tree():
+    """Trees (of any depth) are serialized without recursion."""
+    tree = DGParentedTree('elaboration', [
+        DGParentedTree('N', ['foo'], root_id='1'), DGParentedTree('S', ['bar'], root_id='2')],
+        root_id='3')
+    loaded_tree = loads_tree(dumps_tree(tree))
+    assert loaded_tree == tree
+    assert [loaded_tree.root_id, loaded_tree[0].root_id, loaded_tree[1].root_id] == ['3', '1', '2']
+    assert loaded_tree[1].parent() is loaded_tree
+
+    copied_tree = copy_tree(tree)
+    copied_tree[0][0] = 'baz'
+    assert tree[0][0] == 'foo'
+
+    num_edus = 5000
+    deep_tree = DGParentedTree('N', ['EDU {}'.format(num_edus)])
+    for edu_id in range(num_edus - 1, 0, -1):
+        deep_tree = DGParentedTree('elaboration', [
+            DGParentedTree('N', ['EDU {}'.format(edu_id)]), deep_tree])
+    loaded_tree = loads_tree(dumps_tree(deep_tree))
+    for edu_id in range(1, num_edus):
+        assert loaded_tree[0][0] == 'EDU {}'.format(edu_id)
+        loaded_tree = loaded_tree[1]
+    assert loaded_tree[0] == 'EDU {}'.format(num_edus)